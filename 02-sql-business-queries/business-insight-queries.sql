@@ -50,7 +50,7 @@ INNER JOIN products AS p ON op.product_id = p.product_id
 INNER JOIN departments AS d ON p.department_id = d.department_id 
 WHERE op.reordered = 1 
   AND o.days_since_prior_order IS NOT NULL
-GROUP BY op.product_id, p.product_name
+GROUP BY op.product_id, p.product_name, d.department
 HAVING total_reorders > 600 -- The number 600 comes from the top 10% of best-selling products.
 ORDER BY total_reorders DESC
 LIMIT 500;
@@ -0,0 +1,5 @@
+"""Instacart repeat order prediction pipeline.
+
+Reusable building blocks behind ``reorder.py``. Submodules are imported
+on demand, so ``import instacart`` stays cheap.
+"""
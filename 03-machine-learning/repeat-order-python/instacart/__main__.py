@@ -0,0 +1,6 @@
+"""``python -m instacart <command>`` runs the pipeline CLI (see ``instacart.pipeline``)."""
+
+from instacart.pipeline import main
+
+
+main()
@@ -0,0 +1,316 @@
+"""Market basket analysis (association rules) over every prior order.
+
+``product-matching-r/market-basket-analysis.r`` samples 10,000 orders, splits
+them into ``transactions`` of product_name strings and runs Apriori. Here the
+full ``order_products__prior`` table is used, on integer ids only:
+
+1. ``BasketMatrix.from_rows``: item supports from one ``bincount`` of
+   product_id; the frequent items become the columns of a sparse
+   order x product CSR matrix (row = order_id, 1 = the product is in the order).
+2. ``frequent_itemsets``: pair counts are ``X.T @ X`` summed over blocks of
+   orders; triple counts are conditional: for each item ``a``, the orders that
+   contain ``a`` (one column of the CSC copy) give ``Xa.T @ Xa``, the counts
+   of every (b, c) bought together with ``a``. Only the frequent partners of
+   ``a`` are kept (Apriori pruning). Both steps are split across a process
+   pool; the matrices sit in shared memory (``search.SharedArrays``).
+3. ``association_rules``: rules with a single item on the right (as arules),
+   with support, confidence, coverage, lift and count.
+4. ``attach_names``: product names are looked up for the output rules only.
+
+    python -m instacart.basket --data-dir . --cache-dir .instacart-cache --min-support 0.001 --min-confidence 0.6
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instacart.loader import load_table
+from instacart.search import SharedArrays
+
+
+RULE_COLUMNS = ['lhs_1', 'lhs_2', 'rhs', 'support', 'confidence', 'coverage', 'lift', 'count']
+
+
+# --- 📂 Order x Product Matrix ---
+
+class BasketMatrix:
+    """Sparse order x item matrix of the frequent items.
+
+    Column ``j`` is product ``item_ids[j]``; ``item_counts[j]`` is the number of
+    orders that contain it and ``n_transactions`` the number of (non-empty) orders.
+    """
+
+    def __init__(self, indptr, indices, item_ids, item_counts, n_transactions):
+        self.indptr = indptr
+        self.indices = indices
+        self.item_ids = item_ids
+        self.item_counts = item_counts
+        self.n_transactions = n_transactions
+
+    @classmethod
+    def from_rows(cls, order_id, product_id, min_count = 1):
+        """Build from the (order_id, product_id) rows, keeping items bought in ``min_count`` orders or more."""
+        order_id = np.asarray(order_id)
+        product_id = np.asarray(product_id)
+
+        ## Sort by order only if the rows are not already grouped (the Kaggle file is sorted by order_id).
+        if len(order_id) and np.any(order_id[1:] < order_id[:-1]):
+            order = np.argsort(order_id, kind = 'stable')
+            order_id, product_id = order_id[order], product_id[order]
+
+        rows_per_order = np.bincount(order_id)
+        n_transactions = int(np.count_nonzero(rows_per_order))
+
+        item_counts = np.bincount(product_id)
+        item_ids = np.flatnonzero(item_counts >= min_count)
+        column = np.full(len(item_counts), -1, dtype = np.int32)
+        column[item_ids] = np.arange(len(item_ids), dtype = np.int32)
+
+        keep = column[product_id] >= 0
+        indptr = np.r_[0, np.cumsum(np.bincount(order_id[keep], minlength = len(rows_per_order)))].astype(np.int64)
+        indices = column[product_id[keep]]
+        return cls(indptr, indices, item_ids, item_counts[item_ids], n_transactions)
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.item_ids)
+
+    def csr(self):
+        from scipy import sparse
+        data = np.ones(len(self.indices), dtype = np.int32)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape = self.shape)
+
+
+# --- 🏷️ Parallel Support Counting ---
+
+_SHARED = None
+
+
+def _attach(name, specs):
+    global _SHARED
+    _SHARED = SharedArrays.attach(name, specs)
+
+
+def _shared_matrices(shape):
+    from scipy import sparse
+
+    arrays = _SHARED.arrays
+    csr = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape = shape, copy = False)
+    csc = sparse.csc_matrix((arrays['data'], arrays['csc_indices'], arrays['csc_indptr']), shape = shape, copy = False)
+    return csr, csc
+
+
+def _count_pairs(shape, start, stop):
+    ## Pair counts of one block of orders (upper triangle, partial counts: no support filter yet).
+    csr, _ = _shared_matrices(shape)
+    block = csr[start:stop]
+    counts = (block.T @ block).tocoo()
+    upper = counts.row < counts.col
+    return counts.row[upper], counts.col[upper], counts.data[upper]
+
+
+def _count_triples(shape, items, partners, min_count):
+    ## For each item a: counts of every (b, c), a < b < c, among the orders that contain a.
+    csr, csc = _shared_matrices(shape)
+    out = []
+    for a, cols in zip(items, partners):
+        if len(cols) < 2:
+            continue
+        rows = csc.indices[csc.indptr[a]:csc.indptr[a + 1]]
+        sub = csr[rows][:, cols]
+        counts = (sub.T @ sub).tocoo()
+        keep = (counts.row < counts.col) & (counts.data >= min_count)
+        out.append(np.column_stack([
+            np.full(keep.sum(), a), cols[counts.row[keep]], cols[counts.col[keep]], counts.data[keep]
+        ]))
+    return np.concatenate(out) if out else np.empty((0, 4), dtype = np.int64)
+
+
+def frequent_itemsets(matrix, min_support = 0.001, maxlen = 3, n_jobs = None, block_rows = 250_000):
+    """Itemsets of 1 to ``maxlen`` (<= 3) items with support >= ``min_support``.
+
+    Returns a dataframe with ``item_1`` / ``item_2`` / ``item_3`` (product ids,
+    0 = none), ``size``, ``count`` and ``support``.
+    """
+    if not 1 <= maxlen <= 3:
+        raise ValueError('maxlen must be 1, 2 or 3')
+    n_jobs = n_jobs or os.cpu_count() or 1
+    min_count = int(np.ceil(min_support * matrix.n_transactions))
+
+    ## 1-itemsets straight from the item counts.
+    frequent = np.flatnonzero(matrix.item_counts >= min_count)
+    levels = [np.column_stack([frequent, np.zeros((len(frequent), 2), dtype = np.int64),
+                               matrix.item_counts[frequent]])]
+
+    if maxlen >= 2 and len(frequent) >= 2:
+        csr = matrix.csr()
+        csc = csr.tocsc()
+        shape = matrix.shape
+        with SharedArrays.create(
+            data = csr.data, indices = csr.indices, indptr = csr.indptr,
+            csc_indices = csc.indices, csc_indptr = csc.indptr,
+        ) as shared:
+            del csr, csc
+            with ProcessPoolExecutor(max_workers = n_jobs, initializer = _attach,
+                                     initargs = (shared.name, shared.specs)) as pool:
+                ## 2-itemsets: partial X.T @ X of each block of orders, summed by pair key.
+                futures = [pool.submit(_count_pairs, shape, start, min(start + block_rows, shape[0]))
+                           for start in range(0, shape[0], block_rows)]
+                parts = [f.result() for f in futures]
+                a = np.concatenate([p[0] for p in parts]).astype(np.int64)
+                b = np.concatenate([p[1] for p in parts]).astype(np.int64)
+                keys, counts = _sum_by_key(a * shape[1] + b, np.concatenate([p[2] for p in parts]))
+                keep = counts >= min_count
+                pair_a, pair_b, pair_count = keys[keep] // shape[1], keys[keep] % shape[1], counts[keep]
+                levels.append(np.column_stack([pair_a, pair_b, np.zeros(len(pair_a), dtype = np.int64), pair_count]))
+
+                ## 3-itemsets: conditional counts per item, items dealt round-robin to balance the workers.
+                if maxlen >= 3 and len(pair_a):
+                    starts = np.searchsorted(pair_a, np.arange(shape[1] + 1))
+                    items = np.unique(pair_a)
+                    futures = [
+                        pool.submit(_count_triples, shape, items[i::n_jobs],
+                                    [pair_b[starts[a]:starts[a + 1]] for a in items[i::n_jobs]], min_count)
+                        for i in range(min(n_jobs, len(items)))
+                    ]
+                    levels.append(np.concatenate([f.result() for f in futures]))
+
+    itemsets = np.concatenate(levels).astype(np.int64)
+    size = np.concatenate([np.full(len(level), k + 1) for k, level in enumerate(levels)])
+
+    ## Column indices back to product ids (0 = no item); item_ids is ascending, so items stay sorted.
+    product = matrix.item_ids
+    frame = pd.DataFrame({
+        'item_1': product[itemsets[:, 0]],
+        'item_2': np.where(size >= 2, product[itemsets[:, 1]], 0),
+        'item_3': np.where(size >= 3, product[itemsets[:, 2]], 0),
+        'size': size,
+        'count': itemsets[:, 3],
+    })
+    frame['support'] = frame['count'] / matrix.n_transactions
+    return frame
+
+
+def _sum_by_key(keys, values):
+    ## Sum of the partial counts of each key (one sort + reduceat).
+    if not len(keys):
+        return keys, values.astype(np.int64)
+    order = np.argsort(keys, kind = 'stable')
+    keys, values = keys[order], values[order].astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.add.reduceat(values, starts)
+
+
+# --- 📌 Association Rules ---
+
+def _itemset_key(item_1, item_2 = 0, item_3 = 0):
+    ## Sorted product ids packed into one uint64 (21 bits each, product_id < 2 ** 21).
+    return (np.asarray(item_1, dtype = np.uint64) << np.uint64(42)) | \
+           (np.asarray(item_2, dtype = np.uint64) << np.uint64(21)) | np.asarray(item_3, dtype = np.uint64)
+
+
+def association_rules(itemsets, n_transactions, min_confidence = 0.6):
+    """Rules ``{lhs} => {rhs}`` (one item on the right) of the 2- and 3-itemsets, sorted by lift.
+
+    ``lhs_2`` is 0 for a one-item left-hand side.
+    """
+    keys = _itemset_key(itemsets['item_1'], itemsets['item_2'], itemsets['item_3'])
+    order = np.argsort(keys)
+    keys, counts = keys[order], itemsets['count'].to_numpy()[order]
+
+    def count_of(item_1, item_2 = 0):
+        ## Subsets of a frequent itemset are frequent, so every lookup hits.
+        return counts[np.searchsorted(keys, _itemset_key(item_1, item_2))]
+
+    rules = []
+    pairs = itemsets[itemsets['size'] == 2]
+    x, y, n = pairs['item_1'].to_numpy(), pairs['item_2'].to_numpy(), pairs['count'].to_numpy()
+    rules += [(x, 0 * x, y, n, count_of(x)), (y, 0 * y, x, n, count_of(y))]
+
+    triples = itemsets[itemsets['size'] == 3]
+    x, y, z, n = (triples[c].to_numpy() for c in ('item_1', 'item_2', 'item_3', 'count'))
+    rules += [(x, y, z, n, count_of(x, y)), (x, z, y, n, count_of(x, z)), (y, z, x, n, count_of(y, z))]
+
+    lhs_1, lhs_2, rhs, count, lhs_count = (np.concatenate(parts) for parts in zip(*rules))
+    confidence = count / lhs_count
+    frame = pd.DataFrame({
+        'lhs_1': lhs_1,
+        'lhs_2': lhs_2,
+        'rhs': rhs,
+        'support': count / n_transactions,
+        'confidence': confidence,
+        'coverage': lhs_count / n_transactions,
+        'lift': confidence / (count_of(rhs) / n_transactions),
+        'count': count,
+    }, columns = RULE_COLUMNS)
+    frame = frame[frame['confidence'] >= min_confidence]
+    return frame.sort_values(['lift', 'count'], ascending = False, ignore_index = True)
+
+
+def attach_names(rules, products):
+    """``rules`` with ``lhs`` / ``rhs`` product names and the arules-style ``rules`` label."""
+    names = pd.Series(products['product_name'].to_numpy(), index = products['product_id'].to_numpy())
+    lhs_1 = names.reindex(rules['lhs_1']).to_numpy()
+    lhs_2 = names.reindex(rules['lhs_2']).to_numpy()
+    rhs = names.reindex(rules['rhs']).to_numpy()
+
+    out = rules.copy()
+    out['lhs'] = [a if b is None or b != b else f'{a},{b}' for a, b in zip(lhs_1, lhs_2)]
+    out['rhs_name'] = rhs
+    out.insert(0, 'rules', '{' + out['lhs'] + '} => {' + out['rhs_name'].astype(str) + '}')
+    return out
+
+
+# --- 📂 Command Line ---
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Association rules over every prior order.')
+    parser.add_argument('--data-dir', default = '.')
+    parser.add_argument('--cache-dir', default = None)
+    parser.add_argument('--min-support', type = float, default = 0.001)
+    parser.add_argument('--min-confidence', type = float, default = 0.6)
+    parser.add_argument('--maxlen', type = int, default = 3)
+    parser.add_argument('--n-jobs', type = int, default = None)
+    parser.add_argument('--top', type = int, default = 5, help = 'rules to print (by lift)')
+    parser.add_argument('--output', default = 'product_matching.csv', help = 'rules CSV (for Tableau)')
+    parser.add_argument('--trace-dir', default = 'traces')
+    args = parser.parse_args(argv)
+
+    from instacart.trace import Trace
+    trace = Trace('basket', trace_dir = args.trace_dir)
+
+    with trace.stage('load') as record:
+        rows = load_table('order_products__prior', args.data_dir, ['order_id', 'product_id'], args.cache_dir)
+        record['rows_out'] = len(rows)
+
+    with trace.stage('matrix', rows_in = rows) as record:
+        ## Items below the support threshold can never be part of a frequent itemset.
+        n_orders = int(rows['order_id'].nunique())
+        matrix = BasketMatrix.from_rows(rows['order_id'].to_numpy(), rows['product_id'].to_numpy(),
+                                        min_count = int(np.ceil(args.min_support * n_orders)))
+        record['rows_out'] = len(matrix.indices)
+    del rows
+
+    with trace.stage('itemsets') as record:
+        itemsets = frequent_itemsets(matrix, args.min_support, args.maxlen, args.n_jobs)
+        record['rows_out'] = len(itemsets)
+
+    with trace.stage('rules', rows_in = itemsets) as record:
+        rules = association_rules(itemsets, matrix.n_transactions, args.min_confidence)
+        record['rows_out'] = len(rules)
+
+    products = load_table('products', args.data_dir, ['product_id', 'product_name'], args.cache_dir)
+    rules = attach_names(rules, products)
+    trace.save()
+
+    print(f'{matrix.n_transactions:,} orders, {len(matrix.item_ids):,} frequent items, '
+          f'{len(itemsets):,} frequent itemsets, {len(rules):,} rules')
+    print(rules[['rules', 'support', 'confidence', 'coverage', 'lift', 'count']].head(args.top).to_string())
+    rules[['rules', 'support', 'confidence', 'coverage', 'lift', 'count']].to_csv(args.output, index = False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Reproducible benchmark of the pipeline stages.
+
+Runs the stages of ``reorder.py`` on a data directory (by default synthetic
+data from ``instacart.synthetic`` at the requested scale) and records, for
+every stage, the wall time, the throughput (rows per second) and the peak
+resident memory:
+
+1. ``load``: orders + prior + train order-products through the typed loader / cache.
+2. ``features``: order index, fused feature build and feature store write.
+3. ``sampling``: 1:1 negative sampling and the feature gather of the training set.
+4. ``training``: outlier capping, train / validation split and the saga fit.
+5. ``scoring``: chunked batch scoring of the test set to CSV.
+6. ``error_analysis``: FN / FP / TP / TN counts per aisle and department, top FN / FP aisles.
+
+The results are printed and saved as JSON (or CSV), so runs can be compared
+change by change::
+
+    python -m instacart.benchmark --scale 0.1 --output benchmark-0.1.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from instacart.feature_store import FeatureStore
+from instacart.features import build_features
+from instacart.order_index import OrderIndex
+from instacart.pipeline import (
+    CORE_FEATURES, cap_outliers, error_analysis, fit_model, load_catalogue, load_order_products, load_orders,
+    training_set,
+)
+from instacart.scoring import score_test_set
+from instacart.trace import Trace
+
+
+# --- 📂 Stages ---
+## Each stage reads what it needs from ``ctx``, stores its outputs there and
+## returns the number of rows it processed (the throughput denominator).
+
+def stage_load(ctx):
+    orders = load_orders(ctx['data_dir'], ctx['cache_dir'])
+    order_index = OrderIndex(orders)
+    ctx.update(
+        orders = orders,
+        prior_orders = load_order_products(
+            'order_products__prior', order_index, ctx['data_dir'], ctx['cache_dir'],
+            columns = ['user_id', 'order_number', 'days_since_prior_order'],
+        ),
+        train_orders = load_order_products('order_products__train', order_index, ctx['data_dir'], ctx['cache_dir']),
+    )
+    return len(orders) + len(ctx['prior_orders']) + len(ctx['train_orders'])
+
+
+def stage_features(ctx):
+    cust_features, prod_features, up_features = build_features(ctx['prior_orders'], ctx['orders'])
+    ctx['feature_store'] = FeatureStore.write(
+        os.path.join(ctx['work_dir'], 'feature-store'), cust_features, prod_features, up_features
+    )
+    return len(ctx['prior_orders'])
+
+
+def stage_sampling(ctx):
+    ctx['final_train_data'] = training_set(ctx['feature_store'], ctx['train_orders'])
+    return len(ctx['final_train_data'])
+
+
+def stage_training(ctx):
+    data = ctx['final_train_data']
+    upper_bounds = cap_outliers(data, CORE_FEATURES)
+    ctx['scorer'], ctx['validation'] = fit_model(data, CORE_FEATURES, upper_bounds)
+    return len(data) - len(ctx['validation']['y'])
+
+
+def stage_scoring(ctx):
+    output = os.path.join(ctx['work_dir'], 'test-predictions.csv')
+    rows, _ = score_test_set(ctx['feature_store'], ctx['orders'], ctx['scorer'], output)
+    return rows
+
+
+def stage_error_analysis(ctx):
+    ctx['errors'] = error_analysis(ctx['validation'], ctx['scorer'], load_catalogue(ctx['data_dir'], ctx['cache_dir']))
+    return len(ctx['validation']['y'])
+
+
+STAGES = {
+    'load': stage_load,
+    'features': stage_features,
+    'sampling': stage_sampling,
+    'training': stage_training,
+    'scoring': stage_scoring,
+    'error_analysis': stage_error_analysis,
+}
+
+
+# --- 📂 Benchmark ---
+
+def run_benchmark(data_dir, work_dir, cache_dir = None, profile = None, trace_dir = 'traces'):
+    """Run every stage in order; returns a dataframe with one row of measurements per stage.
+
+    ``profile`` is passed to the ``Trace`` (``'cprofile'`` writes one ``.prof`` per stage to ``trace_dir``).
+    """
+    ctx = {'data_dir': data_dir, 'work_dir': work_dir, 'cache_dir': cache_dir}
+    trace = Trace('benchmark', profile = profile, trace_dir = trace_dir)
+
+    for name, stage in STAGES.items():
+        with trace.stage(name) as record:
+            record['rows_out'] = stage(ctx)
+
+    results = trace.to_frame().drop(columns = ['started', 'rows_in'] + (['profile'] if profile is None else []))
+    results.insert(results.columns.get_loc('rows_out') + 1, 'rows_per_second', results['rows_out'] / results['wall_s'])
+    return results
+
+
+def environment():
+    """Versions and machine details stored with each result."""
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_results(results, path, meta):
+    if path.endswith('.csv'):
+        results.assign(**{k: v for k, v in meta.items() if np.isscalar(v)}).to_csv(path, index = False)
+    else:
+        with open(path, 'w') as f:
+            json.dump({**meta, 'stages': results.to_dict(orient = 'records')}, f, indent = 2)
+
+
+# --- 📂 Command Line ---
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the reorder pipeline stages.')
+    parser.add_argument('--scale', type = float, default = 0.1, help = 'synthetic data scale (ignored with --data-dir)')
+    parser.add_argument('--seed', type = int, default = 22)
+    parser.add_argument('--data-dir', default = None, help = 'existing Instacart CSVs (default: generate synthetic data)')
+    parser.add_argument('--cache-dir', default = None, help = 'columnar cache directory')
+    parser.add_argument('--work-dir', default = None, help = 'where the feature store and predictions go (default: temporary)')
+    parser.add_argument('--output', default = None, help = 'results file (.json or .csv)')
+    parser.add_argument('--profile', action = 'store_true', help = 'write a cProfile .prof per stage to traces/')
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        from instacart.synthetic import generate
+        data_dir = os.path.join('synthetic-data', f'scale-{args.scale:g}-seed-{args.seed}')
+        if not os.path.exists(os.path.join(data_dir, 'orders.csv')):
+            print(f'Generating synthetic data in {data_dir} ...')
+            generate(data_dir, args.scale, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmark(data_dir, args.work_dir or tmp, args.cache_dir, 'cprofile' if args.profile else None)
+
+    print(results.to_string(index = False, float_format = lambda v: f'{v:,.2f}'))
+
+    if args.output:
+        meta = {'data_dir': data_dir, 'scale': None if args.data_dir else args.scale, 'seed': args.seed, **environment()}
+        save_results(results, args.output, meta)
+
+
+if __name__ == '__main__':
+    main()
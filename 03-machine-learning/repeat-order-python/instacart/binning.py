@@ -0,0 +1,173 @@
+"""Binned (uint8) feature matrix and the histogram gradient-boosting model.
+
+The model features are low-cardinality numbers (counts, day averages up to
+30, rates), so each one is quantized into at most 255 bins:
+
+- ``FeatureBinner.fit``: bin edges per feature. A feature with few distinct
+  values gets one bin per value; otherwise the edges are quantiles of a
+  subsample. The edges are saved as JSON (``save`` / ``load``).
+- ``FeatureBinner.transform``: one ``searchsorted`` per column into a C-ordered
+  ``uint8`` matrix, 1 byte per value instead of 8 (float64 frames).
+- ``write_binned`` / ``read_binned``: the binned training matrix, its labels
+  and its edges on disk (the matrix is memory-mapped back).
+
+``fit_boosting`` trains sklearn's ``HistGradientBoostingClassifier`` on the
+codes (whose own binning then maps each code to one bin), with early stopping
+on a held-out part of the training rows. ``BoostingScorer`` wraps the binner
+and the fitted model with the same interface as ``LinearScorer``, so
+``score_test_set`` and the report use it unchanged. Tree splits are invariant
+to monotone transforms, so the features are not capped for this model.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from instacart.scoring import DEFAULT_THRESHOLD
+
+
+MAX_BINS = 255
+
+
+# --- 📂 Feature Binning ---
+
+class FeatureBinner:
+    """Per-feature bin edges; ``transform`` maps values to uint8 bin codes."""
+
+    def __init__(self, features, edges = None, max_bins = MAX_BINS):
+        if not 2 <= max_bins <= MAX_BINS:
+            raise ValueError(f'max_bins must be between 2 and {MAX_BINS}')
+        self.features = list(features)
+        self.max_bins = max_bins
+        ## edges[j]: ascending upper bounds; code k holds edges[k - 1] < x <= edges[k].
+        self.edges = [np.asarray(e, dtype = np.float64) for e in edges] if edges is not None else None
+
+    def _columns(self, x):
+        if hasattr(x, 'columns'):
+            return x[self.features].to_numpy(dtype = np.float64)
+        return np.asarray(x)
+
+    def fit(self, x, subsample = 200_000, random_state = 22):
+        """Edges from the data (quantiles of at most ``subsample`` rows per feature)."""
+        x = self._columns(x)
+        if subsample and len(x) > subsample:
+            x = x[np.random.default_rng(random_state).choice(len(x), subsample, replace = False)]
+
+        self.edges = []
+        for j in range(x.shape[1]):
+            col = x[:, j]
+            values = np.unique(col[~np.isnan(col)])
+            if len(values) <= self.max_bins:
+                ## One bin per distinct value: edges halfway between neighbours.
+                edges = (values[:-1] + values[1:]) / 2
+            else:
+                q = np.linspace(0, 100, self.max_bins + 1)[1:-1]
+                edges = np.unique(np.percentile(col[~np.isnan(col)], q, method = 'midpoint'))
+            self.edges.append(edges)
+        return self
+
+    @property
+    def n_bins(self):
+        return [len(e) + 1 for e in self.edges]
+
+    def transform(self, x):
+        """uint8 codes (rows, features); NaN goes to the last bin."""
+        x = self._columns(x)
+        codes = np.empty(x.shape, dtype = np.uint8)
+        for j, edges in enumerate(self.edges):
+            codes[:, j] = np.searchsorted(edges, x[:, j], side = 'left')
+        return codes
+
+    def fit_transform(self, x, **kwargs):
+        return self.fit(x, **kwargs).transform(x)
+
+    def to_dict(self):
+        return {
+            'features': self.features,
+            'max_bins': self.max_bins,
+            'edges': [e.tolist() for e in self.edges],
+        }
+
+    @classmethod
+    def from_dict(cls, params):
+        return cls(params['features'], params['edges'], params['max_bins'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent = 2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+# --- 📂 Binned Matrix on Disk ---
+
+def write_binned(path, codes, y, binner):
+    """``codes.npy`` (uint8), ``labels.npy`` and ``bins.json`` in the directory ``path``."""
+    os.makedirs(path, exist_ok = True)
+    np.save(os.path.join(path, 'codes.npy'), np.ascontiguousarray(codes, dtype = np.uint8))
+    np.save(os.path.join(path, 'labels.npy'), np.asarray(y, dtype = np.uint8))
+    binner.save(os.path.join(path, 'bins.json'))
+
+
+def read_binned(path):
+    """(codes, labels, binner); the codes are memory-mapped."""
+    codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode = 'r')
+    labels = np.load(os.path.join(path, 'labels.npy'))
+    return codes, labels, FeatureBinner.load(os.path.join(path, 'bins.json'))
+
+
+# --- 🏷️ Histogram Gradient Boosting ---
+
+class BoostingScorer:
+    """Binner + fitted ``HistGradientBoostingClassifier``, scored like a ``LinearScorer``."""
+
+    def __init__(self, binner, model, threshold = DEFAULT_THRESHOLD):
+        self.binner = binner
+        self.model = model
+        self.threshold = threshold
+
+    @property
+    def features(self):
+        return self.binner.features
+
+    def predict_proba(self, x, inplace = False):
+        """P(reordered = 1) as float32 (``inplace`` is accepted for ``LinearScorer`` compatibility)."""
+        return self.model.predict_proba(self.binner.transform(x))[:, 1].astype(np.float32)
+
+    def predict(self, x):
+        return (self.predict_proba(x) > self.threshold).astype(np.uint8)
+
+    def save(self, path):
+        """One joblib file with the model, the threshold and the bin edges (as plain lists)."""
+        import joblib
+        joblib.dump({'binner': self.binner.to_dict(), 'model': self.model, 'threshold': self.threshold}, path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+        params = joblib.load(path)
+        return cls(FeatureBinner.from_dict(params['binner']), params['model'], params['threshold'])
+
+
+def fit_boosting(codes, y, binner, threshold = DEFAULT_THRESHOLD, max_iter = 300, learning_rate = 0.1,
+                 max_leaf_nodes = 31, random_state = 22):
+    """Fit the gradient-boosting model on binned ``codes``; returns a ``BoostingScorer``.
+
+    Training stops early when the loss on 10% held-out rows stops improving.
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    model = HistGradientBoostingClassifier(
+        max_iter = max_iter,
+        learning_rate = learning_rate,
+        max_leaf_nodes = max_leaf_nodes,
+        max_bins = binner.max_bins,
+        early_stopping = True,
+        random_state = random_state,
+    )
+    model.fit(codes, y)
+    return BoostingScorer(binner, model, threshold)
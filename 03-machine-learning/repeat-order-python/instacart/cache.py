@@ -0,0 +1,148 @@
+"""Columnar on-disk cache of the Instacart CSV files.
+
+The first load of a table parses the CSV once (with the loader dtypes) and
+writes it to ``<cache_dir>/<name>.feather``. A ``<name>.json`` fingerprint
+is stored next to it with the source file size, mtime and checksum.
+Later loads read the Feather file directly, as long as the fingerprint still
+matches the CSV.
+
+- Same size and mtime: cache hit, the CSV is not touched.
+- Same size but a new mtime (e.g. the file was downloaded again with ``gdown``):
+  the checksum decides, so identical content is not re-parsed.
+- Any other change, or a change of the loader schema: the table is rebuilt.
+
+Feather needs ``pyarrow``. Without it the loader falls back to parsing the CSV.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+
+import pandas as pd
+
+from instacart.loader import TABLE_DTYPES, read_table_csv, table_path
+
+
+CACHE_FORMAT_VERSION = 1
+
+_CHECKSUM_BLOCK_SIZE = 8 * 1024 ** 2
+
+
+# --- 📂 Fingerprints ---
+
+def file_checksum(path):
+    """BLAKE2b checksum of a file, read in blocks."""
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_CHECKSUM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _schema_signature(name):
+    ## A change of the loader dtypes must invalidate the cached file as well.
+    return {col: str(dtype) for col, dtype in TABLE_DTYPES[name].items()}
+
+
+def _fingerprint(path, checksum = None):
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'checksum': checksum,
+    }
+
+
+def _cache_paths(name, cache_dir):
+    return (
+        os.path.join(cache_dir, f'{name}.feather'),
+        os.path.join(cache_dir, f'{name}.json'),
+    )
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = f'{meta_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent = 2)
+    os.replace(tmp_path, meta_path)
+
+
+def is_fresh(name, data_dir = '.', cache_dir = '.instacart-cache', verify_checksum = False):
+    """Check whether the cached copy of a table still matches its CSV.
+
+    ``verify_checksum=True`` always compares the checksum, even when the size
+    and mtime match.
+    """
+    source = table_path(name, data_dir)
+    data_path, meta_path = _cache_paths(name, cache_dir)
+    meta = _read_meta(meta_path)
+
+    if meta is None or not os.path.exists(data_path):
+        return False
+    if meta.get('version') != CACHE_FORMAT_VERSION or meta.get('schema') != _schema_signature(name):
+        return False
+
+    current = _fingerprint(source)
+    cached = meta['source']
+
+    if current['size'] != cached['size']:
+        return False
+    if current['mtime_ns'] == cached['mtime_ns'] and not verify_checksum:
+        return True
+
+    ## The mtime changed (or a full check was asked for): compare the content itself.
+    if file_checksum(source) != cached['checksum']:
+        return False
+
+    ## Same content, so keep the cache and remember the new mtime for the fast path.
+    meta['source']['mtime_ns'] = current['mtime_ns']
+    _write_meta(meta_path, meta)
+    return True
+
+
+# --- 📂 Cached Loading ---
+
+def build_cache(name, data_dir = '.', cache_dir = '.instacart-cache'):
+    """Parse a CSV with the loader dtypes and write its Feather copy."""
+    os.makedirs(cache_dir, exist_ok = True)
+    source = table_path(name, data_dir)
+    data_path, meta_path = _cache_paths(name, cache_dir)
+
+    df = read_table_csv(name, data_dir)
+
+    tmp_path = f'{data_path}.tmp'
+    df.to_feather(tmp_path)
+    os.replace(tmp_path, data_path)
+
+    _write_meta(meta_path, {
+        'version': CACHE_FORMAT_VERSION,
+        'table': name,
+        'schema': _schema_signature(name),
+        'source': _fingerprint(source, checksum = file_checksum(source)),
+    })
+    return df
+
+
+def load_cached(name, data_dir = '.', cache_dir = '.instacart-cache', usecols = None, verify_checksum = False):
+    """Load a table from the columnar cache, (re)building it when stale."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        warnings.warn('pyarrow is not installed, reading the CSV without the columnar cache.')
+        return read_table_csv(name, data_dir, usecols)
+
+    if is_fresh(name, data_dir, cache_dir, verify_checksum):
+        data_path, _ = _cache_paths(name, cache_dir)
+        return pd.read_feather(data_path, columns = usecols)
+
+    df = build_cache(name, data_dir, cache_dir)
+    return df if usecols is None else df[list(usecols)]
@@ -0,0 +1,162 @@
+"""Outlier capping of the model features (Q3 + 1.5 * IQR).
+
+``OutlierCapper`` replaces the per-feature capping loop (two ``quantile()``
+calls and an ``np.where`` copy per feature):
+
+- ``fit(x)``: Q1 and Q3 of every feature in one ``np.quantile(axis = 0)`` call.
+- ``partial_fit(chunk)``: for chunked data; each chunk is summarized by a
+  ``QuantileSketch`` and the sketches are merged, so the bounds never need
+  the whole training set in memory.
+- ``transform(x)``: clips in place (``np.minimum(..., out = x)``).
+
+A feature is only capped when the fitted data exceeds its bound (as in
+``reorder.py``). The caps are saved with the model as ``LinearScorer.upper_bounds``,
+and the scorer applies them to every chunk it scores.
+"""
+
+import numpy as np
+
+
+DEFAULT_SKETCH_SIZE = 2048
+
+
+# --- 📂 Mergeable Quantile Sketch ---
+
+class QuantileSketch:
+    """Weighted quantile summary of several columns, mergeable across chunks.
+
+    A chunk is summarized by ``size`` evenly spaced quantiles per column, each
+    carrying ``rows / size`` of weight. Merging concatenates the summaries and
+    compresses them back to ``size`` points, so the rank error stays around
+    ``1 / size`` whatever the number of chunks. Column minima and maxima are exact.
+    """
+
+    def __init__(self, values, weights, minimum, maximum, size = DEFAULT_SKETCH_SIZE):
+        self.values = values      # (points, columns), sorted per column
+        self.weights = weights    # (points, columns)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = size
+
+    @property
+    def count(self):
+        return float(self.weights[:, 0].sum()) if len(self.weights) else 0.0
+
+    @classmethod
+    def from_array(cls, x, size = DEFAULT_SKETCH_SIZE):
+        x = np.asarray(x, dtype = np.float64)
+        if x.ndim == 1:
+            x = x[:, None]
+
+        if len(x) <= size:
+            values = np.sort(x, axis = 0)
+            weights = np.ones_like(values)
+        else:
+            values = np.quantile(x, (np.arange(size) + 0.5) / size, axis = 0)
+            weights = np.full_like(values, len(x) / size)
+
+        return cls(values, weights, x.min(axis = 0), x.max(axis = 0), size)
+
+    def merge(self, other):
+        """Sketch of the union of both inputs."""
+        values = np.concatenate([self.values, other.values])
+        weights = np.concatenate([self.weights, other.weights])
+
+        order = np.argsort(values, axis = 0, kind = 'stable')
+        values = np.take_along_axis(values, order, axis = 0)
+        weights = np.take_along_axis(weights, order, axis = 0)
+
+        merged = QuantileSketch(
+            values, weights, np.minimum(self.minimum, other.minimum), np.maximum(self.maximum, other.maximum), self.size
+        )
+        return merged._compress() if len(values) > self.size else merged
+
+    def _compress(self):
+        probs = (np.arange(self.size) + 0.5) / self.size
+        values = self.quantile(probs)
+        weights = np.full_like(values, self.count / self.size)
+        return QuantileSketch(values, weights, self.minimum, self.maximum, self.size)
+
+    def quantile(self, q):
+        """Approximate quantiles ``q`` of every column: array of shape (len(q), columns)."""
+        q = np.atleast_1d(q)
+        out = np.empty((len(q), self.values.shape[1]))
+        for col in range(self.values.shape[1]):
+            ## Each point sits at the middle of its weight; the ends are the exact min / max.
+            cum = np.cumsum(self.weights[:, col])
+            ranks = np.r_[0, (cum - self.weights[:, col] / 2) / cum[-1], 1]
+            points = np.r_[self.minimum[col], self.values[:, col], self.maximum[col]]
+            out[:, col] = np.interp(q, ranks, points)
+        return out
+
+
+# --- 📂 Capping Transformer ---
+
+class OutlierCapper:
+    """Upper caps at Q3 + ``whisker`` * IQR per feature, fitted in one pass."""
+
+    def __init__(self, features, whisker = 1.5, sketch_size = DEFAULT_SKETCH_SIZE):
+        self.features = list(features)
+        self.whisker = whisker
+        self.sketch_size = sketch_size
+        self.sketch = None
+        self.bounds = None        # Q3 + whisker * IQR of every feature
+        self.maximum = None
+        self.upper_bounds = {}    # only the features that needed capping
+
+    @classmethod
+    def from_bounds(cls, features, upper_bounds):
+        """Capper with known caps (e.g. ``LinearScorer.upper_bounds``)."""
+        capper = cls(features)
+        capper.upper_bounds = dict(upper_bounds)
+        return capper
+
+    def _columns(self, x):
+        if hasattr(x, 'columns'):
+            return x[self.features].to_numpy(dtype = np.float64)
+        return np.asarray(x, dtype = np.float64)
+
+    def _set_bounds(self, q1, q3, maximum):
+        self.bounds = q3 + self.whisker * (q3 - q1)
+        self.maximum = maximum
+        self.upper_bounds = {
+            f: float(b) for f, b, m in zip(self.features, self.bounds, maximum) if m > b
+        }
+        return self
+
+    def fit(self, x):
+        """Exact bounds from the whole data (same values as ``Series.quantile``)."""
+        x = self._columns(x)
+        q1, q3 = np.quantile(x, [0.25, 0.75], axis = 0)
+        return self._set_bounds(q1, q3, x.max(axis = 0))
+
+    def partial_fit(self, x):
+        """Fold one chunk into the sketch and refresh the (approximate) bounds."""
+        x = self._columns(x)
+        if not len(x):
+            return self
+        chunk = QuantileSketch.from_array(x, self.sketch_size)
+        self.sketch = chunk if self.sketch is None else self.sketch.merge(chunk)
+        q1, q3 = self.sketch.quantile([0.25, 0.75])
+        return self._set_bounds(q1, q3, self.sketch.maximum)
+
+    @property
+    def caps(self):
+        """Cap vector aligned with ``features`` (inf = not capped)."""
+        return np.array([self.upper_bounds.get(f, np.inf) for f in self.features])
+
+    def outlier_counts(self, x):
+        """Rows above the bound, per feature (before ``transform``)."""
+        bounds = self.bounds if self.bounds is not None else self.caps
+        return dict(zip(self.features, (self._columns(x) > bounds).sum(axis = 0).tolist()))
+
+    def transform(self, x):
+        """Clip the capped features; NumPy float arrays are clipped in place, dataframes column by column."""
+        if hasattr(x, 'columns'):
+            for feature, cap in self.upper_bounds.items():
+                x[feature] = np.minimum(x[feature].to_numpy(), cap)
+            return x
+
+        if self.upper_bounds:
+            np.minimum(x, self.caps.astype(x.dtype), out = x)
+        return x
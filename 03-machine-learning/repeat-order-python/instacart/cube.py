@@ -0,0 +1,339 @@
+"""Pre-aggregated order cube for the scheduling reports.
+
+The golden-hour, golden-day and off-peak queries and the Tableau scheduling
+charts all group orders by ``order_dow`` x ``order_hour_of_day`` (and by
+department). ``OrderCube`` keeps those group totals, built in one pass:
+
+- ``order_cells``: one row per (dow, hour) with orders: orders, days_sum and days_count
+  (for the mean days_since_prior_order), over every order as in the SQL.
+- ``item_cells``: one row per (dow, hour, department_id, aisle_id) that has
+  items: distinct orders, items, reorders, days_sum and days_count of the
+  orders in the cell.
+
+Each item row is mapped to a dense cell index (order attributes gathered by
+order_id, department / aisle by product_id), and every measure is one
+``bincount`` over the cell indexes. All measures are additive, so
+``apply_new_orders`` folds a batch of new orders in without a rebuild (new
+products come with a ``products_batch``, which extends the catalogue and, for
+new aisles / departments, the cell arrays). Each aisle belongs to one
+department, so there are at most 168 x 134 = 22,512 non-empty item cells
+(dow x hour x aisle) with the Kaggle catalogue, plus 168 order cells; they are
+saved as one ``.npz`` file.
+
+The report functions (``golden_hour``, ``golden_day``, ``off_peak``,
+``department_schedule``, ``department_reorders``) read the cube only.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from instacart.error_analysis import Catalogue
+from instacart.loader import load_table
+from instacart.order_index import OrderIndex
+
+
+CUBE_PATH = 'order-cube.npz'
+
+DAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+N_DOW = 7
+N_HOUR = 24
+
+ORDER_MEASURES = ['orders', 'days_sum', 'days_count']
+ITEM_MEASURES = ['orders', 'items', 'reorders', 'days_sum', 'days_count']
+
+
+# --- 📂 Cell Aggregation ---
+
+def _order_cells(dow, hour, days):
+    cell = dow.astype(np.int64) * N_HOUR + hour
+    known = ~np.isnan(days)
+    n = N_DOW * N_HOUR
+    return {
+        'orders': np.bincount(cell, minlength = n),
+        'days_sum': np.bincount(cell[known], weights = days[known].astype(np.float64), minlength = n),
+        'days_count': np.bincount(cell[known], minlength = n),
+    }
+
+
+def _item_cells(order_id, dow, hour, days, department_id, aisle_id, reordered, n_departments, n_aisles):
+    ## Dense cell index: ((dow * 24 + hour) * n_departments + department_id) * n_aisles + aisle_id.
+    cell = ((dow.astype(np.int64) * N_HOUR + hour) * n_departments + department_id) * n_aisles + aisle_id
+    n = N_DOW * N_HOUR * n_departments * n_aisles
+
+    ## Distinct (order, cell) pairs: an order counts once per cell, whatever its number of items there.
+    pairs, first = np.unique(order_id.astype(np.int64) * n + cell, return_index = True)
+    order_cell = pairs % n
+    order_days = days[first].astype(np.float64)
+    known = ~np.isnan(order_days)
+
+    return {
+        'orders': np.bincount(order_cell, minlength = n),
+        'items': np.bincount(cell, minlength = n),
+        'reorders': np.bincount(cell, weights = reordered, minlength = n).astype(np.int64),
+        'days_sum': np.bincount(order_cell[known], weights = order_days[known], minlength = n),
+        'days_count': np.bincount(order_cell[known], minlength = n),
+    }
+
+
+def _gather_batch(orders_batch, order_id):
+    ## Order attributes of a small batch by searchsorted (no dense index over every order_id).
+    batch = orders_batch.sort_values('order_id')
+    batch_ids = batch['order_id'].to_numpy()
+    pos = np.minimum(np.searchsorted(batch_ids, order_id), max(len(batch_ids) - 1, 0))
+    if len(order_id) and (len(batch_ids) == 0 or (batch_ids[pos] != order_id).any()):
+        raise ValueError('order_products_batch contains order_ids that are not in orders_batch')
+    return (batch['order_dow'].to_numpy()[pos], batch['order_hour_of_day'].to_numpy()[pos],
+            batch['days_since_prior_order'].to_numpy()[pos])
+
+
+# --- 📌 Cube ---
+
+class OrderCube:
+    """(dow, hour) order cells and (dow, hour, department, aisle) item cells, as dense arrays."""
+
+    def __init__(self, order_cells, item_cells, catalogue):
+        self.order_cells = order_cells      # name -> array of N_DOW * N_HOUR
+        self.item_cells = item_cells        # name -> array of N_DOW * N_HOUR * n_departments * n_aisles
+        self.catalogue = catalogue
+        self.n_departments = int(catalogue.department_of.max()) + 1
+        self.n_aisles = int(catalogue.aisle_of.max()) + 1
+
+    @classmethod
+    def build(cls, orders, order_products, products):
+        """Full build from the orders table, the order-products rows (prior and / or train) and products."""
+        catalogue = Catalogue.from_tables(products[['product_id', 'aisle_id', 'department_id']])
+        cube = cls(
+            _order_cells(orders['order_dow'].to_numpy(), orders['order_hour_of_day'].to_numpy(),
+                         orders['days_since_prior_order'].to_numpy()),
+            None, catalogue,
+        )
+
+        index = OrderIndex(orders)
+        order_id = order_products['order_id'].to_numpy()
+        cube.item_cells = cube._items(
+            order_id, index.gather(order_id, 'order_dow'), index.gather(order_id, 'order_hour_of_day'),
+            index.gather(order_id, 'days_since_prior_order'), order_products,
+        )
+        return cube
+
+    def _items(self, order_id, dow, hour, days, order_products):
+        product_id = order_products['product_id'].to_numpy()
+        ## Aisle / department ids start at 1: 0 in the catalogue means an unknown product.
+        aisle_of = self.catalogue.aisle_of
+        known = (product_id >= 0) & (product_id < len(aisle_of))
+        known[known] = aisle_of[product_id[known]] > 0
+        if not known.all():
+            raise ValueError('order_products contains product_ids that are not in the catalogue '
+                             '(pass them in products_batch)')
+        return _item_cells(
+            order_id, dow, hour, days,
+            self.catalogue.group_ids(product_id, 'department'), self.catalogue.group_ids(product_id, 'aisle'),
+            order_products['reordered'].to_numpy(), self.n_departments, self.n_aisles,
+        )
+
+    # --- 📂 Incremental Refresh ---
+
+    def apply_new_orders(self, orders_batch, order_products_batch, products_batch = None):
+        """Add a batch of new orders (and their products) to the cells.
+
+        Each order must come in one batch only: its distinct-order counts are added, not merged.
+        ``products_batch`` (product_id, aisle_id, department_id) adds products that are not in
+        the catalogue yet; order products of any other unknown product_id raise a ``ValueError``.
+        """
+        if products_batch is not None:
+            self._extend_catalogue(products_batch)
+
+        ## Both parts of the batch are aggregated (and checked) before any cell changes.
+        order_id = order_products_batch['order_id'].to_numpy()
+        dow, hour, days = _gather_batch(orders_batch, order_id)
+        item_batch = self._items(order_id, dow, hour, days, order_products_batch)
+        order_batch = _order_cells(orders_batch['order_dow'].to_numpy(), orders_batch['order_hour_of_day'].to_numpy(),
+                                   orders_batch['days_since_prior_order'].to_numpy())
+
+        for name in ORDER_MEASURES:
+            self.order_cells[name] = self.order_cells[name] + order_batch[name]
+        for name in ITEM_MEASURES:
+            self.item_cells[name] = self.item_cells[name] + item_batch[name]
+        return self
+
+    def _extend_catalogue(self, products_batch):
+        product_id = products_batch['product_id'].to_numpy()
+        size = max(len(self.catalogue.aisle_of), int(product_id.max()) + 1 if len(product_id) else 0)
+        for name, col in [('aisle_of', 'aisle_id'), ('department_of', 'department_id')]:
+            lookup = np.zeros(size, dtype = getattr(self.catalogue, name).dtype)
+            lookup[:len(getattr(self.catalogue, name))] = getattr(self.catalogue, name)
+            lookup[product_id] = products_batch[col].to_numpy()
+            setattr(self.catalogue, name, lookup)
+
+        ## New aisles / departments: copy the cells into the larger (dow x hour, department, aisle) layout.
+        n_departments = max(self.n_departments, int(self.catalogue.department_of.max()) + 1)
+        n_aisles = max(self.n_aisles, int(self.catalogue.aisle_of.max()) + 1)
+        if (n_departments, n_aisles) != (self.n_departments, self.n_aisles):
+            for name in ITEM_MEASURES:
+                old = self.item_cells[name].reshape(N_DOW * N_HOUR, self.n_departments, self.n_aisles)
+                grown = np.zeros((N_DOW * N_HOUR, n_departments, n_aisles), dtype = old.dtype)
+                grown[:, :self.n_departments, :self.n_aisles] = old
+                self.item_cells[name] = grown.reshape(-1)
+            self.n_departments, self.n_aisles = n_departments, n_aisles
+
+    # --- 📂 Cell Tables ---
+
+    def order_table(self):
+        """One row per (dow, hour) that has orders, with its order count and mean days_since_prior_order."""
+        cell = np.flatnonzero(self.order_cells['orders'])
+        table = pd.DataFrame({
+            'order_dow': cell // N_HOUR,
+            'order_hour_of_day': cell % N_HOUR,
+            **{name: self.order_cells[name][cell] for name in ORDER_MEASURES},
+        })
+        return _with_mean_days(table)
+
+    def item_table(self):
+        """One row per non-empty (dow, hour, department_id, aisle_id) cell."""
+        cell = np.flatnonzero(self.item_cells['items'])
+        aisle_id = cell % self.n_aisles
+        rest = cell // self.n_aisles
+        table = pd.DataFrame({
+            'order_dow': rest // self.n_departments // N_HOUR,
+            'order_hour_of_day': rest // self.n_departments % N_HOUR,
+            'department_id': rest % self.n_departments,
+            'aisle_id': aisle_id,
+            **{name: self.item_cells[name][cell] for name in ITEM_MEASURES},
+        })
+        return _with_mean_days(table)
+
+    # --- 📂 Persistence ---
+
+    def save(self, path = CUBE_PATH):
+        """Non-empty cells only, with uint8 keys, in one compressed ``.npz`` file."""
+        items = self.item_table()
+        np.savez_compressed(
+            path,
+            **{f'order_{name}': self.order_cells[name] for name in ORDER_MEASURES},
+            **{f'item_{col}': items[col].to_numpy(dtype = np.uint8)
+               for col in ['order_dow', 'order_hour_of_day', 'department_id', 'aisle_id']},
+            **{f'item_{name}': items[name].to_numpy() for name in ITEM_MEASURES},
+            aisle_of = self.catalogue.aisle_of,
+            department_of = self.catalogue.department_of,
+        )
+
+    @classmethod
+    def load(cls, path = CUBE_PATH):
+        with np.load(path) as data:
+            cube = cls(
+                {name: data[f'order_{name}'] for name in ORDER_MEASURES}, None,
+                Catalogue(data['aisle_of'], data['department_of']),
+            )
+            cell = (((data['item_order_dow'].astype(np.int64) * N_HOUR + data['item_order_hour_of_day'])
+                     * cube.n_departments + data['item_department_id']) * cube.n_aisles + data['item_aisle_id'])
+            n = N_DOW * N_HOUR * cube.n_departments * cube.n_aisles
+            cube.item_cells = {}
+            for name in ITEM_MEASURES:
+                values = data[f'item_{name}']
+                cube.item_cells[name] = np.zeros(n, dtype = values.dtype)
+                cube.item_cells[name][cell] = values
+        return cube
+
+
+def _with_mean_days(table):
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        table['mean_days_since_prior'] = table['days_sum'] / table['days_count']
+    return table
+
+
+# --- 📊 Reports (cube cells only) ---
+
+def golden_hour(cube, top = 10):
+    """Orders per hour of day, busiest first (golden hour query)."""
+    hours = cube.order_table().groupby('order_hour_of_day')['orders'].sum()
+    return hours.sort_values(ascending = False).head(top).rename('count_order_hour').reset_index()
+
+
+def golden_day(cube):
+    """Orders per day of week, busiest first (golden day query)."""
+    days = cube.order_table().groupby('order_dow')['orders'].sum().sort_values(ascending = False)
+    return pd.DataFrame({'day_of_week': [DAY_NAMES[d] for d in days.index], 'count_order_day': days.to_numpy()})
+
+
+def off_peak(cube):
+    """Orders per (day, hour), quietest first (off-peak strategy query)."""
+    cells = cube.order_table().sort_values('orders', kind = 'stable')
+    return pd.DataFrame({
+        'day_of_week': [DAY_NAMES[d] for d in cells['order_dow']],
+        'order_hour': cells['order_hour_of_day'].to_numpy(),
+        'count_order': cells['orders'].to_numpy(),
+    })
+
+
+def department_schedule(cube, departments = None, measure = 'items'):
+    """(dow, hour) x department table of one measure (Tableau scheduling chart)."""
+    table = cube.item_table().groupby(['order_dow', 'order_hour_of_day', 'department_id'])[measure].sum()
+    table = table.unstack('department_id', fill_value = 0)
+    if departments is not None:
+        table = table.rename(columns = departments.set_index('department_id')['department'])
+    return table
+
+
+def department_reorders(cube, departments = None):
+    """Items, reorders, reorder rate and mean days_since_prior_order per department."""
+    table = cube.item_table().groupby('department_id')[['items', 'reorders', 'days_sum', 'days_count']].sum()
+    table['reorder_rate'] = table['reorders'] / table['items']
+    table['mean_days_since_prior'] = table['days_sum'] / table['days_count']
+    table = table.drop(columns = ['days_sum', 'days_count']).sort_values('reorders', ascending = False)
+    if departments is not None:
+        table.insert(0, 'department', departments.set_index('department_id')['department'].reindex(table.index))
+    return table.reset_index()
+
+
+# --- 📂 Command Line ---
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Build (or load) the order cube and print the scheduling reports.')
+    parser.add_argument('--data-dir', default = '.')
+    parser.add_argument('--cache-dir', default = None)
+    parser.add_argument('--cube', default = CUBE_PATH)
+    parser.add_argument('--rebuild', action = 'store_true', help = 'rebuild even if the cube file exists')
+    parser.add_argument('--trace-dir', default = 'traces')
+    args = parser.parse_args(argv)
+
+    from instacart.trace import Trace
+    trace = Trace('cube', trace_dir = args.trace_dir)
+
+    if args.rebuild or not os.path.exists(args.cube):
+        with trace.stage('load') as record:
+            orders = load_table('orders', args.data_dir, ['order_id', 'order_dow', 'order_hour_of_day',
+                                                          'days_since_prior_order', 'eval_set', 'user_id'], args.cache_dir)
+            order_products = load_table('order_products__prior', args.data_dir,
+                                        ['order_id', 'product_id', 'reordered'], args.cache_dir)
+            products = load_table('products', args.data_dir, ['product_id', 'aisle_id', 'department_id'], args.cache_dir)
+            record['rows_out'] = len(order_products)
+        with trace.stage('build', rows_in = order_products) as record:
+            cube = OrderCube.build(orders, order_products, products)
+            cube.save(args.cube)
+            record['rows_out'] = len(cube.item_table())
+        del orders, order_products
+
+    with trace.stage('reports') as record:
+        cube = OrderCube.load(args.cube)
+        departments = load_table('departments', args.data_dir, cache_dir = args.cache_dir)
+        reports = {
+            'GOLDEN HOUR ANALYSIS': golden_hour(cube),
+            'GOLDEN DAY ANALYSIS': golden_day(cube),
+            'OFF-PEAK STRATEGY ANALYSIS': off_peak(cube).head(10),
+            'REORDERS BY DEPARTMENT': department_reorders(cube, departments).head(10),
+        }
+        record['rows_out'] = len(cube.item_table())
+    trace.save()
+
+    print(f'{args.cube}: {len(cube.item_table()):,} item cells, {os.path.getsize(args.cube) / 1024:,.0f} KB')
+    for name, report in reports.items():
+        print(f'\n📌 {name}')
+        print(report.to_string(index = False))
+
+
+if __name__ == '__main__':
+    main()
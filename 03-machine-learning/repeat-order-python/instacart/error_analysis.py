@@ -0,0 +1,124 @@
+"""Integer-indexed error analysis (FN / FP / TP / TN) by product, aisle and department.
+
+Instead of merging the validation frame with ``products`` and ``aisles`` and
+counting string groups, every step stays on integer arrays:
+
+1. ``Catalogue``: dense product_id -> aisle_id / department_id lookup arrays
+   (plus dense name arrays, only read for the rows that are printed),
+2. ``outcome_codes``: one code per row, ``2 * actual + predicted``
+   (0 = TN, 1 = FP, 2 = FN, 3 = TP),
+3. ``outcome_counts``: TN / FP / FN / TP of every aisle (or department,
+   or product) from a single ``bincount`` of ``group * 4 + code``,
+4. ``top_groups`` / ``error_list``: names are attached to the top N rows only.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+OUTCOMES = ['tn', 'fp', 'fn', 'tp']
+
+LEVELS = ['aisle', 'department', 'product']
+
+
+# --- 📂 Dense Catalogue Lookups ---
+
+def _dense(ids, values, fill, dtype):
+    out = np.full(int(ids.max()) + 1 if len(ids) else 1, fill, dtype = dtype)
+    out[ids] = values
+    return out
+
+
+class Catalogue:
+    """product_id -> aisle_id / department_id arrays and id -> name arrays."""
+
+    def __init__(self, aisle_of, department_of, product_names = None, aisle_names = None, department_names = None):
+        self.aisle_of = aisle_of
+        self.department_of = department_of
+        self.names = {'product': product_names, 'aisle': aisle_names, 'department': department_names}
+
+    @classmethod
+    def from_tables(cls, products, aisles = None, departments = None):
+        """Build from the ``products`` table (and optionally ``aisles`` / ``departments`` for names)."""
+        product_id = products['product_id'].to_numpy()
+        aisle_of = _dense(product_id, products['aisle_id'].to_numpy(), 0, np.int16)
+        department_of = (
+            _dense(product_id, products['department_id'].to_numpy(), 0, np.int16)
+            if 'department_id' in products else None
+        )
+
+        def names(table, id_col, name_col):
+            if table is None or name_col not in table:
+                return None
+            return _dense(table[id_col].to_numpy(), table[name_col].to_numpy(), None, object)
+
+        return cls(
+            aisle_of, department_of,
+            names(products, 'product_id', 'product_name'),
+            names(aisles, 'aisle_id', 'aisle'),
+            names(departments, 'department_id', 'department'),
+        )
+
+    def group_ids(self, product_id, level):
+        """aisle_id / department_id / product_id of each row (0 = unknown product)."""
+        product_id = np.asarray(product_id)
+        if level == 'product':
+            return product_id
+        lookup = self.aisle_of if level == 'aisle' else self.department_of
+        if lookup is None:
+            raise ValueError(f"No '{level}' column in the products table")
+        known = product_id < len(lookup)
+        return np.where(known, lookup[np.where(known, product_id, 0)], 0)
+
+    def name(self, level, ids):
+        names = self.names[level]
+        ids = np.asarray(ids)
+        if names is None:
+            return np.array([f'{level} {i}' for i in ids], dtype = object)
+        known = ids < len(names)
+        out = np.full(len(ids), None, dtype = object)
+        out[known] = names[ids[known]]
+        return out
+
+
+# --- 📌 Outcome Counts ---
+
+def outcome_codes(y_true, y_pred):
+    """0 = TN, 1 = FP, 2 = FN, 3 = TP for each row."""
+    return (2 * np.asarray(y_true, dtype = np.int8) + np.asarray(y_pred, dtype = np.int8)).astype(np.int8)
+
+
+def outcome_counts(group_ids, codes, n_groups = None):
+    """(n_groups, 4) array of TN / FP / FN / TP counts per group id, from one bincount."""
+    group_ids = np.asarray(group_ids, dtype = np.int64)
+    n_groups = int(group_ids.max()) + 1 if n_groups is None else n_groups
+    flat = np.bincount(group_ids * 4 + codes, minlength = n_groups * 4)
+    return flat.reshape(n_groups, 4)
+
+
+def breakdown(catalogue, product_id, codes, level = 'aisle'):
+    """TN / FP / FN / TP counts per aisle / department / product id (groups with rows only)."""
+    counts = outcome_counts(catalogue.group_ids(product_id, level), codes)
+    ids = np.flatnonzero(counts.sum(axis = 1))
+    return pd.DataFrame(counts[ids], index = pd.Index(ids, name = f'{level}_id'), columns = OUTCOMES)
+
+
+def top_groups(counts, outcome = 'fn', n = 10, catalogue = None, level = 'aisle'):
+    """Top ``n`` groups by one outcome count, with their names (only those ``n`` are resolved)."""
+    top = counts.nlargest(n, outcome)
+    if catalogue is not None:
+        top.insert(0, f'{level}_name', catalogue.name(level, top.index.to_numpy()))
+    return top
+
+
+def error_list(user_id, product_id, codes, outcome = 'fn', catalogue = None, n = 10):
+    """First ``n`` rows of one outcome (e.g. the FN pairs to check), with product names, y_true and y_pred."""
+    code = OUTCOMES.index(outcome)
+    rows = np.flatnonzero(codes == code)[:n]
+    out = pd.DataFrame({'user_id': np.asarray(user_id)[rows], 'product_id': np.asarray(product_id)[rows]})
+    if catalogue is not None:
+        out['product_name'] = catalogue.name('product', out['product_id'].to_numpy())
+    ## The outcome code is 2 * y_true + y_pred, so it fixes both labels.
+    out['y_true'] = code // 2
+    out['y_pred'] = code % 2
+    return out
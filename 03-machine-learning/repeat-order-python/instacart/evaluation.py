@@ -0,0 +1,101 @@
+"""Threshold metrics of the reorder model from one sort of its probabilities.
+
+``ThresholdEvaluation`` takes the validation labels and the predicted
+probabilities (computed once per model, e.g. ``from_scorer``) and sorts them
+once. After that:
+
+- ``at(threshold)``: TN / FP / FN / TP, accuracy, precision, recall,
+  specificity and F1 of one threshold (one ``searchsorted``),
+- ``sweep(thresholds)``: the same metrics for every candidate threshold at once
+  (default: every distinct probability, i.e. the full curve),
+- ``best(metric)``: the threshold that maximizes a metric,
+- ``roc_auc()``: the area under the ROC curve from the same cumulative counts.
+
+A pair is predicted as reordered when ``proba > threshold``, the same rule
+as ``LinearScorer.predict``.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+METRICS = ['tn', 'fp', 'fn', 'tp', 'accuracy', 'precision', 'recall', 'specificity', 'f1']
+
+
+class ThresholdEvaluation:
+    """Cumulative confusion counts over the sorted validation probabilities."""
+
+    def __init__(self, y_true, proba):
+        y_true = np.asarray(y_true).astype(bool)
+        proba = np.asarray(proba)
+
+        order = np.argsort(proba, kind = 'stable')
+        self.proba = proba[order]
+        ## positives_below[k] = positives among the k lowest probabilities.
+        self.positives_below = np.r_[0, np.cumsum(y_true[order])]
+        self.n = len(proba)
+        self.n_pos = int(self.positives_below[-1])
+        self.n_neg = self.n - self.n_pos
+
+    @classmethod
+    def from_scorer(cls, scorer, x, y_true):
+        """Score ``x`` once with a ``LinearScorer`` and cache the probabilities."""
+        return cls(y_true, scorer.predict_proba(x))
+
+    def counts(self, thresholds):
+        """(tn, fp, fn, tp) arrays for an array of thresholds."""
+        ## Thresholds are compared in the dtype of the probabilities (float32 for LinearScorer).
+        below = np.searchsorted(self.proba, np.asarray(thresholds).astype(self.proba.dtype), side = 'right')
+        fn = self.positives_below[below]
+        tn = below - fn
+        tp = self.n_pos - fn
+        fp = self.n_neg - tn
+        return tn, fp, fn, tp
+
+    def sweep(self, thresholds = None):
+        """Metrics of every threshold as a dataframe (default: every distinct probability)."""
+        thresholds = np.unique(self.proba) if thresholds is None else np.atleast_1d(thresholds)
+        tn, fp, fn, tp = self.counts(thresholds)
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            specificity = np.where(tn + fp > 0, tn / (tn + fp), 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+        return pd.DataFrame({
+            'threshold': np.asarray(thresholds, dtype = np.float64),
+            'tn': tn, 'fp': fp, 'fn': fn, 'tp': tp,
+            'accuracy': (tp + tn) / self.n,
+            'precision': precision,
+            'recall': recall,
+            'specificity': specificity,
+            'f1': f1,
+        })
+
+    def at(self, threshold):
+        """Metrics of one threshold as a dict."""
+        row = self.sweep([threshold]).iloc[0]
+        return {name: (int(row[name]) if name in ('tn', 'fp', 'fn', 'tp') else float(row[name]))
+                for name in ['threshold'] + METRICS}
+
+    def best(self, metric = 'f1', thresholds = None):
+        """Metrics of the threshold that maximizes ``metric``."""
+        curve = self.sweep(thresholds)
+        return self.at(float(curve.loc[curve[metric].idxmax(), 'threshold']))
+
+    def roc_auc(self):
+        """Area under the ROC curve (ties count one half, as in ``roc_auc_score``)."""
+        if self.n_pos == 0 or self.n_neg == 0:
+            return float('nan')
+        ## One ROC point per distinct probability, from the highest down.
+        _, tn, fn = self._distinct_counts()
+        tpr = np.r_[(self.n_pos - fn) / self.n_pos, 0.0][::-1]
+        fpr = np.r_[(self.n_neg - tn) / self.n_neg, 0.0][::-1]
+        return float(np.trapezoid(tpr, fpr) if hasattr(np, 'trapezoid') else np.trapz(tpr, fpr))
+
+    def _distinct_counts(self):
+        ## Counts of 'proba >= p' for every distinct p: everything strictly below p is negative.
+        values, first = np.unique(self.proba, return_index = True)
+        fn = self.positives_below[first]
+        return values, first - fn, fn
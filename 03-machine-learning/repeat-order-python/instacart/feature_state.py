@@ -0,0 +1,252 @@
+"""Persisted feature state with incremental updates.
+
+``FeatureState`` keeps the additive aggregates behind the feature tables:
+
+- the per (user_id, product_id) ``PairAggregates`` (sorted by pair key), in
+  two segments: the main arrays and a small sorted delta of the pairs that
+  were new since the last merge,
+- per-user totals (products bought, unique products) and order statistics
+  (order count, days sum, days count),
+- per-product totals (purchases, reorders).
+
+``apply_new_orders`` folds a batch of new orders into the state. Known pairs
+are updated in place (one ``searchsorted`` per segment); new pairs are inserted
+into the delta only, which costs O(batch + delta). The delta is merged into
+the main arrays (one O(total pairs) pass) once it holds more than
+``DELTA_FRACTION`` of them, so each merge is paid for by at least
+``DELTA_FRACTION`` x total new pairs: the amortized cost of a new pair is
+O(1 / DELTA_FRACTION), and a daily refresh costs time proportional to the
+day's orders. The feature tables built from the state are identical to a full
+rebuild over the whole history.
+"""
+
+import numpy as np
+
+from instacart import pair_key
+from instacart.features import (
+    PAIR_FIELDS,
+    PairAggregates,
+    customer_features_from_totals,
+    customer_totals,
+    product_features_from_totals,
+    product_totals,
+    user_order_stats,
+    user_product_features,
+)
+
+
+_FEATURE_EVAL_SETS = ['prior', 'train']
+
+## The delta segment is merged into the main pair arrays once it holds more than this fraction of them.
+DELTA_FRACTION = 0.05
+
+
+def _grow(array, size):
+    if len(array) >= size:
+        return array
+    grown = np.zeros(size, dtype = array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _update_found(pairs, part, rows):
+    """Add the ``rows`` of ``part`` whose keys are in ``pairs`` (in place); returns a mask of them."""
+    found = np.zeros(len(part), dtype = bool)
+    if not len(pairs) or not rows.any():
+        return found
+    idx, found[rows] = pair_key.lookup(pairs.keys, part.keys[rows])
+    hit = idx[found[rows]]
+
+    ## Keys of 'part' are unique, so plain fancy indexing is safe.
+    for name in PAIR_FIELDS:
+        if name == 'last_order_number':
+            pairs.fields[name][hit] = np.maximum(pairs.fields[name][hit], part[name][found])
+        else:
+            pairs.fields[name][hit] += part[name][found]
+    return found
+
+
+def _insert(pairs, part, rows):
+    """``pairs`` with the ``rows`` of ``part`` (keys not in ``pairs``) inserted at their sorted position."""
+    at = np.searchsorted(pairs.keys, part.keys[rows])
+    return PairAggregates(
+        np.insert(pairs.keys, at, part.keys[rows]),
+        **{name: np.insert(pairs[name], at, part[name][rows]) for name in PAIR_FIELDS}
+    )
+
+
+class FeatureState:
+    """Additive aggregates from which cust_features, prod_features and up_features are built."""
+
+    def __init__(self, pairs, user_totals, order_stats, prod_totals, delta_fraction = DELTA_FRACTION):
+        self.pairs = pairs
+        self.delta = PairAggregates.empty()
+        self.delta_fraction = delta_fraction
+        self.total_prod, self.unique_prod = user_totals
+        self.order_count, self.days_sum, self.days_count = order_stats
+        self.total_pur, self.reordered = prod_totals
+
+    @classmethod
+    def build(cls, prior_orders, orders):
+        """Full build from the prior rows (with order attributes attached) and the orders table."""
+        pairs = PairAggregates.from_frame(prior_orders)
+        order_stats = user_order_stats(orders)
+        return cls(pairs, customer_totals(pairs, len(order_stats[0])), order_stats, product_totals(pairs))
+
+    # --- 📂 Incremental Update ---
+
+    def apply_new_orders(self, orders_batch, order_products_batch):
+        """Fold a batch of new orders and their products into the state.
+
+        ``orders_batch`` has the columns of the 'orders' table for the new orders;
+        ``order_products_batch`` holds the products of the new prior orders.
+        Returns the (user_ids, product_ids, pair_keys) whose features changed.
+        """
+        self._apply_order_stats(orders_batch)
+
+        ## Attach the order attributes of the batch (searchsorted on the small batch, no dense index).
+        batch_orders = orders_batch.sort_values('order_id')
+        batch_ids = batch_orders['order_id'].to_numpy()
+        op_order_ids = order_products_batch['order_id'].to_numpy()
+        pos = np.minimum(np.searchsorted(batch_ids, op_order_ids), max(len(batch_ids) - 1, 0))
+        if len(op_order_ids) and (len(batch_ids) == 0 or (batch_ids[pos] != op_order_ids).any()):
+            raise ValueError('order_products_batch contains order_ids that are not in orders_batch')
+
+        eval_set = batch_orders['eval_set'].astype(str).to_numpy()[pos]
+        prior = eval_set == 'prior'
+        rows = order_products_batch[prior]
+        pos = pos[prior]
+
+        part = PairAggregates.from_rows(
+            batch_orders['user_id'].to_numpy()[pos],
+            rows['product_id'].to_numpy(),
+            rows['reordered'].to_numpy(),
+            rows['add_to_cart_order'].to_numpy(),
+            batch_orders['order_number'].to_numpy()[pos],
+            batch_orders['days_since_prior_order'].to_numpy()[pos],
+        )
+        new_pairs = self._apply_pairs(part)
+        self._apply_totals(part, new_pairs)
+
+        user_id, product_id = part.ids()
+        changed_users = np.union1d(np.unique(user_id), np.unique(orders_batch['user_id'].to_numpy()))
+        return changed_users, np.unique(product_id), part.keys
+
+    def _apply_order_stats(self, orders_batch):
+        counted = orders_batch[orders_batch['eval_set'].astype(str).isin(_FEATURE_EVAL_SETS)]
+        user_id = counted['user_id'].to_numpy()
+        days = counted['days_since_prior_order'].to_numpy().astype(np.float64)
+        has_days = ~np.isnan(days)
+
+        size = int(user_id.max()) + 1 if len(user_id) else 0
+        self._grow_users(size)
+
+        np.add.at(self.order_count, user_id, 1)
+        np.add.at(self.days_sum, user_id[has_days], days[has_days])
+        np.add.at(self.days_count, user_id[has_days], 1)
+
+    def _apply_pairs(self, part):
+        """Merge ``part`` into the pair aggregates; returns a mask of the pairs that are new."""
+        found = _update_found(self.pairs, part, np.ones(len(part), dtype = bool))
+        in_delta = _update_found(self.delta, part, ~found)
+        new = ~(found | in_delta)
+
+        ## New pairs: insert into the (small) delta at their sorted position.
+        if new.any():
+            self.delta = _insert(self.delta, part, new)
+            if len(self.delta) > self.delta_fraction * len(self.pairs):
+                self.compact()
+        return new
+
+    def compact(self):
+        """Merge the delta segment into the main pair arrays (one pass over all pairs)."""
+        if len(self.delta):
+            self.pairs = _insert(self.pairs, self.delta, np.ones(len(self.delta), dtype = bool))
+            self.delta = PairAggregates.empty()
+        return self
+
+    def _apply_totals(self, part, new_pairs):
+        user_id, product_id = part.ids()
+        self._grow_users(int(user_id.max()) + 1 if len(user_id) else 0)
+        self._grow_products(int(product_id.max()) + 1 if len(product_id) else 0)
+
+        np.add.at(self.total_prod, user_id, part['count'])
+        np.add.at(self.unique_prod, user_id[new_pairs], 1)
+        np.add.at(self.total_pur, product_id, part['count'])
+        np.add.at(self.reordered, product_id, part['reordered'])
+
+    def _grow_users(self, size):
+        self.total_prod = _grow(self.total_prod, size)
+        self.unique_prod = _grow(self.unique_prod, size)
+        self.order_count = _grow(self.order_count, size)
+        self.days_sum = _grow(self.days_sum, size)
+        self.days_count = _grow(self.days_count, size)
+
+    def _grow_products(self, size):
+        self.total_pur = _grow(self.total_pur, size)
+        self.reordered = _grow(self.reordered, size)
+
+    # --- 📂 Feature Tables ---
+
+    def cust_features(self, user_ids = None):
+        """'cust_features' for all users, or only ``user_ids`` (e.g. the ones a batch changed)."""
+        if user_ids is not None:
+            ## Only users with prior products have a row in 'cust_features'.
+            user_ids = np.asarray(user_ids)
+            user_ids = user_ids[user_ids < len(self.unique_prod)]
+            user_ids = user_ids[self.unique_prod[user_ids] > 0]
+        order_stats = (self.order_count, self.days_sum, self.days_count)
+        return customer_features_from_totals(self.total_prod, self.unique_prod, order_stats, user_ids)
+
+    def prod_features(self, product_ids = None):
+        """'prod_features' for all products, or only ``product_ids``."""
+        if product_ids is not None:
+            ## Only purchased products have a row in 'prod_features'.
+            product_ids = np.asarray(product_ids)
+            product_ids = product_ids[(product_ids >= 0) & (product_ids < len(self.total_pur))]
+            product_ids = product_ids[self.total_pur[product_ids] > 0]
+        return product_features_from_totals(self.total_pur, self.reordered, product_ids)
+
+    def up_features(self, pair_keys = None):
+        """'up_features' for all pairs, or only the pairs with the given keys."""
+        if pair_keys is None:
+            return user_product_features(self.compact().pairs)
+        pair_keys = np.sort(pair_keys)
+        parts = []
+        for pairs in (self.pairs, self.delta):
+            index, found = pair_key.lookup(pairs.keys, pair_keys)
+            parts.append(pairs.take(index[found]))
+        return user_product_features(PairAggregates.combine(parts))
+
+    def features(self):
+        """(cust_features, prod_features, up_features), same as a full rebuild."""
+        return self.cust_features(), self.prod_features(), self.up_features()
+
+    # --- 📂 Persistence ---
+
+    def save(self, path):
+        """Write the state (delta merged) to one uncompressed ``.npz`` file."""
+        self.compact()
+        np.savez(
+            path,
+            pair_keys = self.pairs.keys,
+            **{f'pair_{name}': self.pairs[name] for name in PAIR_FIELDS},
+            total_prod = self.total_prod,
+            unique_prod = self.unique_prod,
+            order_count = self.order_count,
+            days_sum = self.days_sum,
+            days_count = self.days_count,
+            total_pur = self.total_pur,
+            reordered = self.reordered,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            pairs = PairAggregates(data['pair_keys'], **{name: data[f'pair_{name}'] for name in PAIR_FIELDS})
+            return cls(
+                pairs,
+                (data['total_prod'], data['unique_prod']),
+                (data['order_count'], data['days_sum'], data['days_count']),
+                (data['total_pur'], data['reordered']),
+            )
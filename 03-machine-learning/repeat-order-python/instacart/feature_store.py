@@ -0,0 +1,136 @@
+"""Memory-mapped feature store keyed by (user_id, product_id).
+
+Layout of a store directory::
+
+    meta.json               column names and sizes
+    pair_keys.npy           sorted uint64 pair keys (see ``instacart.pair_key``)
+    pair/<column>.npy       float32, one value per pair, in key order
+    user/<column>.npy       float32, dense, indexed by user_id (NaN = no row)
+    product/<column>.npy    float32, dense, indexed by product_id (NaN = no row)
+
+Every file is opened with ``np.load(mmap_mode='r')``, so opening a store is
+near-instant and only the pages that are gathered are read. Looking up the
+features of a set of pairs is one ``searchsorted`` on the pair keys plus a
+gather per column, replacing the three pandas merges (customer, product,
+user-product) of the training and test sets.
+
+Missing values (a pair, user or product without features) come back as
+``fill`` (0 by default), the same as ``fillna(0)`` after the left merges.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instacart import pair_key
+
+
+def _write_dense(directory, ids, table, columns):
+    os.makedirs(directory, exist_ok = True)
+    size = int(ids.max()) + 1 if len(ids) else 0
+    for col in columns:
+        values = np.full(size, np.nan, dtype = np.float32)
+        values[ids] = table[col].to_numpy(dtype = np.float32, na_value = np.nan)
+        np.save(os.path.join(directory, f'{col}.npy'), values)
+
+
+class FeatureStore:
+    """Read-only, memory-mapped view of a feature store directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.pair_keys = np.load(os.path.join(path, 'pair_keys.npy'), mmap_mode = 'r')
+        self.arrays = {}
+        for level, columns in self.meta['columns'].items():
+            for col in columns:
+                self.arrays[col] = (level, np.load(os.path.join(path, level, f'{col}.npy'), mmap_mode = 'r'))
+
+    @property
+    def columns(self):
+        return list(self.arrays)
+
+    def __len__(self):
+        return len(self.pair_keys)
+
+    # --- 📂 Writing ---
+
+    @staticmethod
+    def write(path, cust_features, prod_features, up_features):
+        """Write the three feature tables as a store directory and return it opened."""
+        os.makedirs(path, exist_ok = True)
+
+        keys = pair_key.frame_keys(up_features)
+        order = np.argsort(keys, kind = 'stable')
+        np.save(os.path.join(path, 'pair_keys.npy'), keys[order])
+
+        columns = {
+            'user': [c for c in cust_features.columns if c != 'user_id'],
+            'product': [c for c in prod_features.columns if c != 'product_id'],
+            'pair': [c for c in up_features.columns if c not in ('user_id', 'product_id')],
+        }
+
+        os.makedirs(os.path.join(path, 'pair'), exist_ok = True)
+        for col in columns['pair']:
+            values = up_features[col].to_numpy(dtype = np.float32, na_value = np.nan)[order]
+            np.save(os.path.join(path, 'pair', f'{col}.npy'), values)
+
+        _write_dense(os.path.join(path, 'user'), cust_features['user_id'].to_numpy(), cust_features, columns['user'])
+        _write_dense(os.path.join(path, 'product'), prod_features['product_id'].to_numpy(), prod_features, columns['product'])
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'n_pairs': int(len(keys)), 'columns': columns}, f, indent = 2)
+
+        return FeatureStore(path)
+
+    # --- 📂 Lookup ---
+
+    def locate(self, user_id, product_id):
+        """Positions of the pairs in the store and a mask of the pairs that exist."""
+        return pair_key.lookup(self.pair_keys, pair_key.pack(user_id, product_id))
+
+    def gather(self, user_id, product_id, columns = None, fill = 0.0):
+        """Feature matrix (float32, rows in input order) for the given pairs."""
+        user_id = np.asarray(user_id)
+        product_id = np.asarray(product_id)
+        pos, found = self.locate(user_id, product_id)
+        return self.gather_positions(np.where(found, pos, -1), user_id, product_id, columns, fill)
+
+    def gather_positions(self, positions, user_id, product_id, columns = None, fill = 0.0):
+        """Feature matrix for pairs whose store positions are already known (-1 = not in the store).
+
+        Used by the batch scorer, which walks the store in key order and needs no key lookup.
+        """
+        columns = self.columns if columns is None else list(columns)
+        positions = np.asarray(positions)
+        found = positions >= 0
+        all_found = found.all()
+
+        out = np.empty((len(positions), len(columns)), dtype = np.float32)
+        for j, col in enumerate(columns):
+            level, values = self.arrays[col]
+            if level == 'pair':
+                if all_found:
+                    out[:, j] = values[positions]
+                else:
+                    out[:, j] = fill
+                    out[found, j] = values[positions[found]]
+            else:
+                ids = np.asarray(user_id if level == 'user' else product_id)
+                known = ids < len(values)
+                out[:, j] = fill
+                out[known, j] = values[ids[known]]
+
+        np.nan_to_num(out, copy = False, nan = fill)
+        return out
+
+    def gather_frame(self, pairs, columns = None, fill = 0.0):
+        """``pairs`` (a frame with user_id and product_id) with the feature columns appended."""
+        columns = self.columns if columns is None else list(columns)
+        matrix = self.gather(pairs['user_id'].to_numpy(), pairs['product_id'].to_numpy(), columns, fill)
+        features = pd.DataFrame(matrix, columns = columns, index = pairs.index)
+        return pd.concat([pairs, features], axis = 1)
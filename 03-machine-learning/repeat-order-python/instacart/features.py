@@ -0,0 +1,387 @@
+"""Fused single-pass feature engine.
+
+``reorder.py`` used to run four pandas groupby passes over the prior rows
+(customer, product, user-product and reordered-only user-product) and then
+merge the reorder-time table back into the user-product table.
+
+Every one of those features can be derived from per (user_id, product_id)
+partial aggregates:
+
+- count:              rows of the pair (= times the user bought the product)
+- reordered:          sum of ``reordered``
+- add_to_cart_sum:    sum of ``add_to_cart_order``
+- last_order_number:  max of ``order_number``
+- reorder_days_sum:   sum of ``days_since_prior_order`` over reordered rows
+
+So the prior rows are scanned once (one sort of the uint64 pair key plus
+``reduceat``) into a ``PairAggregates``, and the customer and product
+tables are reduced from the ~13M pairs with ``bincount``. The partial
+aggregates are additive (max for last_order_number), which is what the
+streaming, sharded and incremental builders rely on.
+
+``build_features_streaming`` reads ``order_products__prior`` in fixed-size
+chunks instead, so peak memory is bounded by the chunk size plus the
+aggregate state, not by the size of the order history.
+
+``build_features_parallel`` hash-partitions the prior rows by user_id and
+builds the shards in a process pool. Customer and user-product features
+are independent per user, and the product table is the sum of the
+per-shard product totals.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instacart import pair_key
+from instacart.loader import iter_table_chunks
+from instacart.order_index import OrderIndex
+
+
+## Products that were never reordered get this value for 'avg_days_between_reorder'
+## (the typical max order interval, i.e. a long / indefinite reorder cycle).
+NEVER_REORDERED_DAYS = 30
+
+PAIR_FIELDS = ['count', 'reordered', 'add_to_cart_sum', 'last_order_number', 'reorder_days_sum']
+
+_PAIR_DTYPES = {
+    'count': np.int32,
+    'reordered': np.int32,
+    'add_to_cart_sum': np.int32,
+    'last_order_number': np.uint8,
+    'reorder_days_sum': np.float64,
+}
+
+## Fields combined with max instead of sum.
+_MAX_FIELDS = {'last_order_number'}
+
+
+# --- 🔑 User-Product Partial Aggregates ---
+
+class PairAggregates:
+    """Partial aggregates per (user_id, product_id), sorted by pair key."""
+
+    def __init__(self, keys, **fields):
+        self.keys = keys
+        self.fields = {name: np.asarray(fields[name], dtype = _PAIR_DTYPES[name]) for name in PAIR_FIELDS}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype = np.uint64), **{name: np.empty(0) for name in PAIR_FIELDS})
+
+    @classmethod
+    def from_rows(cls, user_id, product_id, reordered, add_to_cart_order, order_number, days_since_prior_order):
+        """Aggregate raw order-product rows (one scan, one sort)."""
+        reordered = np.asarray(reordered)
+        ## The first order of a user has no days_since_prior_order (and is never a reorder).
+        reorder_days = np.where(reordered > 0, np.nan_to_num(np.asarray(days_since_prior_order, dtype = np.float64)), 0.0)
+
+        return cls._reduce(
+            pair_key.pack(user_id, product_id),
+            count = np.ones(len(reordered), dtype = np.int32),
+            reordered = reordered,
+            add_to_cart_sum = add_to_cart_order,
+            last_order_number = order_number,
+            reorder_days_sum = reorder_days,
+        )
+
+    @classmethod
+    def from_frame(cls, prior_orders):
+        """Aggregate a prior order-products frame with the order attributes attached."""
+        return cls.from_rows(
+            prior_orders['user_id'].to_numpy(),
+            prior_orders['product_id'].to_numpy(),
+            prior_orders['reordered'].to_numpy(),
+            prior_orders['add_to_cart_order'].to_numpy(),
+            prior_orders['order_number'].to_numpy(),
+            prior_orders['days_since_prior_order'].to_numpy(),
+        )
+
+    @classmethod
+    def combine(cls, parts):
+        """Merge several partial aggregates into one (keys may overlap)."""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+
+        return cls._reduce(
+            np.concatenate([part.keys for part in parts]),
+            **{name: np.concatenate([part[name] for part in parts]) for name in PAIR_FIELDS}
+        )
+
+    @classmethod
+    def _reduce(cls, keys, **fields):
+        order = np.argsort(keys, kind = 'stable')
+        keys = keys[order]
+
+        if len(keys) == 0:
+            return cls(keys, **fields)
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+        reduced = {}
+        for name in PAIR_FIELDS:
+            values = np.asarray(fields[name], dtype = _PAIR_DTYPES[name])[order]
+            ufunc = np.maximum if name in _MAX_FIELDS else np.add
+            reduced[name] = ufunc.reduceat(values, starts)
+
+        return cls(keys[starts], **reduced)
+
+    def ids(self):
+        """(user_id, product_id) arrays of the pairs."""
+        return pair_key.unpack(self.keys)
+
+    def take(self, index):
+        """Subset of the pairs at positions ``index`` (kept in key order when ``index`` is sorted)."""
+        return PairAggregates(self.keys[index], **{name: self.fields[name][index] for name in PAIR_FIELDS})
+
+
+# --- 🔑 Order-level User Statistics ---
+
+def user_order_stats(orders):
+    """Per-user order count and day sums from the prior + train orders.
+
+    Returns dense arrays indexed by user_id: (order_count, days_sum, days_count).
+    """
+    mask = orders['eval_set'].isin(['prior', 'train']).to_numpy()
+    user_id = orders['user_id'].to_numpy()[mask]
+    days = orders['days_since_prior_order'].to_numpy()[mask].astype(np.float64)
+
+    size = int(orders['user_id'].max()) + 1 if len(orders) else 0
+    has_days = ~np.isnan(days)
+
+    order_count = np.bincount(user_id, minlength = size)
+    days_sum = np.bincount(user_id[has_days], weights = days[has_days], minlength = size)
+    days_count = np.bincount(user_id[has_days], minlength = size)
+    return order_count, days_sum, days_count
+
+
+# --- 🔑 Feature Tables ---
+
+def _safe_divide(numerator, denominator, fill = np.nan):
+    out = np.full(len(numerator), fill, dtype = np.float64)
+    np.divide(numerator, denominator, out = out, where = denominator > 0)
+    return out
+
+
+def customer_totals(pairs, size = 0):
+    """Per-user (total products bought, unique products), dense arrays indexed by user_id."""
+    user_id, _ = pairs.ids()
+    size = max(size, int(user_id.max()) + 1 if len(user_id) else 0)
+
+    total_prod = np.bincount(user_id, weights = pairs['count'], minlength = size)
+    unique_prod = np.bincount(user_id, minlength = size)
+    return total_prod, unique_prod
+
+
+def customer_features_from_totals(total_prod, unique_prod, order_stats, users = None):
+    """'cust_features' table from the ``customer_totals`` and ``user_order_stats`` arrays.
+
+    ``users`` restricts the table to some user_ids (default: every user with prior products).
+    """
+    order_count, days_sum, days_count = order_stats
+    users = np.flatnonzero(unique_prod) if users is None else np.asarray(users)
+
+    known = users < len(order_count)
+    total_orders = np.zeros(len(users), dtype = np.float64)
+    total_orders[known] = order_count[users[known]]
+    avg_days = np.full(len(users), np.nan)
+    avg_days[known] = _safe_divide(days_sum[users[known]], days_count[users[known]])
+
+    return pd.DataFrame({
+        'user_id': users.astype(np.int32),
+        'cust_total_prod': total_prod[users].astype(np.int32),
+        'cust_unique_prod': unique_prod[users].astype(np.int32),
+        'user_total_orders': total_orders.astype(np.int32),
+        'user_avg_days_between_orders': avg_days.astype(np.float32),
+    })
+
+
+def customer_features(pairs, order_stats):
+    """'cust_features' table: cust_total_prod, cust_unique_prod, user_total_orders, user_avg_days_between_orders."""
+    return customer_features_from_totals(*customer_totals(pairs, len(order_stats[0])), order_stats)
+
+
+def product_totals(pairs, size = 0):
+    """Per-product (total purchases, reordered sum), dense arrays indexed by product_id.
+
+    Totals of disjoint sets of pairs (e.g. user shards) can simply be added.
+    """
+    _, product_id = pairs.ids()
+    size = max(size, int(product_id.max()) + 1 if len(product_id) else 0)
+
+    total_pur = np.bincount(product_id, weights = pairs['count'], minlength = size)
+    reordered = np.bincount(product_id, weights = pairs['reordered'], minlength = size)
+    return total_pur, reordered
+
+
+def product_features_from_totals(total_pur, reordered, products = None):
+    """'prod_features' table from the (summed) ``product_totals`` arrays.
+
+    ``products`` restricts the table to some product_ids (default: every purchased product).
+    """
+    products = np.flatnonzero(total_pur) if products is None else np.asarray(products)
+    return pd.DataFrame({
+        'product_id': products.astype(np.int32),
+        'prod_total_pur': total_pur[products].astype(np.int32),
+        'prod_reorder_rate': (reordered[products] / total_pur[products]).astype(np.float32),
+    })
+
+
+def product_features(pairs):
+    """'prod_features' table: prod_total_pur, prod_reorder_rate."""
+    return product_features_from_totals(*product_totals(pairs))
+
+
+def user_product_features(pairs):
+    """'up_features' table, including 'avg_days_between_reorder'.
+
+    Pairs that were never reordered get ``NEVER_REORDERED_DAYS``.
+    """
+    user_id, product_id = pairs.ids()
+    count = pairs['count']
+
+    return pd.DataFrame({
+        'user_id': user_id,
+        'product_id': product_id,
+        'count_orders': count,
+        'prod_reorder_ratio': (pairs['reordered'] / count).astype(np.float32),
+        'last_order_number': pairs['last_order_number'],
+        'avg_add_to_cart': (pairs['add_to_cart_sum'] / count).astype(np.float32),
+        'avg_days_between_reorder': _safe_divide(
+            pairs['reorder_days_sum'], pairs['reordered'], fill = NEVER_REORDERED_DAYS
+        ).astype(np.float32),
+    })
+
+
+def features_from_aggregates(pairs, order_stats):
+    """Finalize partial aggregates into (cust_features, prod_features, up_features)."""
+    return (
+        customer_features(pairs, order_stats),
+        product_features(pairs),
+        user_product_features(pairs),
+    )
+
+
+def build_features(prior_orders, orders):
+    """Build cust_features, prod_features and up_features from one scan of the prior rows.
+
+    ``prior_orders`` needs user_id, product_id, reordered, add_to_cart_order,
+    order_number and days_since_prior_order (see ``OrderIndex.attach``).
+    """
+    pairs = PairAggregates.from_frame(prior_orders)
+    return features_from_aggregates(pairs, user_order_stats(orders))
+
+
+# --- 🔑 Streaming Feature Build ---
+
+_ORDER_ATTRIBUTES = ['user_id', 'order_number', 'days_since_prior_order']
+
+
+def aggregate_chunks(chunks, order_index, eval_set = 'prior'):
+    """Reduce a stream of order-product chunks into one ``PairAggregates``.
+
+    Each chunk is aggregated on its own; the partial results are merged into
+    the running state once they hold as many rows as a chunk, so at most the
+    state plus about two chunks of partials are in memory at any time.
+    """
+    state = PairAggregates.empty()
+    pending = []
+    pending_rows = 0
+    chunk_rows = 0
+
+    for chunk in chunks:
+        chunk_rows = max(chunk_rows, len(chunk))
+        mask = order_index.eval_set_mask(chunk['order_id'].to_numpy(), eval_set)
+        if not mask.all():
+            chunk = chunk[mask].reset_index(drop = True)
+
+        order_index.attach(chunk, columns = _ORDER_ATTRIBUTES)
+        part = PairAggregates.from_frame(chunk)
+        pending.append(part)
+        pending_rows += len(part)
+
+        if pending_rows >= chunk_rows:
+            state = PairAggregates.combine([state] + pending)
+            pending, pending_rows = [], 0
+
+    return PairAggregates.combine([state] + pending)
+
+
+def build_features_streaming(orders, data_dir = '.', chunksize = 5_000_000):
+    """Same tables as ``build_features``, reading ``order_products__prior`` chunk by chunk."""
+    chunks = iter_table_chunks('order_products__prior', data_dir, chunksize)
+    pairs = aggregate_chunks(chunks, OrderIndex(orders))
+    return features_from_aggregates(pairs, user_order_stats(orders))
+
+
+# --- 🔑 Parallel Feature Build (sharded by user_id) ---
+
+_ROW_COLUMNS = ['user_id', 'product_id', 'reordered', 'add_to_cart_order', 'order_number', 'days_since_prior_order']
+
+
+def _build_shard(rows, order_stats, n_products):
+    ## Runs in a worker process: every user of the shard is complete here.
+    pairs = PairAggregates.from_rows(*rows)
+    return (
+        customer_features(pairs, order_stats),
+        user_product_features(pairs),
+        product_totals(pairs, n_products),
+    )
+
+
+def shard_rows(prior_orders, n_shards):
+    """Hash-partition the prior rows by ``user_id % n_shards``.
+
+    Yields one tuple of column arrays (in ``PairAggregates.from_rows`` order) per shard.
+    """
+    user_id = prior_orders['user_id'].to_numpy()
+    shard = user_id % n_shards
+    order = np.argsort(shard, kind = 'stable')
+    bounds = np.searchsorted(shard[order], np.arange(n_shards + 1))
+
+    columns = [prior_orders[col].to_numpy() for col in _ROW_COLUMNS]
+    for i in range(n_shards):
+        idx = order[bounds[i]:bounds[i + 1]]
+        yield tuple(col[idx] for col in columns)
+
+
+def build_features_parallel(prior_orders, orders, n_jobs = None, n_shards = None):
+    """Same tables as ``build_features``, with the shards built in ``n_jobs`` processes.
+
+    ``n_jobs`` defaults to the number of CPUs; ``n_shards`` defaults to ``n_jobs``.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_shards = n_shards or n_jobs
+
+    order_stats = user_order_stats(orders)
+    n_products = int(prior_orders['product_id'].max()) + 1 if len(prior_orders) else 0
+
+    with ProcessPoolExecutor(max_workers = n_jobs) as pool:
+        futures = [
+            pool.submit(_build_shard, rows, order_stats, n_products)
+            for rows in shard_rows(prior_orders, n_shards)
+        ]
+        results = [future.result() for future in futures]
+
+    cust_features = pd.concat([r[0] for r in results], ignore_index = True)
+    cust_features = cust_features.sort_values('user_id', ignore_index = True)
+
+    up_features = pd.concat([r[1] for r in results], ignore_index = True)
+    up_features = up_features.sort_values(['user_id', 'product_id'], ignore_index = True)
+
+    total_pur = sum(r[2][0] for r in results)
+    reordered = sum(r[2][1] for r in results)
+    prod_features = product_features_from_totals(total_pur, reordered)
+
+    return cust_features, prod_features, up_features
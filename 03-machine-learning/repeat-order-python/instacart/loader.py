@@ -0,0 +1,138 @@
+"""Typed loader for the Instacart CSV files.
+
+Every stage of the pipeline reads its tables through ``load_table`` so the
+same narrow dtypes are used everywhere:
+
+- ids (order_id, user_id, product_id) fit in int32.
+- order_number, order_dow, order_hour_of_day and add_to_cart_order never exceed 255, so uint8.
+- days_since_prior_order is float32 (NaN marks the first order of a user).
+- eval_set is a category with a fixed order ('prior', 'train', 'test'), so its codes are stable.
+"""
+
+import os
+
+import pandas as pd
+
+
+# --- 📂 Table Schemas ---
+
+EVAL_SETS = ['prior', 'train', 'test']
+
+EVAL_SET_DTYPE = pd.CategoricalDtype(categories = EVAL_SETS)
+
+_ORDER_PRODUCTS_DTYPES = {
+    'order_id': 'int32',
+    'product_id': 'int32',
+    'add_to_cart_order': 'uint8',
+    'reordered': 'uint8',
+}
+
+TABLE_DTYPES = {
+    'orders': {
+        'order_id': 'int32',
+        'user_id': 'int32',
+        'eval_set': EVAL_SET_DTYPE,
+        'order_number': 'uint8',
+        'order_dow': 'uint8',
+        'order_hour_of_day': 'uint8',
+        'days_since_prior_order': 'float32',
+    },
+    'order_products__prior': _ORDER_PRODUCTS_DTYPES,
+    'order_products__train': _ORDER_PRODUCTS_DTYPES,
+    'products': {
+        'product_id': 'int32',
+        'product_name': 'object',
+        'aisle_id': 'uint8',
+        'department_id': 'uint8',
+    },
+    'aisles': {
+        'aisle_id': 'uint8',
+        'aisle': 'object',
+    },
+    'departments': {
+        'department_id': 'uint8',
+        'department': 'object',
+    },
+}
+
+
+# --- 📂 Loading ---
+
+def table_path(name, data_dir = '.'):
+    """Return the CSV path of a source table, e.g. ``<data_dir>/orders.csv``."""
+    if name not in TABLE_DTYPES:
+        raise KeyError(f"Unknown table '{name}', expected one of {sorted(TABLE_DTYPES)}")
+    return os.path.join(data_dir, f'{name}.csv')
+
+
+def read_table_csv(name, data_dir = '.', usecols = None):
+    """Parse one Instacart CSV with its narrow dtypes.
+
+    ``usecols`` keeps only the listed columns (all columns by default).
+    """
+    dtypes = TABLE_DTYPES[name]
+    if usecols is not None:
+        dtypes = {col: dtypes[col] for col in usecols}
+
+    return pd.read_csv(
+        table_path(name, data_dir),
+        usecols = list(dtypes),
+        dtype = dtypes,
+    )
+
+
+def load_table(name, data_dir = '.', usecols = None, cache_dir = None):
+    """Load one Instacart table with its narrow dtypes.
+
+    With ``cache_dir`` the table is served from the columnar cache
+    (see ``instacart.cache``) instead of re-parsing the CSV.
+    """
+    if cache_dir is None:
+        return read_table_csv(name, data_dir, usecols)
+
+    from instacart.cache import load_cached
+    return load_cached(name, data_dir, cache_dir, usecols)
+
+
+def iter_table_chunks(name, data_dir = '.', chunksize = 5_000_000, usecols = None):
+    """Stream one Instacart CSV in typed chunks of ``chunksize`` rows."""
+    dtypes = TABLE_DTYPES[name]
+    if usecols is not None:
+        dtypes = {col: dtypes[col] for col in usecols}
+
+    with pd.read_csv(
+        table_path(name, data_dir),
+        usecols = list(dtypes),
+        dtype = dtypes,
+        chunksize = chunksize,
+    ) as reader:
+        yield from reader
+
+
+def load_tables(names, data_dir = '.', usecols = None, cache_dir = None):
+    """Load several tables into a dict keyed by table name.
+
+    ``usecols`` optionally maps a table name to the columns to keep.
+    """
+    usecols = usecols or {}
+    return {name: load_table(name, data_dir, usecols.get(name), cache_dir) for name in names}
+
+
+# --- 📂 Memory Footprint ---
+
+def memory_usage_mb(df):
+    """Deep memory usage of a dataframe in megabytes."""
+    return df.memory_usage(deep = True).sum() / 1024 ** 2
+
+
+def memory_report(tables):
+    """Summarise rows and memory of each table (dict of name -> dataframe).
+
+    The last row ('total') is the working set of all tables together.
+    """
+    report = pd.DataFrame(
+        [(name, len(df), memory_usage_mb(df)) for name, df in tables.items()],
+        columns = ['table', 'rows', 'memory_mb'],
+    )
+    total = pd.DataFrame([('total', report['rows'].sum(), report['memory_mb'].sum())], columns = report.columns)
+    return pd.concat([report, total], ignore_index = True).set_index('table')
@@ -0,0 +1,107 @@
+"""Load-test harness for the reorder-scoring service.
+
+Opens ``--connections`` keep-alive connections to a running
+``instacart.serve`` and sends ``--requests`` requests in total, for random
+user_ids (single ``GET /users/<id>/top`` requests, or ``POST /top`` batches
+with ``--batch-size`` users). Prints throughput and the latency percentiles.
+
+    python -m instacart.loadtest --port 8080 --max-user-id 206209 --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length)
+    return int(status_line.split()[1]), body
+
+
+async def _worker(host, port, user_ids, k, batch_size, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if batch_size == 1:
+                request = f'GET /users/{batch[0]}/top?k={k} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode()
+            else:
+                body = json.dumps({'user_ids': [int(u) for u in batch], 'k': k}).encode()
+                request = (
+                    f'POST /top HTTP/1.1\r\nHost: {host}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+                ).encode() + body
+
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, _ = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load_test(host = '127.0.0.1', port = 8080, requests = 10_000, connections = 16,
+                        max_user_id = 206_209, k = 20, batch_size = 1, seed = 22):
+    """Run the load test and return a summary dict (latencies in milliseconds)."""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(1, max_user_id + 1, size = requests * batch_size)
+    ## Split whole requests (not single users) across the connections.
+    per_connection = [ids.ravel() for ids in np.array_split(user_ids.reshape(requests, batch_size), connections)]
+
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _worker(host, port, ids, k, batch_size, latencies, errors)
+        for ids in per_connection if len(ids)
+    ])
+    elapsed = time.perf_counter() - started
+
+    latency_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'users': len(user_ids),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latency_ms, 50)),
+        'p95_ms': float(np.percentile(latency_ms, 95)),
+        'p99_ms': float(np.percentile(latency_ms, 99)),
+        'max_ms': float(latency_ms.max()),
+    }
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Load-test the reorder-scoring service.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--requests', type = int, default = 10_000)
+    parser.add_argument('--connections', type = int, default = 16)
+    parser.add_argument('--max-user-id', type = int, default = 206_209)
+    parser.add_argument('--k', type = int, default = 20)
+    parser.add_argument('--batch-size', type = int, default = 1, help = 'users per request (>1 uses POST /top)')
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run_load_test(
+        args.host, args.port, args.requests, args.connections, args.max_user_id, args.k, args.batch_size
+    ))
+    for name, value in summary.items():
+        print(f'{name:>20}: {value:,.3f}' if isinstance(value, float) else f'{name:>20}: {value:,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""64-bit composite key for (user_id, product_id) pairs.
+
+A pair is packed into one uint64: user_id in the high 32 bits and
+product_id in the low 32 bits. Sorting the keys sorts by user_id, then
+product_id, so the key order is the same as ``groupby(['user_id', 'product_id'])``.
+
+Pair-level joins then work on a single integer column:
+
+- ``lookup``: positions of keys in a sorted key array (``searchsorted``).
+- ``join_index``: for each left key, the row of the matching right key (or -1).
+- ``semi_join_mask`` / ``anti_join_mask``: which left keys do (not) appear on the right.
+"""
+
+import numpy as np
+
+
+_SHIFT = np.uint64(32)
+_LOW_MASK = np.uint64(0xFFFFFFFF)
+
+
+def pack(user_id, product_id):
+    """Pack user_id and product_id arrays into uint64 keys."""
+    high = np.asarray(user_id).astype(np.uint64) << _SHIFT
+    return high | np.asarray(product_id).astype(np.uint64)
+
+
+def unpack(keys):
+    """Inverse of ``pack``: returns (user_id, product_id) as int32 arrays."""
+    keys = np.asarray(keys, dtype = np.uint64)
+    return (keys >> _SHIFT).astype(np.int32), (keys & _LOW_MASK).astype(np.int32)
+
+
+def frame_keys(df, user_col = 'user_id', product_col = 'product_id'):
+    """Packed keys of the user / product columns of a dataframe."""
+    return pack(df[user_col].to_numpy(), df[product_col].to_numpy())
+
+
+def iter_frame_keys(df, chunksize = 1_000_000, user_col = 'user_id', product_col = 'product_id'):
+    """Packed keys of a dataframe, yielded in chunks of ``chunksize`` rows."""
+    for start in range(0, len(df), chunksize):
+        yield frame_keys(df.iloc[start:start + chunksize], user_col, product_col)
+
+
+def lookup(sorted_keys, keys):
+    """Positions of ``keys`` in ``sorted_keys`` and a mask of the keys that were found."""
+    keys = np.asarray(keys, dtype = np.uint64)
+    pos = np.searchsorted(sorted_keys, keys)
+    found = np.zeros(len(keys), dtype = bool)
+    in_range = pos < len(sorted_keys)
+    found[in_range] = sorted_keys[pos[in_range]] == keys[in_range]
+    return pos, found
+
+
+def join_index(left_keys, right_keys):
+    """For each left key, the row number of the matching right key, or -1.
+
+    ``right_keys`` must be unique (e.g. one row per pair).
+    """
+    order = np.argsort(right_keys, kind = 'stable')
+    pos, found = lookup(np.asarray(right_keys)[order], left_keys)
+    index = np.full(len(pos), -1, dtype = np.int64)
+    index[found] = order[pos[found]]
+    return index
+
+
+def semi_join_mask(left_keys, right_keys, assume_unique = False):
+    """Mask of the left keys that appear in ``right_keys``.
+
+    With ``assume_unique``, ``right_keys`` must already be sorted and unique (e.g. the
+    output of ``np.unique``), so repeated joins against it skip the sort.
+    """
+    right_keys = np.asarray(right_keys, dtype = np.uint64) if assume_unique else np.unique(right_keys)
+    _, found = lookup(right_keys, left_keys)
+    return found
+
+
+def anti_join_mask(left_keys, right_keys, assume_unique = False):
+    """Mask of the left keys that do not appear in ``right_keys``."""
+    return ~semi_join_mask(left_keys, right_keys, assume_unique)
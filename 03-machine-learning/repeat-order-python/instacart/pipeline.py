@@ -0,0 +1,462 @@
+"""Importable stages of the reorder pipeline and its command line.
+
+``reorder.py`` walks through the analysis top to bottom (with previews and
+charts). Production runs use the same steps as stage functions:
+
+- ``load_order_products``: prior / train rows with their order attributes attached.
+- ``training_set``: positives + 1:1 negatives with their features from the feature store.
+- ``cap_outliers``: IQR capping of the model features (the caps are kept with the model).
+- ``fit_model``: train / validation split and the saga logistic regression
+  (``fit_boosting_model``: histogram gradient boosting on uint8 binned features, see ``instacart.binning``;
+  ``search`` compares penalties, solvers, C values and feature sets in parallel, see ``instacart.search``).
+- ``segment``: RF customer segments and churn-risk lists (``instacart.segmentation``).
+- ``evaluate`` and ``error_analysis``: validation metrics (threshold sweep) and the FN / FP / TP / TN
+  counts per aisle and department.
+
+and the CLI runs them as commands, each leaving a trace in ``traces/``::
+
+    python -m instacart.pipeline features --data-dir . --cache-dir .instacart-cache
+    python -m instacart.pipeline train    --data-dir . --cache-dir .instacart-cache [--model-type boosting]
+    python -m instacart.pipeline search   --data-dir . --cache-dir .instacart-cache --n-jobs 8
+    python -m instacart.pipeline score    --data-dir . --cache-dir .instacart-cache
+    python -m instacart.pipeline segment  --data-dir . --cache-dir .instacart-cache
+    python -m instacart.pipeline report   --data-dir . --headless
+
+sklearn, matplotlib and seaborn are only imported by the stages that use them,
+so ``score`` starts with NumPy and pandas alone. ``--headless`` skips every
+preview and chart.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instacart.loader import load_table, memory_report
+from instacart.scoring import DEFAULT_THRESHOLD
+
+
+CACHE_DIR = '.instacart-cache'
+FEATURE_STORE_DIR = 'feature-store'
+MODEL_PATH = 'reorder-model.json'
+BOOSTING_MODEL_PATH = 'reorder-boosting.joblib'
+BINNED_DIR = 'binned-train'
+VALIDATION_PATH = 'validation.npz'
+PREDICTIONS_PATH = 'instacart_test_predictions.csv'
+SEARCH_PATH = 'search-leaderboard.csv'
+
+CORE_FEATURES = [
+    'count_orders',
+    'avg_days_between_reorder',
+    'prod_reorder_rate',
+    'user_avg_days_between_orders',
+]
+
+
+# --- 📂 Loading ---
+
+def load_orders(data_dir = '.', cache_dir = None, columns = None):
+    columns = columns or ['order_id', 'user_id', 'eval_set', 'order_number', 'days_since_prior_order']
+    return load_table('orders', data_dir, columns, cache_dir)
+
+
+def load_order_products(name, order_index, data_dir = '.', cache_dir = None, columns = ('user_id',)):
+    """One order-products table with ``columns`` of its orders attached.
+
+    Only the rows of the matching eval_set are kept ('prior' / 'train').
+    """
+    rows = load_table(name, data_dir, cache_dir = cache_dir)
+    mask = order_index.eval_set_mask(rows['order_id'], name.rsplit('__', 1)[1])
+    rows = rows if mask.all() else rows[mask].reset_index(drop = True)
+    order_index.attach(rows, columns = list(columns))
+    return rows
+
+
+# --- 🔑 Training Set ---
+
+def training_set(store, train_orders, random_state = 22):
+    """Positive pairs of the train orders + as many sampled negatives, with their store features."""
+    from instacart import pair_key
+    from instacart.sampling import sample_negatives
+
+    positive_cases = train_orders[['user_id', 'product_id']].copy()
+    positive_cases['reordered_next'] = 1
+
+    negative_keys = sample_negatives(
+        store.pair_keys, pair_key.frame_keys(positive_cases), n = len(positive_cases), random_state = random_state
+    )
+    negative_user_id, negative_product_id = pair_key.unpack(negative_keys)
+    negative_sample = pd.DataFrame({'user_id': negative_user_id, 'product_id': negative_product_id})
+    negative_sample['reordered_next'] = 0
+
+    return store.gather_frame(pd.concat([positive_cases, negative_sample], ignore_index = True))
+
+
+def cap_outliers(data, features = CORE_FEATURES):
+    """Cap each feature at Q3 + 1.5 * IQR (in place); returns the caps that were applied."""
+    from instacart.capping import OutlierCapper
+
+    capper = OutlierCapper(features).fit(data)
+    capper.transform(data)
+    return capper.upper_bounds
+
+
+# --- 🏷️ Model ---
+
+def _split(data, features, random_state = 22):
+    ## 80 / 20 split shared by every model, so their validation metrics are comparable.
+    from sklearn.model_selection import train_test_split
+
+    x_train, x_val, y_train, y_val = train_test_split(
+        data[features], data['reordered_next'], test_size = 0.2, random_state = random_state
+    )
+    validation = {
+        'x': x_val.to_numpy(dtype = np.float32),
+        'y': y_val.to_numpy(dtype = np.uint8),
+        'user_id': data.loc[x_val.index, 'user_id'].to_numpy(),
+        'product_id': data.loc[x_val.index, 'product_id'].to_numpy(),
+    }
+    return x_train, y_train, validation
+
+
+def fit_model(data, features = CORE_FEATURES, upper_bounds = None, threshold = DEFAULT_THRESHOLD, random_state = 22):
+    """Fit the logistic regression on an 80 / 20 split.
+
+    Returns ``(scorer, validation)``: the model as a ``LinearScorer`` and the
+    validation rows (``x``, ``y``, ``user_id``, ``product_id`` and the cached ``proba`` arrays).
+    """
+    from sklearn.linear_model import LogisticRegression
+    from instacart.scoring import LinearScorer
+
+    x_train, y_train, validation = _split(data, features, random_state)
+    model = LogisticRegression(solver = 'saga', max_iter = 1000, random_state = random_state)
+    model.fit(x_train, y_train)
+
+    scorer = LinearScorer.from_estimator(model, features, threshold, upper_bounds)
+    validation['proba'] = scorer.predict_proba(validation['x'])
+    return scorer, validation
+
+
+def fit_boosting_model(data, features, threshold = DEFAULT_THRESHOLD, binned_dir = None, random_state = 22):
+    """Fit the histogram gradient-boosting model on uint8 binned features (same split as ``fit_model``).
+
+    The binned training matrix and its bin edges are written to ``binned_dir`` when given.
+    Returns ``(scorer, validation)`` with a ``BoostingScorer``.
+    """
+    from instacart.binning import FeatureBinner, fit_boosting, write_binned
+
+    x_train, y_train, validation = _split(data, features, random_state)
+    binner = FeatureBinner(features).fit(x_train, random_state = random_state)
+    codes = binner.transform(x_train)
+    y_train = y_train.to_numpy(dtype = np.uint8)
+    del x_train
+    if binned_dir:
+        write_binned(binned_dir, codes, y_train, binner)
+
+    scorer = fit_boosting(codes, y_train, binner, threshold, random_state = random_state)
+    validation['proba'] = scorer.predict_proba(validation['x'])
+    return scorer, validation
+
+
+def save_validation(path, validation):
+    np.savez(path, **validation)
+
+
+def load_validation(path):
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
+
+
+# --- 📌 Evaluation ---
+
+def validation_proba(validation, scorer):
+    """Validation probabilities, scored once per model and cached in ``validation['proba']``."""
+    if 'proba' not in validation:
+        validation['proba'] = scorer.predict_proba(validation['x'])
+    return validation['proba']
+
+
+def evaluate(validation, scorer):
+    """ROC AUC and the threshold metrics (at the model threshold and the best-F1 threshold)."""
+    from instacart.evaluation import ThresholdEvaluation
+
+    evaluation = ThresholdEvaluation(validation['y'], validation_proba(validation, scorer))
+    best = evaluation.best('f1')
+    return {
+        'roc_auc': evaluation.roc_auc(),
+        **evaluation.at(scorer.threshold),
+        'best_f1_threshold': best['threshold'],
+        'best_f1': best['f1'],
+    }
+
+
+def load_catalogue(data_dir = '.', cache_dir = None):
+    """Dense product -> aisle / department lookups with the aisle and department names."""
+    from instacart.error_analysis import Catalogue
+
+    return Catalogue.from_tables(
+        load_table('products', data_dir, ['product_id', 'aisle_id', 'department_id'], cache_dir),
+        load_table('aisles', data_dir, cache_dir = cache_dir),
+        load_table('departments', data_dir, cache_dir = cache_dir),
+    )
+
+
+def error_analysis(validation, scorer, catalogue, top = 10):
+    """TN / FP / FN / TP counts per aisle and department, and the top ``top`` FN / FP aisles by name."""
+    from instacart.error_analysis import breakdown, outcome_codes, top_groups
+
+    codes = outcome_codes(validation['y'], validation_proba(validation, scorer) > scorer.threshold)
+    aisles = breakdown(catalogue, validation['product_id'], codes, 'aisle')
+    return {
+        'aisle': aisles,
+        'department': breakdown(catalogue, validation['product_id'], codes, 'department'),
+        'fn': top_groups(aisles, 'fn', top, catalogue, 'aisle'),
+        'fp': top_groups(aisles, 'fp', top, catalogue, 'aisle'),
+    }
+
+
+# --- 📊 Charts ---
+
+def plot_report(validation, scorer, predictions = None):
+    """Validation label distribution and, with test predictions, the predicted distributions."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    labels = pd.Series(np.where(validation['y'] == 1, 'Reordered', 'Not Reordered')).value_counts()
+    plt.figure(figsize = (6, 4))
+    sns.barplot(x = labels.index, y = labels.to_numpy())
+    plt.title('Distribution of True Reordered Labels')
+    plt.ylabel('Number of Orders')
+    plt.show()
+
+    if predictions is not None:
+        plt.figure(figsize = (10, 6))
+        sns.histplot(x = predictions['reordered_proba'], bins = 50, kde = True, color = '#2ca02c')
+        plt.axvline(scorer.threshold, color = 'red', linestyle = '--', label = f'Decision Threshold ({scorer.threshold})')
+        plt.legend()
+        plt.title('Distribution of Predicted Reorder Probability on Test Set', fontsize = 14)
+        plt.xlabel('Predicted Probability (P(Reorder) | X)', fontsize = 12)
+        plt.ylabel('Count of User-Product Pairs', fontsize = 12)
+        plt.show()
+
+
+# --- 📂 Commands ---
+
+def _preview(args, title, frame):
+    if not args.headless:
+        print(f'\n--- {title} ---')
+        print(frame.head() if isinstance(frame, pd.DataFrame) else frame)
+
+
+def cmd_features(args, trace):
+    from instacart.feature_store import FeatureStore
+    from instacart.features import build_features
+    from instacart.order_index import OrderIndex
+
+    with trace.stage('load') as record:
+        orders = load_orders(args.data_dir, args.cache_dir)
+        order_index = OrderIndex(orders)
+        prior_orders = load_order_products(
+            'order_products__prior', order_index, args.data_dir, args.cache_dir,
+            columns = ['user_id', 'order_number', 'days_since_prior_order'],
+        )
+        record['rows_out'] = len(orders) + len(prior_orders)
+    _preview(args, 'Memory usage (MB)', memory_report({'orders': orders, 'order_products__prior': prior_orders}))
+
+    with trace.stage('features', rows_in = prior_orders) as record:
+        cust_features, prod_features, up_features = build_features(prior_orders, orders)
+        record['rows_out'] = len(cust_features) + len(prod_features) + len(up_features)
+    _preview(args, 'cust_features', cust_features)
+    _preview(args, 'prod_features', prod_features)
+    _preview(args, 'up_features', up_features)
+
+    with trace.stage('feature_store', rows_in = up_features) as record:
+        store = FeatureStore.write(args.store, cust_features, prod_features, up_features)
+        record['rows_out'] = len(store)
+    print(f'Feature store: {len(store):,} pairs in {args.store}')
+
+
+def _load_training_set(args, trace):
+    from instacart.feature_store import FeatureStore
+    from instacart.order_index import OrderIndex
+
+    with trace.stage('load') as record:
+        store = FeatureStore(args.store)
+        train_orders = load_order_products('order_products__train', OrderIndex(load_orders(args.data_dir, args.cache_dir)),
+                                           args.data_dir, args.cache_dir)
+        record['rows_out'] = len(train_orders)
+
+    with trace.stage('sampling', rows_in = train_orders) as record:
+        data = training_set(store, train_orders)
+        record['rows_out'] = len(data)
+    _preview(args, 'Training set', data)
+    return store, data
+
+
+def cmd_train(args, trace):
+    store, data = _load_training_set(args, trace)
+
+    if args.model_type == 'boosting':
+        ## Trees need no capping; they also take every feature in the store.
+        with trace.stage('fit', rows_in = data) as record:
+            scorer, validation = fit_boosting_model(data, store.columns, args.threshold, args.binned_dir)
+            record['rows_out'] = len(validation['y'])
+        _preview(args, 'Bins per feature', dict(zip(scorer.features, scorer.binner.n_bins)))
+    else:
+        with trace.stage('capping', rows_in = data):
+            upper_bounds = cap_outliers(data, CORE_FEATURES)
+        _preview(args, 'Upper bounds', upper_bounds)
+
+        with trace.stage('fit', rows_in = data) as record:
+            scorer, validation = fit_model(data, CORE_FEATURES, upper_bounds, args.threshold)
+            record['rows_out'] = len(validation['y'])
+
+    scorer.save(args.model)
+    save_validation(args.validation, validation)
+    print(f'Model saved to {args.model} (trained on {len(data) - len(validation["y"]):,} rows)')
+
+
+def cmd_search(args, trace):
+    from instacart.search import DEFAULT_CS, best_scorer, search, search_space
+
+    store, data = _load_training_set(args, trace)
+    features = store.columns
+
+    with trace.stage('capping', rows_in = data):
+        upper_bounds = cap_outliers(data, features)
+
+    with trace.stage('search', rows_in = data) as record:
+        paths = search_space({'core': CORE_FEATURES, 'all': features}, Cs = args.cs or DEFAULT_CS)
+        board = search(data, features, paths, n_jobs = args.n_jobs, threshold = args.threshold)
+        record['rows_out'] = len(board)
+
+    columns = ['rank', 'feature_set', 'penalty', 'solver', 'C', 'val_auc', 'val_f1', 'fit_s', 'n_iter']
+    print(board[columns].head(20).to_string(index = False))
+
+    output = args.output or SEARCH_PATH
+    board.to_csv(output, index = False)
+    print(f'Leaderboard of {len(board)} fits ({len(paths)} paths) saved to {output}')
+
+    if args.save_best:
+        best_scorer(board, threshold = args.threshold, upper_bounds = upper_bounds).save(args.model)
+        print(f'Best model saved to {args.model}')
+
+
+def cmd_segment(args, trace):
+    from instacart.segmentation import churn_risk, segment_customers, segment_summary
+
+    with trace.stage('load') as record:
+        orders = load_orders(args.data_dir, args.cache_dir, ['user_id', 'eval_set', 'order_number', 'days_since_prior_order'])
+        record['rows_out'] = len(orders)
+
+    with trace.stage('segment', rows_in = orders) as record:
+        customers = segment_customers(orders, n_jobs = args.n_jobs)
+        at_risk, lost = churn_risk(customers)
+        record['rows_out'] = len(customers)
+
+    print(segment_summary(customers).to_string(index = False))
+    print(f'High churn risk: {len(lost):,} Lost Customers, {len(at_risk):,} At-Risk Loyalists')
+
+    ## Same files as the R script, for the Marketing and Customer Service teams.
+    out_dir = args.output or '.'
+    os.makedirs(out_dir, exist_ok = True)
+    customers.to_csv(os.path.join(out_dir, 'cluster_cycle_analysis.csv'), index = False)
+    lost.to_csv(os.path.join(out_dir, 'cluster2_high_churn_risk.csv'), index = False)
+    at_risk.to_csv(os.path.join(out_dir, 'cluster4_high_churn_risk.csv'), index = False)
+
+
+def cmd_score(args, trace):
+    from instacart.feature_store import FeatureStore
+    from instacart.scoring import load_scorer, score_test_set
+
+    with trace.stage('load') as record:
+        store = FeatureStore(args.store)
+        scorer = load_scorer(args.model)
+        orders = load_orders(args.data_dir, args.cache_dir, ['order_id', 'user_id', 'eval_set'])
+        record['rows_out'] = len(orders)
+
+    with trace.stage('score') as record:
+        rows, positives = score_test_set(store, orders, scorer, args.output, args.chunksize, args.n_jobs)
+        record['rows_out'] = rows
+    print(f'Scored {rows:,} test pairs ({positives:,} predicted reorders) to {args.output}')
+
+
+def cmd_report(args, trace):
+    from instacart.scoring import load_scorer
+
+    scorer = load_scorer(args.model)
+    validation = load_validation(args.validation)
+
+    with trace.stage('evaluate', rows_in = validation['y']):
+        metrics = evaluate(validation, scorer)
+    with trace.stage('error_analysis', rows_in = validation['y']):
+        errors = error_analysis(validation, scorer, load_catalogue(args.data_dir, args.cache_dir))
+
+    print(pd.Series(metrics).to_string())
+    print('\nTop 10 Category Names that cause False Negatives (Lost Sales Opportunity):\n', errors['fn'][['aisle_name', 'fn']])
+    print('\nTop 10 Category Names that cause False Positives (Wasted Recommendations):\n', errors['fp'][['aisle_name', 'fp']])
+    _preview(args, 'Outcomes by department', errors['department'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                **metrics,
+                'top_fn_aisles': errors['fn'].set_index('aisle_name')['fn'].to_dict(),
+                'top_fp_aisles': errors['fp'].set_index('aisle_name')['fp'].to_dict(),
+                'departments': errors['department'].to_dict(orient = 'index'),
+            }, f, indent = 2, default = int)
+
+    if not args.headless:
+        predictions = pd.read_csv(args.predictions, usecols = ['reordered_proba']) if os.path.exists(args.predictions) else None
+        plot_report(validation, scorer, predictions)
+
+
+COMMANDS = {
+    'features': cmd_features,
+    'train': cmd_train,
+    'search': cmd_search,
+    'segment': cmd_segment,
+    'score': cmd_score,
+    'report': cmd_report,
+}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Instacart reorder pipeline.')
+    parser.add_argument('command', choices = list(COMMANDS))
+    parser.add_argument('--data-dir', default = '.', help = 'directory with the Instacart CSVs')
+    parser.add_argument('--cache-dir', default = None, help = f'columnar cache directory (e.g. {CACHE_DIR})')
+    parser.add_argument('--store', default = FEATURE_STORE_DIR, help = 'feature store directory')
+    parser.add_argument('--model', default = None,
+                        help = f'saved model (default {MODEL_PATH}, or {BOOSTING_MODEL_PATH} with --model-type boosting)')
+    parser.add_argument('--model-type', choices = ['linear', 'boosting'], default = 'linear',
+                        help = 'train: logistic regression or histogram gradient boosting on binned features')
+    parser.add_argument('--binned-dir', default = BINNED_DIR, help = 'train: uint8 binned training matrix and bin edges')
+    parser.add_argument('--validation', default = VALIDATION_PATH, help = 'validation rows saved by train')
+    parser.add_argument('--predictions', default = PREDICTIONS_PATH, help = 'test predictions written by score')
+    parser.add_argument('--output', default = None, help = 'score: predictions CSV, report: metrics JSON, search: leaderboard CSV, segment: output directory')
+    parser.add_argument('--threshold', type = float, default = DEFAULT_THRESHOLD)
+    parser.add_argument('--chunksize', type = int, default = 500_000)
+    parser.add_argument('--n-jobs', type = int, default = None)
+    parser.add_argument('--cs', type = float, nargs = '+', default = None, help = 'search: C values of each path')
+    parser.add_argument('--save-best', action = 'store_true', help = 'search: save the top model to --model')
+    parser.add_argument('--headless', action = 'store_true', help = 'skip previews and charts')
+    parser.add_argument('--trace-dir', default = 'traces')
+    parser.add_argument('--profile', action = 'store_true', help = 'write a cProfile .prof per stage')
+    args = parser.parse_args(argv)
+
+    if args.model is None:
+        args.model = BOOSTING_MODEL_PATH if args.model_type == 'boosting' else MODEL_PATH
+    if args.command == 'score' and args.output is None:
+        args.output = args.predictions
+
+    from instacart.trace import Trace
+    trace = Trace(args.command, profile = 'cprofile' if args.profile else None, trace_dir = args.trace_dir)
+    COMMANDS[args.command](args, trace)
+    trace.save()
+
+
+if __name__ == '__main__':
+    main()
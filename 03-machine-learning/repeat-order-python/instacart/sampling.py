@@ -0,0 +1,95 @@
+"""Negative sampling straight from the user-product key space.
+
+The training set pairs every positive case (a product reordered in the
+'train' order) with a negative one: a (user_id, product_id) pair from the
+prior history that was *not* reordered. Instead of materializing the full
+prior pair table, a left merge and a filtered pool, the sampler streams the
+candidate keys in chunks, drops the positives with an anti-join and keeps a
+reservoir of the candidates with the smallest random priorities.
+
+Memory is the reservoir (the sample size) plus one chunk of keys.
+
+- Uniform sampling: the ``n`` smallest priorities over all candidates are a
+  uniform sample without replacement.
+- Per-user stratification: each user keeps as many negatives as they have
+  positives (or their whole pool when it is smaller).
+"""
+
+import numpy as np
+
+from instacart import pair_key
+
+
+def _chunks(keys, chunksize):
+    if isinstance(keys, np.ndarray):
+        for start in range(0, len(keys), chunksize):
+            yield keys[start:start + chunksize]
+    else:
+        yield from keys
+
+
+def _keep_smallest(keys, priority, n):
+    if len(keys) <= n:
+        return keys, priority
+    keep = np.argpartition(priority, n - 1)[:n]
+    return keys[keep], priority[keep]
+
+
+def _keep_smallest_per_user(keys, priority, quota):
+    user_id = (keys >> np.uint64(32)).astype(np.int64)
+    order = np.lexsort((priority, user_id))
+    user_sorted = user_id[order]
+
+    ## Rank of each candidate inside its user (0 = smallest priority).
+    starts = np.flatnonzero(np.r_[True, user_sorted[1:] != user_sorted[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    rank = np.arange(len(order)) - group_start
+
+    limit = np.zeros(len(order), dtype = np.int64)
+    known = user_sorted < len(quota)
+    limit[known] = quota[user_sorted[known]]
+
+    keep = order[rank < limit]
+    return keys[keep], priority[keep]
+
+
+def sample_negatives(candidate_keys, positive_keys, n = None, random_state = None,
+                     stratify_by_user = False, chunksize = 1_000_000):
+    """Sample negative (user_id, product_id) keys.
+
+    ``candidate_keys`` is a uint64 key array or an iterable of key chunks
+    (e.g. ``pair_key.iter_frame_keys(up_features)``). Candidates that are in
+    ``positive_keys`` are never drawn.
+
+    - ``n``: sample size for uniform sampling (default: number of positives,
+      i.e. 1:1 negative sampling). Capped by the size of the pool.
+    - ``stratify_by_user``: draw per user as many negatives as the user has positives
+      (``n`` is ignored).
+
+    Returns the sampled keys, sorted.
+    """
+    rng = np.random.default_rng(random_state)
+    positive_keys = np.unique(np.asarray(positive_keys, dtype = np.uint64))
+
+    if stratify_by_user:
+        positive_users, _ = pair_key.unpack(positive_keys)
+        quota = np.bincount(positive_users)
+    else:
+        n = len(positive_keys) if n is None else n
+
+    keys = np.empty(0, dtype = np.uint64)
+    priority = np.empty(0, dtype = np.float64)
+
+    for chunk in _chunks(candidate_keys, chunksize):
+        chunk = np.asarray(chunk, dtype = np.uint64)
+        chunk = chunk[pair_key.anti_join_mask(chunk, positive_keys, assume_unique = True)]
+
+        keys = np.concatenate([keys, chunk])
+        priority = np.concatenate([priority, rng.random(len(chunk))])
+
+        if stratify_by_user:
+            keys, priority = _keep_smallest_per_user(keys, priority, quota)
+        else:
+            keys, priority = _keep_smallest(keys, priority, n)
+
+    return np.sort(keys)
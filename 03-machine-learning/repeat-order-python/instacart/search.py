@@ -0,0 +1,273 @@
+"""Parallel hyperparameter search of the reorder model.
+
+``reorder.py`` fits one ``LogisticRegression(solver='saga', max_iter=1000)`` on
+the four core features. ``search`` compares penalties, solvers, C values and
+feature sets instead, on every core:
+
+1. The training and validation matrices are standardized once and copied into
+   one ``multiprocessing.shared_memory`` block (``SharedArrays``). Worker
+   processes attach to it by name, so the data is never pickled to them.
+2. One task is one regularization path (penalty, solver, feature set). The
+   path is fitted from the strongest regularization (smallest C) up with
+   ``warm_start = True``, so each fit starts from the previous coefficients.
+3. After each C the validation ROC AUC is computed; a path stops when it has
+   not improved by ``tol`` for ``patience`` C values.
+4. Every fitted point is one row of the leaderboard (ranked by validation AUC)
+   with its fit time, iterations, F1 at the threshold and its coefficients
+   in the raw feature space (``best_scorer`` turns a row into a ``LinearScorer``).
+
+The input frame is expected to be capped already (``pipeline.cap_outliers``),
+as for ``pipeline.fit_model``; the split uses the same ``random_state``, so the
+leaderboard AUC is comparable with the ``train`` command.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from instacart.evaluation import ThresholdEvaluation
+from instacart.scoring import DEFAULT_THRESHOLD, LinearScorer
+
+
+DEFAULT_CS = [0.001, 0.01, 0.1, 1.0, 10.0, 100.0]
+
+## (penalty, solver, l1_ratio); liblinear has no warm start, so it is left out.
+DEFAULT_MODELS = [
+    ('l2', 'lbfgs', None),
+    ('l2', 'saga', None),
+    ('l1', 'saga', None),
+    ('elasticnet', 'saga', 0.5),
+]
+
+LEADERBOARD_COLUMNS = [
+    'rank', 'path', 'feature_set', 'n_features', 'penalty', 'solver', 'l1_ratio', 'C',
+    'val_auc', 'val_f1', 'fit_s', 'n_iter', 'stopped_early', 'features', 'coef', 'intercept',
+]
+
+
+# --- 📂 Shared-Memory Arrays ---
+
+class SharedArrays:
+    """Several NumPy arrays in one shared-memory block.
+
+    ``create`` copies the arrays in (parent process); ``attach`` maps the same
+    block by name in a worker and returns read-only views without copying.
+    """
+
+    def __init__(self, shm, specs, owner = False):
+        self.shm = shm
+        self.specs = specs        # name -> (offset, shape, dtype)
+        self.owner = owner
+        self.arrays = {}
+        for name, (offset, shape, dtype) in specs.items():
+            array = np.ndarray(shape, dtype = dtype, buffer = shm.buf, offset = offset)
+            array.flags.writeable = owner
+            self.arrays[name] = array
+
+    @classmethod
+    def create(cls, **arrays):
+        specs, offset = {}, 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            specs[name] = (offset, array.shape, array.dtype.str)
+            ## Keep every array 64-byte aligned.
+            offset += -(-array.nbytes // 64) * 64
+
+        shm = shared_memory.SharedMemory(create = True, size = max(offset, 1))
+        shared = cls(shm, specs, owner = True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, name, specs):
+        return cls(shared_memory.SharedMemory(name = name), specs)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- 🔑 Search Space ---
+
+def search_space(feature_sets, models = DEFAULT_MODELS, Cs = DEFAULT_CS):
+    """One regularization path per (feature set, model): dicts consumed by ``search``.
+
+    ``feature_sets`` maps a name to a list of features (e.g. ``{'core': CORE_FEATURES}``).
+    """
+    paths = []
+    for set_name, features in feature_sets.items():
+        for penalty, solver, l1_ratio in models:
+            paths.append({
+                'path': len(paths),
+                'feature_set': set_name,
+                'features': list(features),
+                'penalty': penalty,
+                'solver': solver,
+                'l1_ratio': l1_ratio,
+                'Cs': sorted(Cs),
+            })
+    return paths
+
+
+# --- 🏷️ Workers ---
+
+_SHARED = None
+
+
+def _attach(name, specs):
+    ## Worker initializer: map the shared block once per process.
+    global _SHARED
+    _SHARED = SharedArrays.attach(name, specs)
+
+
+def _penalty_params(penalty, l1_ratio):
+    ## sklearn >= 1.8 deprecates ``penalty``: the penalty is given by ``l1_ratio`` alone.
+    import sklearn
+    if tuple(int(v) for v in sklearn.__version__.split('.')[:2]) >= (1, 8):
+        return {'l1_ratio': {'l2': 0.0, 'l1': 1.0}.get(penalty, l1_ratio)}
+    return {'penalty': penalty, 'l1_ratio': l1_ratio}
+
+
+def _fit_path(path, columns, max_iter, tol, patience, threshold, random_state):
+    """Fit one regularization path with warm starts; one result dict per C."""
+    import warnings
+    from sklearn.exceptions import ConvergenceWarning
+    from sklearn.linear_model import LogisticRegression
+
+    arrays = _SHARED.arrays
+    ## The full feature set is a view of the shared matrix; a subset is copied once per path.
+    full = len(columns) == arrays['x_train'].shape[1]
+    x_train = arrays['x_train'] if full else arrays['x_train'][:, columns]
+    x_val = arrays['x_val'] if full else arrays['x_val'][:, columns]
+    y_train, y_val = arrays['y_train'], arrays['y_val']
+    mean, scale = arrays['mean'][columns], arrays['scale'][columns]
+
+    model = LogisticRegression(
+        solver = path['solver'], max_iter = max_iter, warm_start = True, random_state = random_state,
+        **_penalty_params(path['penalty'], path['l1_ratio']),
+    )
+
+    results, best_auc, stale = [], -np.inf, 0
+    for i, C in enumerate(path['Cs']):
+        model.set_params(C = C)
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            model.fit(x_train, y_train)
+        fit_s = time.perf_counter() - start
+
+        evaluation = ThresholdEvaluation(y_val, model.predict_proba(x_val)[:, 1])
+        auc = evaluation.roc_auc()
+
+        ## Fold the standard scaling into the coefficients: w·(x - mean)/scale + b.
+        coef = model.coef_[0] / scale
+        intercept = model.intercept_[0] - np.sum(model.coef_[0] * mean / scale)
+
+        results.append({
+            **{k: path[k] for k in ('path', 'feature_set', 'penalty', 'solver', 'l1_ratio')},
+            'n_features': len(columns),
+            'C': C,
+            'val_auc': auc,
+            'val_f1': evaluation.at(threshold)['f1'],
+            'fit_s': fit_s,
+            'n_iter': int(np.max(model.n_iter_)),
+            'stopped_early': False,
+            'features': path['features'],
+            'coef': coef.tolist(),
+            'intercept': float(intercept),
+        })
+
+        if auc > best_auc + tol:
+            best_auc, stale = auc, 0
+        else:
+            stale += 1
+            if stale >= patience:
+                results[-1]['stopped_early'] = i < len(path['Cs']) - 1
+                break
+
+    return results
+
+
+# --- 📌 Search ---
+
+def search(data, features, paths = None, n_jobs = None, max_iter = 1000, tol = 1e-4, patience = 2,
+           threshold = DEFAULT_THRESHOLD, test_size = 0.2, random_state = 22):
+    """Fit every path of the search space in parallel and return the ranked leaderboard.
+
+    - ``data``: capped training frame with ``features`` and ``reordered_next``.
+    - ``features``: every feature used by any path (the columns of the shared matrix).
+    - ``paths``: from ``search_space`` (default: every model on ``features``).
+    """
+    from sklearn.model_selection import train_test_split
+
+    features = list(features)
+    paths = paths or search_space({'all': features})
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(paths))
+
+    x_train, x_val, y_train, y_val = train_test_split(
+        data[features], data['reordered_next'], test_size = test_size, random_state = random_state
+    )
+    x_train = x_train.to_numpy(dtype = np.float64)
+    mean = x_train.mean(axis = 0)
+    scale = x_train.std(axis = 0)
+    scale[scale == 0] = 1.0
+
+    ## Standardize in place before the copy into shared memory (saga converges much faster on scaled data).
+    x_train -= mean
+    x_train /= scale
+    x_val = (x_val.to_numpy(dtype = np.float64) - mean) / scale
+
+    rows = []
+    with SharedArrays.create(
+        x_train = x_train, x_val = x_val,
+        y_train = y_train.to_numpy(dtype = np.int8), y_val = y_val.to_numpy(dtype = np.int8),
+        mean = mean, scale = scale,
+    ) as shared:
+        del x_train, x_val
+        with ProcessPoolExecutor(max_workers = n_jobs, initializer = _attach,
+                                 initargs = (shared.name, shared.specs)) as pool:
+            futures = [
+                pool.submit(_fit_path, path, [features.index(f) for f in path['features']],
+                            max_iter, tol, patience, threshold, random_state)
+                for path in paths
+            ]
+            for future in as_completed(futures):
+                rows.extend(future.result())
+
+    return leaderboard(rows)
+
+
+def leaderboard(rows):
+    """Fitted points ranked by validation AUC (then by fit time)."""
+    board = pd.DataFrame(rows, columns = LEADERBOARD_COLUMNS[1:])
+    board = board.sort_values(['val_auc', 'fit_s'], ascending = [False, True], ignore_index = True)
+    board.insert(0, 'rank', np.arange(1, len(board) + 1))
+    return board
+
+
+def best_scorer(board, rank = 1, threshold = DEFAULT_THRESHOLD, upper_bounds = None):
+    """``LinearScorer`` of one leaderboard row (the caps of its features are kept)."""
+    row = board.loc[board['rank'] == rank].iloc[0]
+    upper_bounds = {f: b for f, b in (upper_bounds or {}).items() if f in row['features']}
+    return LinearScorer(row['features'], row['coef'], row['intercept'], threshold, upper_bounds)
@@ -0,0 +1,159 @@
+"""RF (Recency & Frequency) customer segmentation of every user.
+
+Python version of ``customer-segmentation-r/customer-segmentation-churn-analysis.r``:
+
+1. ``rf_table``: recency (days_since_prior_order of the last order), frequency
+   (number of orders) and average cycle time (mean days_since_prior_order) of
+   every user, from the typed ``orders`` table in one pass: the rows are in
+   (user_id, order_number) order, so each user is a contiguous block and the
+   three values come from the block ends and one ``reduceat``.
+2. ``fit_segments``: log(x + 1), standardized, then ``MiniBatchKMeans`` with
+   ``n_init`` restarts run in a thread pool (one OpenMP thread each); the
+   restart with the lowest inertia on all users wins.
+3. ``label_clusters``: the clusters are named from their centres instead of
+   hard-coded cluster numbers: the two lowest-frequency clusters are New
+   (recent) and Lost Customers, the two others Core (recent) and At-Risk
+   Loyalists. The cluster numbers follow the R script (1 = New, 2 = Lost,
+   3 = Core, 4 = At-Risk).
+4. ``churn_risk``: the At-Risk users whose recency is >= 1.3 x their cycle,
+   and the Lost users with recency < 30 that are 2 to 5 days past their cycle.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+SEGMENTS = {
+    1: 'New Customers',
+    2: 'Lost Customers',
+    3: 'Core Loyalists',
+    4: 'At-Risk Loyalists',
+}
+
+RF_FEATURES = ['last_order_date', 'count_order_num']
+
+
+# --- 📂 RF Table ---
+
+def rf_table(orders):
+    """Recency, frequency and average cycle time of every user (prior + train orders)."""
+    orders = orders[orders['eval_set'].isin(['prior', 'train'])]
+    user_id = orders['user_id'].to_numpy()
+    order_number = orders['order_number'].to_numpy()
+    days = orders['days_since_prior_order'].to_numpy(dtype = np.float64)
+
+    ## The Kaggle file is already in (user_id, order_number) order; sort only if it is not.
+    if len(user_id) > 1 and np.any((user_id[1:] < user_id[:-1]) |
+                                   ((user_id[1:] == user_id[:-1]) & (order_number[1:] <= order_number[:-1]))):
+        order = np.lexsort((order_number, user_id))
+        user_id, days = user_id[order], days[order]
+
+    starts = np.flatnonzero(np.r_[True, user_id[1:] != user_id[:-1]])
+    ends = np.r_[starts[1:], len(user_id)]
+
+    known = ~np.isnan(days)
+    days_sum = np.add.reduceat(np.where(known, days, 0.0), starts)
+    days_count = np.add.reduceat(known.astype(np.int64), starts)
+
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        avg_order_date = days_sum / days_count
+        rf = pd.DataFrame({
+            'customer_id': user_id[starts],
+            'last_order_date': days[ends - 1],
+            'count_order_num': ends - starts,
+            'avg_order_date': avg_order_date,
+            'recency_vs_cycle': days[ends - 1] / avg_order_date,
+        })
+    return rf
+
+
+# --- 🛎️ Mini-Batch K-means ---
+
+def scale_rf(rf):
+    """log(x + 1) of recency and frequency, standardized (as ``scale()`` in R)."""
+    x = np.log1p(rf[RF_FEATURES].to_numpy(dtype = np.float64))
+    return (x - np.nanmean(x, axis = 0)) / np.nanstd(x, axis = 0, ddof = 1)
+
+
+def _fit_restart(x, k, seed, batch_size):
+    from sklearn.cluster import MiniBatchKMeans
+
+    model = MiniBatchKMeans(n_clusters = k, batch_size = batch_size, n_init = 1, random_state = seed)
+    model.fit(x)
+    return -model.score(x), model
+
+
+def fit_segments(x, k = 4, n_init = 25, batch_size = 4096, n_jobs = None, random_state = 93):
+    """Best of ``n_init`` mini-batch k-means restarts (lowest inertia on all of ``x``)."""
+    from threadpoolctl import threadpool_limits
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    seeds = np.random.default_rng(random_state).integers(0, 2 ** 31 - 1, n_init)
+
+    ## The k-means loops release the GIL, so the restarts run in threads on the same array.
+    ## Each fit is limited to one OpenMP / BLAS thread, so n_jobs restarts use n_jobs cores (not n_jobs x cores).
+    with threadpool_limits(limits = 1), ThreadPoolExecutor(max_workers = n_jobs) as pool:
+        results = list(pool.map(lambda seed: _fit_restart(x, k, int(seed), batch_size), seeds))
+    return min(results, key = lambda r: r[0])[1]
+
+
+def label_clusters(rf, clusters):
+    """Map k-means cluster ids (k = 4) to the R script's cluster numbers 1-4 (see ``SEGMENTS``)."""
+    centres = rf.groupby(clusters)[RF_FEATURES].mean()
+    if len(centres) != 4:
+        raise ValueError('label_clusters needs exactly 4 clusters')
+
+    by_frequency = centres.sort_values('count_order_num').index
+    low = centres.loc[by_frequency[:2]].sort_values('last_order_date').index
+    high = centres.loc[by_frequency[2:]].sort_values('last_order_date').index
+    return {low[0]: 1, low[1]: 2, high[0]: 3, high[1]: 4}
+
+
+def segment_customers(orders, k = 4, n_init = 25, n_jobs = None, random_state = 93):
+    """RF table of every user with its ``cluster`` (1-4) and ``customer_level``.
+
+    Users without a recency (a single order) get cluster 0 and no level.
+    """
+    rf = rf_table(orders)
+    x = scale_rf(rf)
+    finite = np.isfinite(x).all(axis = 1)
+
+    model = fit_segments(x[finite], k, n_init, n_jobs = n_jobs, random_state = random_state)
+    raw = np.full(len(rf), -1)
+    raw[finite] = model.predict(x[finite])
+
+    mapping = label_clusters(rf[finite], raw[finite])
+    cluster = np.zeros(len(rf), dtype = np.int8)
+    cluster[finite] = pd.Series(raw[finite]).map(mapping).to_numpy()
+
+    rf.insert(1, 'cluster', cluster)
+    rf.insert(2, 'customer_level', pd.Series(cluster).map(SEGMENTS).to_numpy())
+    return rf
+
+
+def segment_summary(customers):
+    """Average recency / frequency and size of each segment."""
+    return (
+        customers[customers['cluster'] > 0]
+        .groupby(['cluster', 'customer_level'])
+        .agg(avg_recency = ('last_order_date', 'mean'),
+             avg_frequency = ('count_order_num', 'mean'),
+             customer_count = ('customer_id', 'size'))
+        .reset_index()
+    )
+
+
+# --- 🎯 Churn Risk ---
+
+def churn_risk(customers, cycle_ratio = 1.30, min_days_late = 2, max_days_late = 5):
+    """(At-Risk Loyalists past 1.3 x their cycle, Lost Customers 2-5 days past their cycle)."""
+    at_risk = customers[(customers['cluster'] == 4) & (customers['recency_vs_cycle'] >= cycle_ratio)]
+
+    lost = customers[(customers['cluster'] == 2) & (customers['last_order_date'] < 30)]
+    num_of_day = lost['last_order_date'] - lost['avg_order_date']
+    lost = lost.assign(num_of_day = num_of_day)[(num_of_day > min_days_late) & (num_of_day <= max_days_late)]
+
+    return at_risk.reset_index(drop = True), lost.reset_index(drop = True)
@@ -0,0 +1,211 @@
+"""Online reorder-scoring service.
+
+Serves "top N products this user is likely to reorder" over HTTP, from a
+precomputed per-user candidate index:
+
+- every (user_id, product_id) pair of the feature store is scored once at
+  startup with the saved ``LinearScorer`` (coefficients and capping bounds),
+- the pairs are sorted by user_id, then by ``reordered_proba`` descending,
+- a request is an offset lookup plus a slice, so no model runs per request.
+
+Endpoints (JSON responses):
+
+- ``GET /users/<user_id>/top?k=20``
+- ``POST /top`` with ``{"user_ids": [...], "k": 20}`` (batched)
+- ``GET /health``
+
+Run with::
+
+    python -m instacart.serve --store feature-store --model reorder-model.json --data-dir .
+
+and measure it with ``python -m instacart.loadtest``.
+"""
+
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from instacart import pair_key
+from instacart.feature_store import FeatureStore
+from instacart.loader import load_table
+from instacart.scoring import load_scorer
+
+
+DEFAULT_TOP_K = 20
+MAX_TOP_K = 500
+
+
+# --- 📂 Candidate Index ---
+
+class CandidateIndex:
+    """Per-user candidate products ranked by predicted reorder probability."""
+
+    def __init__(self, offsets, product_id, proba, product_names = None):
+        self.offsets = offsets
+        self.product_id = product_id
+        self.proba = proba
+        self.product_names = product_names
+
+    @classmethod
+    def build(cls, store, scorer, product_names = None, chunksize = 1_000_000):
+        """Score every pair of the store and rank each user's products."""
+        proba = np.empty(len(store), dtype = np.float32)
+        for start in range(0, len(store), chunksize):
+            positions = np.arange(start, min(start + chunksize, len(store)))
+            user_id, product_id = pair_key.unpack(store.pair_keys[positions])
+            x = store.gather_positions(positions, user_id, product_id, scorer.features)
+            proba[start:start + len(positions)] = scorer.predict_proba(x, inplace = True)
+
+        user_id, product_id = pair_key.unpack(store.pair_keys)
+        order = np.lexsort((-proba, user_id))
+
+        offsets = np.zeros(int(user_id.max()) + 2 if len(user_id) else 1, dtype = np.int64)
+        np.cumsum(np.bincount(user_id, minlength = len(offsets) - 1), out = offsets[1:])
+
+        return cls(offsets, product_id[order], proba[order], product_names)
+
+    def top(self, user_id, k = DEFAULT_TOP_K):
+        """Ranked list of (product_id, product_name, reordered_proba) for one user."""
+        if user_id < 0 or user_id + 1 >= len(self.offsets):
+            return []
+        start = self.offsets[user_id]
+        end = min(self.offsets[user_id + 1], start + k)
+
+        products = self.product_id[start:end]
+        names = self.product_names
+        return [
+            {
+                'product_id': int(pid),
+                'product_name': names[pid] if names is not None and pid < len(names) else None,
+                'reordered_proba': round(float(p), 6),
+            }
+            for pid, p in zip(products, self.proba[start:end])
+        ]
+
+
+def product_name_lookup(products):
+    """Dense product_id -> product_name array."""
+    names = np.empty(int(products['product_id'].max()) + 1, dtype = object)
+    names[products['product_id'].to_numpy()] = products['product_name'].to_numpy()
+    return names
+
+
+# --- 📂 HTTP Service ---
+
+def _is_int(value):
+    ## JSON true / false are bools, which are ints in Python.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _top_k(k):
+    if k < 1:
+        raise ValueError("'k' must be at least 1")
+    return min(k, MAX_TOP_K)
+
+
+class ReorderService:
+    """Minimal asyncio HTTP/1.1 server (keep-alive) over a ``CandidateIndex``."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def handle(self, method, target, body):
+        """Route one request; returns (status, payload)."""
+        url = urlsplit(target)
+        parts = [p for p in url.path.split('/') if p]
+        query = parse_qs(url.query)
+
+        try:
+            if method == 'GET' and parts == ['health']:
+                return 200, {'status': 'ok'}
+
+            if method == 'GET' and len(parts) == 3 and parts[0] == 'users' and parts[2] == 'top':
+                user_id = int(parts[1])
+                k = _top_k(int(query.get('k', [DEFAULT_TOP_K])[0]))
+                return 200, {'user_id': user_id, 'products': self.index.top(user_id, k)}
+
+            if method == 'POST' and parts == ['top']:
+                request = json.loads(body or b'{}')
+                if not isinstance(request, dict):
+                    return 400, {'error': 'request body must be a JSON object'}
+                user_ids = request.get('user_ids', [])
+                if not isinstance(user_ids, list) or not all(_is_int(u) for u in user_ids):
+                    return 400, {'error': "'user_ids' must be a list of integers"}
+                if 'k' in request and not _is_int(request['k']):
+                    return 400, {'error': "'k' must be an integer"}
+                k = _top_k(request['k'] if 'k' in request else int(query.get('k', [DEFAULT_TOP_K])[0]))
+                return 200, {'results': [
+                    {'user_id': u, 'products': self.index.top(u, k)}
+                    for u in user_ids
+                ]}
+        except (ValueError, TypeError) as error:
+            return 400, {'error': str(error)}
+
+        return 404, {'error': 'not found'}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = self.handle(method, target, body)
+                data = json.dumps(payload).encode()
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}[status]
+                writer.write(
+                    f'HTTP/1.1 {status} {reason}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host = '127.0.0.1', port = 8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+# --- 📂 Command Line ---
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Serve per-user reorder probabilities over HTTP.')
+    parser.add_argument('--store', default = 'feature-store', help = 'feature store directory')
+    parser.add_argument('--model', default = 'reorder-model.json', help = 'saved LinearScorer (.json) or BoostingScorer')
+    parser.add_argument('--data-dir', default = '.', help = 'directory with products.csv (for product names)')
+    parser.add_argument('--cache-dir', default = None, help = 'columnar cache directory')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    args = parser.parse_args(argv)
+
+    products = load_table('products', args.data_dir, ['product_id', 'product_name'], args.cache_dir)
+    index = CandidateIndex.build(FeatureStore(args.store), load_scorer(args.model), product_name_lookup(products))
+
+    print(f'Serving {len(index.product_id):,} ranked pairs on http://{args.host}:{args.port}')
+    asyncio.run(ReorderService(index).serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
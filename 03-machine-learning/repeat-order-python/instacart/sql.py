@@ -0,0 +1,245 @@
+"""Run the business SQL queries in-process over the cached Instacart tables.
+
+``02-sql-business-queries/business-insight-queries.sql`` was written for a
+separately loaded database. ``run_sql_file`` executes it with an embedded engine:
+
+- ``sqlite``: the standard library ``sqlite3`` (in memory). The tables a query
+  needs are loaded with ``load_table`` (the typed columnar cache) and inserted
+  once, with indexes on their id columns for the joins.
+- ``duckdb`` (if installed): a parallel columnar engine for the heavy joins
+  (e.g. the maximum-reorder query over all ``order_products__prior`` rows).
+  The Feather files of the cache are scanned as Arrow tables, without a copy
+  into the database; ``threads`` sets its worker threads.
+- ``auto``: duckdb when it is installed, else sqlite.
+
+Only the tables and columns that the SQL mentions are loaded. Every table load
+and every query is a stage of a ``Trace``, so the run reports its timings::
+
+    python -m instacart.sql ../../02-sql-business-queries/business-insight-queries.sql --cache-dir .instacart-cache
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+from instacart.loader import TABLE_DTYPES, load_table
+
+
+ENGINES = ['auto', 'sqlite', 'duckdb']
+
+## Columns indexed in SQLite when the table is loaded (join keys of the business queries).
+SQLITE_INDEXES = {
+    'orders': ['order_id'],
+    'order_products__prior': ['order_id'],
+    'order_products__train': ['order_id'],
+    'products': ['product_id'],
+    'aisles': ['aisle_id'],
+    'departments': ['department_id'],
+}
+
+
+# --- 📂 Parsing the SQL File ---
+
+def split_queries(text):
+    """(name, sql) of every statement; the name is the ``-- 📌`` title above it, if any."""
+    queries, title, lines = [], None, []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('--'):
+            if '📌' in stripped and not lines:
+                title = stripped.lstrip('-').replace('📌', '').strip()
+            continue
+        ## Inline comments after SQL (e.g. "HAVING total > 600 -- why").
+        line = re.sub(r'--.*$', '', line)
+        if line.strip():
+            lines.append(line)
+        if line.rstrip().endswith(';'):
+            sql = '\n'.join(lines).strip().rstrip(';').strip()
+            queries.append((title or f'query {len(queries) + 1}', sql))
+            title, lines = None, []
+
+    if lines:
+        queries.append((title or f'query {len(queries) + 1}', '\n'.join(lines).strip()))
+    return queries
+
+
+def referenced_columns(sql):
+    """{table: [columns]} of the known Instacart tables that appear in ``sql``."""
+    words = set(re.findall(r'\w+', sql))
+    return {
+        table: [col for col in dtypes if col in words]
+        for table, dtypes in TABLE_DTYPES.items() if table in words
+    }
+
+
+# --- 🏷️ Engines ---
+
+class SqliteEngine:
+    """In-memory ``sqlite3`` database filled from the typed tables."""
+
+    name = 'sqlite'
+
+    def __init__(self, data_dir = '.', cache_dir = None):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.con = sqlite3.connect(':memory:')
+        self.con.execute('PRAGMA journal_mode = OFF')
+        self.con.execute('PRAGMA synchronous = OFF')
+        self.loaded = {}
+
+    def load(self, table, columns):
+        ## A table is reloaded only if a later query needs columns it does not have yet.
+        missing = [c for c in columns if c not in self.loaded.get(table, [])]
+        if not missing:
+            return 0
+        columns = self.loaded.get(table, []) + missing
+        frame = load_table(table, self.data_dir, columns, self.cache_dir)
+        frame.to_sql(table, self.con, if_exists = 'replace', index = False, chunksize = 500_000)
+        for col in SQLITE_INDEXES.get(table, []):
+            if col in columns:
+                self.con.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col})')
+        self.loaded[table] = columns
+        return len(frame)
+
+    def query(self, sql):
+        return pd.read_sql_query(sql, self.con)
+
+    def close(self):
+        self.con.close()
+
+
+class DuckdbEngine:
+    """``duckdb`` in memory; cached tables are registered as Arrow tables (no copy)."""
+
+    name = 'duckdb'
+
+    def __init__(self, data_dir = '.', cache_dir = None, threads = None):
+        import duckdb
+
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.con = duckdb.connect(':memory:')
+        if threads:
+            self.con.execute(f'SET threads = {int(threads)}')
+        self.loaded = {}
+
+    def _arrow_table(self, table, columns):
+        from instacart.cache import is_fresh
+
+        if self.cache_dir is not None and is_fresh(table, self.data_dir, self.cache_dir):
+            from pyarrow import feather
+            return feather.read_table(os.path.join(self.cache_dir, f'{table}.feather'), columns = columns)
+        return None
+
+    def load(self, table, columns):
+        missing = [c for c in columns if c not in self.loaded.get(table, [])]
+        if not missing:
+            return 0
+        columns = self.loaded.get(table, []) + missing
+        try:
+            data = self._arrow_table(table, columns)
+        except ImportError:
+            data = None
+        if data is None:
+            data = load_table(table, self.data_dir, columns, self.cache_dir)
+        self.con.register(table, data)
+        self.loaded[table] = columns
+        return len(data)
+
+    def query(self, sql):
+        return self.con.execute(sql).df()
+
+    def close(self):
+        self.con.close()
+
+
+def make_engine(engine = 'auto', data_dir = '.', cache_dir = None, threads = None):
+    """Engine by name; ``auto`` is duckdb when installed, else sqlite."""
+    if engine not in ENGINES:
+        raise ValueError(f'engine must be one of {ENGINES}')
+    if engine in ('auto', 'duckdb'):
+        try:
+            return DuckdbEngine(data_dir, cache_dir, threads)
+        except ImportError:
+            if engine == 'duckdb':
+                raise
+    return SqliteEngine(data_dir, cache_dir)
+
+
+# --- 📌 Runner ---
+
+def run_queries(queries, engine, trace = None):
+    """Run (name, sql) pairs; returns {name: result} and a timing table (load and query seconds)."""
+    from instacart.trace import Trace
+
+    trace = trace or Trace('sql')
+
+    ## Columns of each table over all the queries, so a table is loaded once, by the first query that uses it.
+    needed = {}
+    for _, sql in queries:
+        for table, cols in referenced_columns(sql).items():
+            needed[table] = needed.get(table, []) + [c for c in cols if c not in needed.get(table, [])]
+
+    results, timings = {}, []
+    for name, sql in queries:
+        with trace.stage(f'load: {name}') as record:
+            record['rows_out'] = sum(engine.load(table, needed[table]) for table in referenced_columns(sql))
+        load_s = trace.records[-1]['wall_s']
+
+        with trace.stage(f'query: {name}') as record:
+            results[name] = engine.query(sql)
+            record['rows_out'] = len(results[name])
+        timings.append({
+            'query': name,
+            'engine': engine.name,
+            'load_s': load_s,
+            'query_s': trace.records[-1]['wall_s'],
+            'rows': len(results[name]),
+        })
+    return results, pd.DataFrame(timings)
+
+
+def run_sql_file(path, engine = 'auto', data_dir = '.', cache_dir = None, threads = None, trace = None):
+    """Run every statement of a SQL file; returns (results, timings)."""
+    with open(path, encoding = 'utf-8') as f:
+        queries = split_queries(f.read())
+
+    engine = make_engine(engine, data_dir, cache_dir, threads)
+    try:
+        return run_queries(queries, engine, trace)
+    finally:
+        engine.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Run a SQL file over the Instacart tables with an embedded engine.')
+    parser.add_argument('sql_file')
+    parser.add_argument('--data-dir', default = '.')
+    parser.add_argument('--cache-dir', default = None)
+    parser.add_argument('--engine', choices = ENGINES, default = 'auto')
+    parser.add_argument('--threads', type = int, default = None, help = 'duckdb worker threads')
+    parser.add_argument('--rows', type = int, default = 10, help = 'rows of each result to print')
+    parser.add_argument('--output-dir', default = None, help = 'write each result as CSV')
+    parser.add_argument('--trace-dir', default = 'traces')
+    args = parser.parse_args(argv)
+
+    from instacart.trace import Trace
+    trace = Trace('sql', trace_dir = args.trace_dir)
+    results, timings = run_sql_file(args.sql_file, args.engine, args.data_dir, args.cache_dir, args.threads, trace)
+    trace.save()
+
+    for i, (name, result) in enumerate(results.items(), start = 1):
+        print(f'\n📌 {name} ({len(result):,} rows)')
+        print(result.head(args.rows).to_string(index = False))
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok = True)
+            result.to_csv(os.path.join(args.output_dir, f'query-{i}.csv'), index = False)
+
+    print('\n' + timings.to_string(index = False))
+
+
+if __name__ == '__main__':
+    main()
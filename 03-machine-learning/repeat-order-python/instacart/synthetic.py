@@ -0,0 +1,256 @@
+"""Synthetic Instacart-shaped data generator.
+
+Writes ``orders``, ``order_products__prior``, ``order_products__train``,
+``products``, ``aisles`` and ``departments`` CSVs with the Kaggle columns, so
+every stage of the pipeline can run (and be benchmarked) without the real files.
+
+``scale = 1`` is the size of the Kaggle dataset (206,209 users, ~3.4M orders,
+~32M prior rows); ``0.1`` and ``10`` scale the number of users. The shapes
+follow the real data:
+
+- 4 to 100 orders per user (geometric, mean ~17); the last order of a user is
+  'train' (~64% of users) or 'test' (no rows in the order-products files).
+- ``days_since_prior_order`` is empty for the first order of a user and is
+  otherwise drawn around a per-user cadence, capped at 30 days.
+- Product popularity is Zipf-skewed; each user buys mostly from a personal
+  repertoire, so ~60% of the prior rows are reorders.
+
+Users are generated in chunks and appended to the CSVs, so memory stays
+bounded at any scale. Order counts, test users and order_ids are drawn once
+for all users; everything else is drawn per block of ``RNG_BLOCK`` users from
+its own generator (seeded by ``seed`` and the block's first user), so the same
+``scale`` and ``seed`` give the same files whatever ``users_per_chunk`` is.
+
+    python -m instacart.synthetic --scale 0.1 --out-dir synthetic-data
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+KAGGLE_USERS = 206_209
+KAGGLE_TEST_USERS = 75_000
+N_PRODUCTS = 49_688
+N_AISLES = 134
+
+## Users per random generator: a chunk is a whole number of these blocks.
+RNG_BLOCK = 1_000
+
+DEPARTMENTS = [
+    'frozen', 'other', 'bakery', 'produce', 'alcohol', 'international', 'beverages',
+    'pets', 'dry goods pasta', 'bulk', 'personal care', 'meat seafood', 'pantry',
+    'breakfast', 'canned goods', 'dairy eggs', 'household', 'babies', 'snacks',
+    'deli', 'missing',
+]
+
+## Order day-of-week and hour-of-day shares (weekend and late-morning peaks).
+DOW_WEIGHTS = np.array([0.19, 0.17, 0.14, 0.13, 0.12, 0.13, 0.14])
+HOUR_WEIGHTS = np.array([
+    0.7, 0.4, 0.2, 0.2, 0.2, 0.3, 0.9, 2.8, 5.3, 7.6, 8.5, 8.4,
+    8.1, 8.2, 8.3, 8.2, 7.8, 6.4, 5.0, 3.9, 3.0, 2.5, 2.0, 1.3,
+])
+
+
+# --- 📂 Catalogue Tables ---
+
+def catalogue_tables(seed = 22):
+    """(products, aisles, departments) dataframes; aisle and department sizes are skewed."""
+    rng = np.random.default_rng(seed)
+
+    departments = pd.DataFrame({
+        'department_id': np.arange(1, len(DEPARTMENTS) + 1),
+        'department': DEPARTMENTS,
+    })
+
+    aisle_ids = np.arange(1, N_AISLES + 1)
+    aisles = pd.DataFrame({'aisle_id': aisle_ids, 'aisle': [f'aisle {a}' for a in aisle_ids]})
+    aisle_department = rng.integers(1, len(DEPARTMENTS) + 1, size = N_AISLES)
+
+    aisle_weights = rng.pareto(1.5, size = N_AISLES) + 1
+    product_aisle = rng.choice(aisle_ids, size = N_PRODUCTS, p = aisle_weights / aisle_weights.sum())
+
+    product_ids = np.arange(1, N_PRODUCTS + 1)
+    products = pd.DataFrame({
+        'product_id': product_ids,
+        'product_name': [f'product {p}' for p in product_ids],
+        'aisle_id': product_aisle,
+        'department_id': aisle_department[product_aisle - 1],
+    })
+
+    return products, aisles, departments
+
+
+def product_popularity(seed = 22, exponent = 1.05, offset = 10):
+    """Cumulative Zipf weights over a random ranking of the product_ids."""
+    rng = np.random.default_rng(seed)
+    weights = np.empty(N_PRODUCTS)
+    weights[rng.permutation(N_PRODUCTS)] = 1 / (np.arange(N_PRODUCTS) + offset) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _draw_products(rng, cdf, size):
+    return np.searchsorted(cdf, rng.random(size), side = 'right').astype(np.int32) + 1
+
+
+# --- 📂 Orders and Order Products ---
+
+def user_order_counts(n_users, rng):
+    """Total orders per user (prior orders + the last 'train' / 'test' order)."""
+    return np.minimum(3 + rng.geometric(1 / 14.6, size = n_users), 100).astype(np.int64)
+
+
+def generate_users(user_ids, n_orders, is_test, order_ids, cdf, rng):
+    """Orders and order-products rows of one block of users.
+
+    ``n_orders``, ``is_test`` and ``order_ids`` are given per user / per order
+    (drawn globally); ``rng`` draws everything else for this block only.
+    Returns (orders, op_prior, op_train).
+    """
+    n_users = len(user_ids)
+    total = int(n_orders.sum())
+    starts = np.r_[0, np.cumsum(n_orders)[:-1]]
+
+    ## One row per order, sorted by user_id and order_number (like orders.csv).
+    user_of_order = np.repeat(np.arange(n_users), n_orders)
+    order_number = np.arange(total) - np.repeat(starts, n_orders) + 1
+    last = order_number == np.repeat(n_orders, n_orders)
+
+    eval_set = np.full(total, 'prior', dtype = object)
+    eval_set[last] = np.where(is_test[user_of_order[last]], 'test', 'train')
+
+    ## Days between orders around a per-user cadence, capped at 30; empty for the first order.
+    cadence = rng.gamma(2.0, 5.0, size = n_users) + 2
+    days = np.minimum(np.rint(rng.gamma(2.0, cadence[user_of_order] / 2)), 30).astype(np.float32)
+    days[order_number == 1] = np.nan
+
+    orders = pd.DataFrame({
+        'order_id': order_ids,
+        'user_id': user_ids[user_of_order],
+        'eval_set': eval_set,
+        'order_number': order_number,
+        'order_dow': rng.choice(7, size = total, p = DOW_WEIGHTS / DOW_WEIGHTS.sum()),
+        'order_hour_of_day': rng.choice(24, size = total, p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()),
+        'days_since_prior_order': days,
+    })
+
+    ## Basket sizes per order ('test' orders have no rows).
+    basket_mean = rng.lognormal(np.log(11), 0.5, size = n_users)
+    basket = np.minimum(1 + rng.poisson(basket_mean[user_of_order] - 1), 80)
+    basket[eval_set == 'test'] = 0
+
+    row_order = np.repeat(np.arange(total), basket)
+    row_user = user_of_order[row_order]
+    n_rows = len(row_order)
+
+    ## Each user mostly buys from a personal repertoire (top items more often),
+    ## and sometimes explores the whole (Zipf-skewed) catalogue.
+    repertoire_size = 3 + rng.poisson(rng.lognormal(np.log(25), 0.6, size = n_users))
+    repertoire_start = np.r_[0, np.cumsum(repertoire_size)[:-1]]
+    repertoire = _draw_products(rng, cdf, int(repertoire_size.sum()))
+
+    explore = rng.random(n_rows) < rng.beta(2, 8, size = n_users)[row_user]
+    pick = (repertoire_size[row_user] * rng.random(n_rows) ** 2).astype(np.int64)
+    product_id = np.where(
+        explore,
+        _draw_products(rng, cdf, n_rows),
+        repertoire[repertoire_start[row_user] + pick],
+    )
+
+    ## A product appears at most once per order (keep the first add).
+    _, first = np.unique(row_order.astype(np.int64) * (N_PRODUCTS + 1) + product_id, return_index = True)
+    first.sort()
+    row_order, row_user, product_id = row_order[first], row_user[first], product_id[first]
+
+    order_start = np.searchsorted(row_order, row_order, side = 'left')
+    add_to_cart_order = np.arange(len(row_order)) - order_start + 1
+
+    ## reordered = the user bought the product in an earlier order.
+    by_pair = np.lexsort((row_order, product_id, row_user))
+    repeat = np.zeros(len(by_pair), dtype = bool)
+    repeat[1:] = (row_user[by_pair][1:] == row_user[by_pair][:-1]) & (product_id[by_pair][1:] == product_id[by_pair][:-1])
+    reordered = np.empty(len(by_pair), dtype = np.uint8)
+    reordered[by_pair] = repeat
+
+    op = pd.DataFrame({
+        'order_id': order_ids[row_order],
+        'product_id': product_id,
+        'add_to_cart_order': add_to_cart_order,
+        'reordered': reordered,
+    })
+    in_train = eval_set[row_order] == 'train'
+
+    op_prior = op[~in_train].sort_values(['order_id', 'add_to_cart_order'], kind = 'stable')
+    op_train = op[in_train].sort_values(['order_id', 'add_to_cart_order'], kind = 'stable')
+    return orders, op_prior, op_train
+
+
+def generate(out_dir, scale = 0.1, seed = 22, users_per_chunk = 20_000):
+    """Write the six synthetic CSVs to ``out_dir``; returns the row count of each table.
+
+    ``users_per_chunk`` (memory per write) is rounded up to a multiple of ``RNG_BLOCK``.
+    """
+    os.makedirs(out_dir, exist_ok = True)
+    rng = np.random.default_rng(seed)
+
+    products, aisles, departments = catalogue_tables(seed)
+    cdf = product_popularity(seed)
+
+    n_users = max(int(round(KAGGLE_USERS * scale)), 1)
+    n_orders = user_order_counts(n_users, rng)
+    is_test = rng.random(n_users) < KAGGLE_TEST_USERS / KAGGLE_USERS
+    ## order_ids are dense but shuffled across users (as in the Kaggle files).
+    order_ids = (rng.permutation(int(n_orders.sum())) + 1).astype(np.int32)
+
+    counts = {}
+    for name, table in [('products', products), ('aisles', aisles), ('departments', departments)]:
+        table.to_csv(os.path.join(out_dir, f'{name}.csv'), index = False)
+        counts[name] = len(table)
+
+    paths = {name: os.path.join(out_dir, f'{name}.csv') for name in ['orders', 'order_products__prior', 'order_products__train']}
+    for name in paths:
+        counts[name] = 0
+
+    users_per_chunk = -(-max(users_per_chunk, 1) // RNG_BLOCK) * RNG_BLOCK
+    order_offsets = np.r_[0, np.cumsum(n_orders)]
+
+    for first in range(0, n_users, users_per_chunk):
+        blocks = []
+        for block in range(first, min(first + users_per_chunk, n_users), RNG_BLOCK):
+            last = min(block + RNG_BLOCK, n_users)
+            blocks.append(generate_users(
+                np.arange(block + 1, last + 1, dtype = np.int32),
+                n_orders[block:last],
+                is_test[block:last],
+                order_ids[order_offsets[block]:order_offsets[last]],
+                cdf,
+                np.random.default_rng([seed, block]),
+            ))
+        tables = [pd.concat(parts, ignore_index = True) for parts in zip(*blocks)]
+
+        for name, table in zip(paths, tables):
+            table.to_csv(paths[name], mode = 'w' if first == 0 else 'a', header = first == 0, index = False)
+            counts[name] += len(table)
+
+    return counts
+
+
+# --- 📂 Command Line ---
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Write synthetic Instacart-shaped CSVs.')
+    parser.add_argument('--scale', type = float, default = 0.1, help = 'fraction of the Kaggle user count (0.1, 1, 10, ...)')
+    parser.add_argument('--out-dir', default = 'synthetic-data')
+    parser.add_argument('--seed', type = int, default = 22)
+    args = parser.parse_args(argv)
+
+    counts = generate(args.out_dir, args.scale, args.seed)
+    for name, rows in counts.items():
+        print(f'{name:>24}: {rows:,} rows')
+
+
+if __name__ == '__main__':
+    main()
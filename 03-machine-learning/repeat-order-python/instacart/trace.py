@@ -0,0 +1,215 @@
+"""Per-stage instrumentation of a pipeline run.
+
+A ``Trace`` records one row per stage:
+
+- ``wall_s`` and ``cpu_s`` (process CPU time, all threads),
+- ``rss_start_mb``, ``peak_rss_mb`` and ``peak_rss_delta_mb`` (resident memory,
+  polled in a background thread while the stage runs),
+- ``rows_in`` / ``rows_out`` (row counts of the stage input and output),
+- ``profile``: the ``.prof`` file of the stage when cProfile is enabled.
+
+Stages are opened with ``start`` / ``stop`` (flat scripts such as ``reorder.py``)
+or with the ``stage`` context manager::
+
+    trace = Trace('reorder', profile = 'cprofile')
+    with trace.stage('fit', rows_in = len(x_train)):
+        model.fit(x_train, y_train)
+    trace.save()                            # traces/reorder-<run_id>.json
+
+``compare(load_trace(old), load_trace(new))`` lines two runs up stage by stage.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+
+TRACE_DIR = 'traces'
+
+COMPARE_METRICS = ['wall_s', 'cpu_s', 'peak_rss_delta_mb']
+
+
+# --- 📂 Memory Sampling ---
+
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 2 ** 20 if hasattr(os, 'sysconf') else None
+
+
+def peak_rss_mb():
+    """Lifetime peak resident memory of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if platform.system() == 'Darwin' else peak / 2 ** 10
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB (falls back to the lifetime peak off Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        return peak_rss_mb()
+
+
+class RssSampler:
+    """Polls the resident memory in a background thread and keeps the peak."""
+
+    def __init__(self, interval = 0.005):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def count_rows(obj):
+    """Row count of a dataframe / array (sum over a tuple or dict of them); None if unknown."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (tuple, list)):
+        counts = [count_rows(o) for o in obj]
+        return None if None in counts else sum(counts)
+    if isinstance(obj, int):
+        return obj
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+# --- 📂 Trace ---
+
+class Trace:
+    """Timings, CPU time, peak memory and row counts of each stage of one run.
+
+    ``profile`` is None, ``'cprofile'`` (one ``.prof`` file per stage in
+    ``trace_dir``) or a callable ``profile(stage_name)`` returning a context
+    manager, e.g. a sampling profiler session.
+    """
+
+    def __init__(self, name = 'reorder', profile = None, trace_dir = TRACE_DIR):
+        self.name = name
+        self.profile = profile
+        self.trace_dir = trace_dir
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.records = []
+        self._open = []
+
+    def start(self, stage, rows_in = None):
+        """Open a stage (stages may nest; ``stop`` closes the innermost one)."""
+        record = {
+            'stage': stage,
+            'started': datetime.now().isoformat(timespec = 'seconds'),
+            'rows_in': count_rows(rows_in),
+            'rows_out': None,
+            'rss_start_mb': current_rss_mb(),
+            'profile': None,
+        }
+
+        profiler = None
+        ## Only one cProfile session can be active, so nested stages are covered by the outer profile.
+        profiling = any(isinstance(p, cProfile.Profile) for _, _, p, _, _ in self._open)
+        if self.profile == 'cprofile' and not profiling:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif callable(self.profile):
+            profiler = self.profile(stage)
+            profiler.__enter__()
+
+        sampler = RssSampler().__enter__()
+        self._open.append((record, sampler, profiler, time.perf_counter(), time.process_time()))
+        return record
+
+    def stop(self, rows_out = None):
+        """Close the innermost open stage and return its record."""
+        record, sampler, profiler, wall_start, cpu_start = self._open.pop()
+        wall_s = time.perf_counter() - wall_start
+        cpu_s = time.process_time() - cpu_start
+        sampler.__exit__(None, None, None)
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            os.makedirs(self.trace_dir, exist_ok = True)
+            record['profile'] = os.path.join(self.trace_dir, f"{self.name}-{self.run_id}-{record['stage']}.prof")
+            profiler.dump_stats(record['profile'])
+        elif profiler is not None:
+            profiler.__exit__(None, None, None)
+
+        if rows_out is not None:
+            record['rows_out'] = count_rows(rows_out)
+        record.update(
+            wall_s = wall_s,
+            cpu_s = cpu_s,
+            peak_rss_mb = sampler.peak,
+            peak_rss_delta_mb = sampler.peak - record['rss_start_mb'],
+        )
+        self.records.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage, rows_in = None):
+        """Context manager around ``start`` / ``stop``; set ``record['rows_out']`` inside the block."""
+        record = self.start(stage, rows_in)
+        try:
+            yield record
+        finally:
+            self.stop()
+
+    def to_frame(self):
+        columns = ['stage', 'started', 'wall_s', 'cpu_s', 'rss_start_mb', 'peak_rss_mb',
+                   'peak_rss_delta_mb', 'rows_in', 'rows_out', 'profile']
+        return pd.DataFrame(self.records, columns = columns)
+
+    def save(self, path = None):
+        """Write the trace as JSON (default ``<trace_dir>/<name>-<run_id>.json``) or CSV; returns the path."""
+        if path is None:
+            os.makedirs(self.trace_dir, exist_ok = True)
+            path = os.path.join(self.trace_dir, f'{self.name}-{self.run_id}.json')
+
+        if path.endswith('.csv'):
+            self.to_frame().assign(name = self.name, run_id = self.run_id).to_csv(path, index = False)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'name': self.name, 'run_id': self.run_id, 'stages': self.records}, f, indent = 2)
+        return path
+
+
+# --- 📂 Comparing Runs ---
+
+def load_trace(path):
+    """Stage rows of a saved trace (JSON or CSV) as a dataframe."""
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)['stages'])
+
+
+def compare(baseline, current, metrics = COMPARE_METRICS):
+    """Side by side metrics of two traces per stage, with the current / baseline ratio."""
+    ## Stages that ran several times (e.g. per chunk) are summed.
+    joined = baseline.groupby('stage', sort = False)[metrics].sum().join(
+        current.groupby('stage', sort = False)[metrics].sum(), how = 'outer', lsuffix = '_baseline', rsuffix = '_current'
+    )
+    for metric in metrics:
+        joined[f'{metric}_ratio'] = joined[f'{metric}_current'] / joined[f'{metric}_baseline']
+    return joined
@@ -0,0 +1,143 @@
+"""Out-of-core training of the reorder model.
+
+``LogisticRegression(solver='saga')`` needs the whole training frame in
+memory and refits from scratch. ``train_incremental`` fits the same model
+(a logistic regression, i.e. log-loss on a linear score) with
+``SGDClassifier.partial_fit``, one chunk at a time:
+
+1. one pass over the chunks fits a ``StandardScaler`` (SGD needs scaled features),
+2. each epoch streams the chunks again through ``partial_fit``,
+3. after every epoch the ROC AUC on a held-out set is recorded, and training
+   stops when it has not improved by ``tol`` for ``patience`` epochs.
+
+The best epoch is returned as a ``LinearScorer`` in the raw feature space
+(the scaling is folded into the coefficients), so it scores exactly like
+the saga model. Memory is bounded by the chunk size.
+
+Chunk sources are callables that return a fresh iterator of ``(x, y)``
+chunks for every epoch: ``array_chunks``, ``store_chunks`` and ``csv_chunks``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from instacart.capping import OutlierCapper
+from instacart.scoring import DEFAULT_THRESHOLD, LinearScorer
+
+
+# --- 🏷️ Chunk Sources ---
+
+def array_chunks(x, y, chunksize = 100_000, random_state = 22):
+    """Chunks of in-memory arrays, reshuffled every epoch."""
+    x = np.asarray(x, dtype = np.float32)
+    y = np.asarray(y)
+    rng = np.random.default_rng(random_state)
+
+    def epoch():
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), chunksize):
+            idx = order[start:start + chunksize]
+            yield x[idx], y[idx]
+
+    return epoch
+
+
+def store_chunks(store, user_id, product_id, y, features, chunksize = 100_000, random_state = 22):
+    """Chunks gathered from a ``FeatureStore`` by (user_id, product_id), reshuffled every epoch.
+
+    Only the keys and labels are held in memory; the features of a chunk are
+    gathered from the memory-mapped store when the chunk is used.
+    """
+    user_id = np.asarray(user_id)
+    product_id = np.asarray(product_id)
+    y = np.asarray(y)
+    rng = np.random.default_rng(random_state)
+
+    def epoch():
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), chunksize):
+            idx = np.sort(order[start:start + chunksize])
+            yield store.gather(user_id[idx], product_id[idx], features), y[idx]
+
+    return epoch
+
+
+def csv_chunks(path, features, label = 'reordered_next', chunksize = 100_000):
+    """Chunks read from a training CSV (e.g. several months of exported training pairs)."""
+    def epoch():
+        with pd.read_csv(path, usecols = list(features) + [label], chunksize = chunksize) as reader:
+            for chunk in reader:
+                yield chunk[list(features)].to_numpy(dtype = np.float32), chunk[label].to_numpy()
+
+    return epoch
+
+
+# --- 🏷️ Incremental Training ---
+
+def fit_caps(chunks, features):
+    """Outlier caps of the training chunks, from merged quantile sketches (one pass)."""
+    capper = OutlierCapper(features)
+    for x, _ in chunks():
+        capper.partial_fit(x)
+    return capper.upper_bounds
+
+
+def train_incremental(chunks, validation, features, max_epochs = 20, patience = 3, tol = 1e-4,
+                      alpha = 1e-5, upper_bounds = None, threshold = DEFAULT_THRESHOLD, random_state = 22):
+    """Fit a log-loss SGD model chunk by chunk with early stopping on validation AUC.
+
+    - ``chunks``: callable returning an iterator of ``(x, y)`` chunks (one epoch).
+    - ``validation``: ``(x_val, y_val)`` held-out arrays.
+    - ``upper_bounds``: outlier caps per feature (e.g. from ``fit_caps``), applied to every
+      chunk in place (and saved in the scorer).
+
+    Returns ``(scorer, history)``: the best epoch as a ``LinearScorer`` and a
+    dataframe with the validation AUC of every epoch.
+    """
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.metrics import roc_auc_score
+    from sklearn.preprocessing import StandardScaler
+
+    upper_bounds = dict(upper_bounds or {})
+    capper = OutlierCapper.from_bounds(features, upper_bounds)
+
+    ## 1. Scaler pass.
+    scaler = StandardScaler()
+    for x, _ in chunks():
+        scaler.partial_fit(capper.transform(np.asarray(x, dtype = np.float32)))
+
+    x_val = scaler.transform(capper.transform(np.array(validation[0], dtype = np.float32)))
+    y_val = np.asarray(validation[1])
+
+    ## Averaged SGD: the averaged weights are much more stable from epoch to epoch.
+    model = SGDClassifier(loss = 'log_loss', alpha = alpha, average = True, random_state = random_state)
+    classes = np.array([0, 1])
+
+    best = {'auc': -np.inf, 'coef': None, 'intercept': None, 'epoch': 0}
+    history = []
+    stale = 0
+
+    ## 2. Epochs of partial_fit, 3. early stopping on the held-out AUC.
+    for epoch in range(1, max_epochs + 1):
+        rows = 0
+        for x, y in chunks():
+            model.partial_fit(scaler.transform(capper.transform(np.asarray(x, dtype = np.float32))), y, classes = classes)
+            rows += len(y)
+
+        auc = roc_auc_score(y_val, model.decision_function(x_val))
+        history.append({'epoch': epoch, 'rows': rows, 'val_auc': auc})
+
+        if auc > best['auc'] + tol:
+            best = {'auc': auc, 'coef': model.coef_[0].copy(), 'intercept': model.intercept_[0], 'epoch': epoch}
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+
+    ## Fold the standard scaling into the coefficients: w·(x - mean)/scale + b.
+    coef = best['coef'] / scaler.scale_
+    intercept = best['intercept'] - np.sum(best['coef'] * scaler.mean_ / scaler.scale_)
+    scorer = LinearScorer(features, coef, intercept, threshold, upper_bounds)
+
+    return scorer, pd.DataFrame(history)
@@ -1,5 +1,9 @@
 # 📢 Project: Instacart Repeat Order Prediction
 
+## This script is the step-by-step walkthrough (previews and charts).
+## Production / headless runs use the same stages from the 'instacart' package:
+## python -m instacart features | train | score | report --headless
+
 
 # 📢 Data Preparation
 
@@ -8,8 +12,19 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, roc_auc_score
+from sklearn.metrics import classification_report
 import gdown
+from instacart.loader import load_table, load_tables, memory_report
+from instacart.order_index import OrderIndex
+from instacart.features import build_features
+from instacart.feature_store import FeatureStore
+from instacart import pair_key
+from instacart.sampling import sample_negatives
+from instacart.capping import OutlierCapper
+from instacart.evaluation import ThresholdEvaluation
+from instacart.error_analysis import Catalogue, breakdown, error_list, outcome_codes, top_groups
+from instacart.scoring import LinearScorer, score_test_set
+from instacart.trace import Trace
 
 
 # --- 📂 Data Loading ---
@@ -25,19 +40,43 @@ import gdown
 
 
 # --- Store dataset in Dataframes ---
-orders = pd.read_csv('orders.csv', usecols=['order_id', 'user_id', 'eval_set', 'order_number', 'days_since_prior_order'])
-## op_prior = pd.read_csv('order_products__prior.csv')
-## op_train = pd.read_csv('order_products__train.csv')
+## The loader assigns narrow dtypes (int32 ids, uint8 counters, float32 days, category eval_set),
+## so the prior + train + orders working set stays a fraction of the default int64/object frames.
+## The first run converts each CSV into a columnar cache, later runs load the cache in seconds.
+CACHE_DIR = '.instacart-cache'
+
+## Each stage below is recorded in 'trace' (wall time, CPU time, peak memory, rows in / out);
+## the trace is saved to 'traces/' at the end of the run. Use profile = 'cprofile' for one .prof per stage.
+trace = Trace('reorder', profile = None)
+
+trace.start('load')
+tables = load_tables(
+    ['orders', 'order_products__prior', 'order_products__train'],
+    usecols = {'orders': ['order_id', 'user_id', 'eval_set', 'order_number', 'days_since_prior_order']},
+    cache_dir = CACHE_DIR
+)
+orders = tables['orders']
+op_prior = tables['order_products__prior']
+op_train = tables['order_products__train']
+trace.stop(rows_out = tables)
+
+## Check the memory footprint of each table.
+print(memory_report(tables))
 
 
 # --- Merging Tables ---
 
-## Merge 'op_prior' and 'orders' tables to prepare the base for Features Engineering (X).
-prior_orders = op_prior.merge(
-    orders[orders['eval_set'] == 'prior'][['order_id', 'user_id']],
-    on = 'order_id',
-    how = 'inner'
-)
+## Build a dense order_id -> (user_id, eval_set, order_number, days_since_prior_order) index.
+## order_ids are dense integers, so each lookup is a plain array gather instead of a hash join.
+trace.start('merges', rows_in = (op_prior, op_train))
+order_index = OrderIndex(orders)
+
+
+## Attach the order attributes to 'op_prior' to prepare the base for Features Engineering (X).
+## Only prior orders are kept (the mask is all True for the Kaggle files, so no copy is made there).
+prior_mask = order_index.eval_set_mask(op_prior['order_id'], 'prior')
+prior_orders = op_prior if prior_mask.all() else op_prior[prior_mask].reset_index(drop = True)
+order_index.attach(prior_orders, columns = ['user_id', 'order_number', 'days_since_prior_order'])
 
 print(prior_orders.head())
 # ## result:
@@ -49,12 +88,11 @@ print(prior_orders.head())
 # 4         2       30035                  5          0   202279
 
 
-## Merge 'op_train' and 'orders' tables to find the Target Variable (Y=1 (in reordered column)).
-train_orders = op_train.merge(
-    orders[orders['eval_set'] == 'train'][['order_id', 'user_id']],
-    on = 'order_id',
-    how = 'inner'
-)
+## Attach user_id to 'op_train' to find the Target Variable (Y=1 (in reordered column)).
+train_mask = order_index.eval_set_mask(op_train['order_id'], 'train')
+train_orders = op_train if train_mask.all() else op_train[train_mask].reset_index(drop = True)
+order_index.attach(train_orders, columns = ['user_id'])
+trace.stop(rows_out = (prior_orders, train_orders))
 
 print(train_orders.head())
 # ## result:
@@ -69,44 +107,24 @@ print(train_orders.head())
 
 # 📢 Features Engineering
 
-# --- 🔑 User Features (Customer level) ---
+# --- 🔑 Fused Feature Build (Customer, Product and User - Product levels) ---
 
-cust_features = prior_orders.groupby('user_id').aggregate(
-    cust_total_prod = ('order_id', 'count'),
-    cust_unique_prod = ('product_id', 'nunique'),
-).reset_index()
+## All feature tables come from one scan of 'prior_orders':
+## the rows are reduced once into per (user_id, product_id) partial aggregates
+## (count, reordered sum, add_to_cart sum, max order_number, reordered-only days sum),
+## then the customer and product tables are reduced from those pairs with bincount.
+## 'user_total_orders' and 'user_avg_days_between_orders' come from the prior + train orders.
+trace.start('features', rows_in = prior_orders)
+cust_features, prod_features, up_features = build_features(prior_orders, orders)
+trace.stop(rows_out = (cust_features, prod_features, up_features))
 
-print(cust_features.head())
-# ## result:
-#   user_id  cust_total_prod  cust_unique_prod
-# 0        1               59                18
-# 1        2              195               102
-# 2        3               88                33
-# 3        4               18                17
-# 4        5               37                23
-
-
-cust_orders_stats = orders[orders['eval_set'].isin(['prior', 'train'])].groupby('user_id').aggregate(
-    user_total_orders = ('order_id', 'count'),
-    user_avg_days_between_orders = ('days_since_prior_order', 'mean'),
-).reset_index()
-
-print(cust_orders_stats.head())
-# ## result:
-#    user_id  user_total_orders  user_avg_days_between_orders
-# 0        1                 11                     19.000000
-# 1        2                 15                     16.285714
-# 2        3                 12                     12.090909
-# 3        4                  5                     13.750000
-# 4        5                  5                     11.500000
+## For order histories that do not fit in memory, 'build_features_streaming(orders, chunksize = ...)'
+## reads 'order_products__prior.csv' in fixed-size chunks and returns the same three tables.
+## On multi-core machines, 'build_features_parallel(prior_orders, orders, n_jobs = ...)' builds
+## user_id shards in a process pool and also returns the same three tables.
 
 
-## Merge the 'cust_features' and 'cust_orders_stats' tables.
-cust_features = cust_features.merge(
-    cust_orders_stats,
-    on = 'user_id',
-    how = 'left'
-)
+# --- 🔑 User Features (Customer level) ---
 
 print(cust_features.head())
 # ## result:
@@ -121,11 +139,6 @@ print(cust_features.head())
 
 # --- 🔑 Product Features (Product level) ---
 
-prod_features = prior_orders.groupby('product_id').aggregate(
-    prod_total_pur = ('order_id', 'count'),
-    prod_reorder_rate = ('reordered', 'mean'),
-).reset_index()
-
 print(prod_features.head())
 # ## result:
 #    product_id  prod_total_pur  prod_reorder_rate
@@ -137,95 +150,30 @@ print(prod_features.head())
 
 
 # --- 🔑 User - Product Interaction Features ---
-  
-## Prepare table to calculating about "Time period" and "Order Number".
-## Merge the 'prior_orders' and 'orders' tables.
-prior_features_base = prior_orders.merge(
-    orders[['order_id', 'order_number', 'days_since_prior_order']],
-    on = 'order_id',
-    how = 'left'
-)
-
-print(prior_features_base.head())
-# ## result:
-#    order_id  product_id  add_to_cart_order  reordered  user_id  order_number  days_since_prior_order
-# 0         2       33120                  1          1   202279             3                     8.0
-# 1         2       28985                  2          1   202279             3                     8.0   
-# 2         2        9327                  3          0   202279             3                     8.0   
-# 3         2       45918                  4          1   202279             3                     8.0   
-# 4         2       30035                  5          0   202279             3                     8.0   
-
-     
-up_features = prior_features_base.groupby(['user_id', 'product_id']).aggregate(
-    count_orders = ('order_id', 'count'),
-    prod_reorder_ratio = ('reordered', 'mean'),
-    last_order_number = ('order_number', 'max'),
-    avg_add_to_cart = ('add_to_cart_order', 'mean')
-).reset_index()
 
+## 'avg_days_between_reorder' = reordered-only days sum / number of reorders.
+## Products that have never been reordered get 30 days (the typical max order interval)
+## to represent a long/indefinite reorder cycle, preventing model bias toward zero.
 print(up_features.head())
 # ## result:
-#    user_id  product_id  count_orders  prod_reorder_ratio  last_order_number  avg_add_to_cart
-# 0        1         196            10            0.900000                 10         1.400000   
-# 1        1       10258             9            0.888889                 10         3.333333   
-# 2        1       10326             1            0.000000                  5         5.000000   
-# 3        1       12427            10            0.900000                 10         3.300000   
-# 4        1       13032             3            0.666667                 10         6.333333   
-
-
-## Calculate 'days_since_prior_order' column, focusing only on reordered products (reordered = 1).
-reorder_time_features = prior_features_base[prior_features_base['reordered'] == 1].groupby(
-    ['user_id', 'product_id']).aggregate(
-        total_days_between_reorder = ('days_since_prior_order', 'sum'),
-        count_reorder = ('order_id', 'count')
-    ).reset_index()
-
-## To find the average of repeated orders.
-reorder_time_features['avg_days_between_reorder'] = (
-    reorder_time_features['total_days_between_reorder'] /
-    reorder_time_features['count_reorder']
-)
+#    user_id  product_id  count_orders  prod_reorder_ratio  last_order_number  avg_add_to_cart  avg_days_between_reorder
+# 0        1         196            10            0.900000                 10         1.400000                 19.555556
+# 1        1       10258             9            0.888889                 10         3.333333                 20.125000
+# 2        1       10326             1            0.000000                  5         5.000000                 30.000000
+# 3        1       12427            10            0.900000                 10         3.300000                 19.555556
+# 4        1       13032             3            0.666667                 10         6.333333                 25.000000
 
-print(reorder_time_features.head())
-# ## result:
-#    user_id  product_id  total_days_between_reorder  count_reorder     avg_days_between_reorder
-# 0        1         196                       176.0              9                    19.555556
-# 1        1       10258                       161.0              8                    20.125000
-# 2        1       12427                       176.0              9                    19.555556
-# 3        1       13032                        50.0              2                    25.000000
-# 4        1       13176                        28.0              1                    28.000000
-
-
-## Merge 'up_features' and 'reorder_time_features' tables.
-up_features = up_features.merge(
-    reorder_time_features[['user_id', 'product_id', 'avg_days_between_reorder']],
-    on = ['user_id', 'product_id'],
-    how = 'left'
-)
 
-print(up_features.head())
-# ## result:
-#    user_id  product_id  count_orders  prod_reorder_ratio  last_order_number  avg_add_to_cart  avg_days_between_reorder
-# 0        1         196            10            0.900000                 10         1.400000                 19.555556   
-# 1        1       10258             9            0.888889                 10         3.333333                 20.125000   
-# 2        1       10326             1            0.000000                  5         5.000000                       NaN   
-# 3        1       12427            10            0.900000                 10         3.300000                 19.555556   
-# 4        1       13032             3            0.666667                 10         6.333333                 25.000000   
 
+# --- 🔑 Feature Store ---
 
-## Replace the NaN value with the number 30 in the 'avg_days_between_reorder' column (Feature Engineering).
-## NaN indicates products that have never been reordered.
-## I impute with 30 days (the typical max order interval) to represent a long/indefinite reorder cycle, preventing model bias toward zero.
-up_features['avg_days_between_reorder'] = up_features['avg_days_between_reorder'].fillna(30)
+## Write the 3 feature tables as memory-mapped float32 columns with a sorted (user_id, product_id) key index.
+## Later runs (and the scoring stage) can open the store in milliseconds with 'FeatureStore(FEATURE_STORE_DIR)'.
+FEATURE_STORE_DIR = 'feature-store'
 
-print(up_features.head())
-# ## result:
-#    user_id  product_id  count_orders  prod_reorder_ratio  last_order_number  avg_add_to_cart  avg_days_between_reorder
-# 0        1         196            10            0.900000                 10         1.400000                 19.555556
-# 1        1       10258             9            0.888889                 10         3.333333                 20.125000
-# 2        1       10326             1            0.000000                  5         5.000000                 30.000000
-# 3        1       12427            10            0.900000                 10         3.300000                 19.555556   
-# 4        1       13032             3            0.666667                 10         6.333333                 25.000000   
+trace.start('feature_store', rows_in = up_features)
+feature_store = FeatureStore.write(FEATURE_STORE_DIR, cust_features, prod_features, up_features)
+trace.stop(rows_out = len(feature_store))
 
 
 
@@ -234,6 +182,7 @@ print(up_features.head())
 # --- 🏷️ Training Dataset: Create training dataset by negative sampling ---
 
 ## Positive Cases (Y=1)
+trace.start('sampling', rows_in = (train_orders, up_features))
 positive_cases = train_orders[['user_id', 'product_id']].copy()
 positive_cases['reordered_next'] = 1
 
@@ -248,24 +197,22 @@ print(positive_cases.head())
 
 
 ## Negative Sampling (Y=0).
-all_prior_user_prod = up_features[['user_id', 'product_id']].copy()
-
-
-## Filter out data that does not repeat purchases in the "Training set".
-merged_all = all_prior_user_prod.merge(
-    positive_cases,
-    on = ['user_id', 'product_id'],
-    how = 'left',
-    suffixes = ('_prior', '_train'))
-
-merged_all['reordered_next'] = merged_all['reordered_next'].fillna(0)
-
-negative_pool = merged_all[merged_all['reordered_next'] == 0].drop(columns = ['reordered_next'])
-
+## Draw straight from the prior (user_id, product_id) key space: the keys of 'up_features' are streamed in chunks,
+## pairs that are reordered in the "Training set" are filtered out with an anti-join,
+## and a reservoir keeps the sample, so no full prior pair table or merged pool is materialized.
 
 ## Perform 1:1 negative sampling (with positive_cases)
 N = len(positive_cases)
-negative_sample = negative_pool.sample(n = min(N, len(positive_cases)), random_state = 22)
+negative_keys = sample_negatives(
+    pair_key.iter_frame_keys(up_features),
+    pair_key.frame_keys(positive_cases),
+    n = N,
+    random_state = 22
+)
+## Use 'stratify_by_user = True' instead of 'n' to draw as many negatives per user as the user has positives.
+
+negative_user_id, negative_product_id = pair_key.unpack(negative_keys)
+negative_sample = pd.DataFrame({'user_id': negative_user_id, 'product_id': negative_product_id})
 negative_sample['reordered_next'] = 0
 
 print(negative_sample.head())
@@ -291,28 +238,14 @@ print(final_train_data.head())
 # 4         112108       43633               1
 
 
-## Merge all 3 features.
-final_train_data = final_train_data.merge(
-    cust_features,
-    on = 'user_id',
-    how = 'left'
-)
-
-final_train_data = final_train_data.merge(
-    prod_features,
-    on = 'product_id',
-    how = 'left'
-)
-
-final_train_data = final_train_data.merge(
-    up_features,
-    on = ['user_id', 'product_id'],
-    how = 'left'
-)
+## Gather all 3 features (customer, product, user-product) from the feature store.
+## One key lookup per pair instead of three merges that each copy the whole frame.
+final_train_data = feature_store.gather_frame(final_train_data)
+trace.stop(rows_out = final_train_data)
 
 
-# Replace the NaN value with the number 0 in count_orders column.
-final_train_data.fillna(0, inplace = True)
+# Pairs without features (e.g. products never bought in prior orders) are filled with the number 0 by the store,
+# the same as replacing the NaN value with 0 after the left merges.
 
 print(final_train_data.head())
 # ## result:
@@ -348,33 +281,25 @@ core_features = [
 
 
 ## Check and Manage Outlier using IQR method (Capping)
-for feature in core_features:
-
-    # Calculate Q1, Q3 and IQR.
-    Q1 = final_train_data[feature].quantile(0.25)
-    Q3 = final_train_data[feature].quantile(0.75)
-    IQR = Q3 - Q1
-    # Calculate Upper Bound
-    upper_bound = Q3 + 1.5 * IQR
-
-    # Check Outlier Count
-    outlier_count = final_train_data[final_train_data[feature] > upper_bound].shape[0]
-
+## All bounds (Q3 + 1.5 * IQR) are computed in one vectorized pass; a feature is capped only if outliers are found.
+## The applied caps are kept in 'upper_bounds' and saved with the model, so scoring uses the same capping.
+## For chunked data, 'capper.partial_fit(chunk)' merges approximate quantile sketches instead.
+trace.start('capping', rows_in = final_train_data)
+capper = OutlierCapper(core_features).fit(final_train_data)
+outlier_counts = capper.outlier_counts(final_train_data)
+
+for feature, upper_bound in zip(core_features, capper.bounds):
     # Print status before capping
     print(f"--- Feature: {feature} ---")
     print(f"--- Upper Bound: {upper_bound:.2f}") # use .2 for clarity in displaying decimal points
-    print(f"Outliers found: {outlier_count} row")
-
-    # Apply Capping (Winsorizing) only if outliers are found.
-    if outlier_count > 0:
-        # Capping the outlier
-        final_train_data[feature] = np.where(
-            final_train_data[feature] > upper_bound,
-            upper_bound,
-            final_train_data[feature]
-        )
+    print(f"Outliers found: {outlier_counts[feature]} row")
+    if feature in capper.upper_bounds:
         print(f"--- Outliers successfully capped at {upper_bound:.2f} ---")
 
+# Capping (Winsorizing) the outliers.
+capper.transform(final_train_data)
+upper_bounds = capper.upper_bounds
+
 # ## result:
 # --- Feature: count_orders ---
 # --- Upper Bound: 6.00
@@ -391,6 +316,9 @@ for feature in core_features:
 # Outliers found: 0 row
 
 
+trace.stop(rows_out = final_train_data)
+
+
 x = final_train_data[core_features]
 y = final_train_data['reordered_next']
 
@@ -407,12 +335,31 @@ model = LogisticRegression(solver = 'saga', # 'saga' is an algorithm suitable fo
                            random_state = 22,
                            n_jobs = -1)
 
+trace.start('fit', rows_in = x_train)
 model.fit(x_train, y_train)
+trace.stop()
 # ## result:
 # LogisticRegression
 # LogisticRegression(max_iter=1000, n_jobs=-1, random_state=22, solver='saga')
 
 
+## Save the coefficients as plain arrays, so the batch scorer does not need sklearn.
+scorer = LinearScorer.from_estimator(model, core_features, threshold = 0.40, upper_bounds = upper_bounds)
+scorer.save('reorder-model.json')
+
+## Out-of-core alternative (training data larger than memory): SGD log-loss, chunk by chunk,
+## with early stopping on the validation AUC.
+# from instacart.training import array_chunks, train_incremental
+# scorer, history = train_incremental(array_chunks(x_train, y_train, chunksize = 100_000), (x_val, y_val),
+#                                     core_features, upper_bounds = upper_bounds)
+
+## Histogram gradient boosting on uint8 binned features (all store features, no capping needed):
+## python -m instacart train --cache-dir .instacart-cache --model-type boosting   (bin edges in binned-train/bins.json)
+
+## Hyperparameter search (C, penalty, solver, feature set) on all cores, with the training matrix in shared memory:
+## python -m instacart search --cache-dir .instacart-cache --n-jobs 8   (leaderboard in search-leaderboard.csv)
+
+
 print(y_val.value_counts())
 # ## result:
 # reordered_next
@@ -484,11 +431,17 @@ plt.show()
 
 # --- 🏷️ Evaluation and Interpretation ---
 
+trace.start('predict_validation', rows_in = x_val)
 y_pred_proba = model.predict_proba(x_val)[: , 1]
+trace.stop(rows_out = y_pred_proba)
+
+## The validation probabilities are computed once and sorted once;
+## ROC AUC and every threshold metric below are read from 'evaluation'.
+evaluation = ThresholdEvaluation(y_val, y_pred_proba)
 
 ## Report the result (ROC AUC Score).
 print("\n--- 4 Core Features ---")
-print(f"ROC AUC Score: {roc_auc_score(y_val, y_pred_proba):.4f}")
+print(f"ROC AUC Score: {evaluation.roc_auc():.4f}")
 # ## result:
 # --- 4 Core Features ---
 # ROC AUC Score: 0.8128
@@ -514,139 +467,68 @@ print(feature_importance)
 
 # --- 🏷️ Optimal Threshold Identification ---
 
-from sklearn.metrics import f1_score ## add f1_score
-
-## Create y_pred (0 or 1) using the specified threshold.
+## F1 at the specified threshold (a pair is predicted as reordered when proba > threshold).
 threshold = 0.40
-y_pred = (y_pred_proba > threshold).astype(int)
 
-print(f"F1-Score @ Threshold {threshold}: {f1_score(y_val, y_pred):.4f}")
+print(f"F1-Score @ Threshold {threshold}: {evaluation.at(threshold)['f1']:.4f}")
 # ## result:
 # F1-Score @ Threshold 0.4: 0.7476
 
 
+## The full curve (every distinct probability as a threshold) comes from the same sorted arrays.
+threshold_curve = evaluation.sweep(np.round(np.arange(0.05, 0.96, 0.05), 2))
+print(threshold_curve[['threshold', 'precision', 'recall', 'specificity', 'f1']].round(4).to_string(index = False))
+print(f"Best F1 threshold: {evaluation.best('f1')['threshold']:.4f}")
+
+
 
 # --- 🏷️ Error Analysis (False Negatives / False Positives) ---
 
-# --- 📂 Download the 'products' and 'aisles' tables ---
+# --- 📂 Download the 'products', 'aisles' and 'departments' tables ---
 ## Since the dataset is large, I fetch the data directly from Google Drive.
 ## In this process, I use the following files:
-## 1. products 2. aisles
+## 1. products 2. aisles 3. departments
 ## Note: For Error Analysis (False Negatives / False Positives) process.
 
 
 # --- Store dataset in Dataframes ---
-## products = pd.read_csv('products.csv')
-## aisles = pd.read_csv('aisles.csv')
-
-
-# --- Prepare the Validation dataframe ---
-
-## Combine x_val and y_val table to create a dataframe.
-validation_df = x_val.copy()
-validation_df['reordered_actual'] = y_val
-
-print(validation_df.head())
-# ## result:
-#          count_orders  avg_days_between_reorder  prod_reorder_rate  user_avg_days_between_orders  reordered_actual
-# 527041            1.0                 30.000000           0.521021                     11.190476                 1
-# 1694697           1.0                 30.000000           0.619973                     12.285714                 0
-# 2111176           1.0                 30.000000           0.715237                      8.000000                 0   
-# 2639205           1.0                 30.000000           0.854342                      6.100000                 0   
-# 2440381           6.0                  8.166667           0.650427                      7.020833                 0   
+products = load_table('products', cache_dir = CACHE_DIR)
+aisles = load_table('aisles', cache_dir = CACHE_DIR)
+departments = load_table('departments', cache_dir = CACHE_DIR)
 
 
-## Add the product_id column back into validation_df.
-product_id_val = final_train_data.loc[x_val.index, 'product_id']
-validation_df['product_id'] = product_id_val
+## Dense product_id -> aisle_id / department_id lookup arrays (no merges with the validation rows).
+## The names are only looked up for the rows that are printed.
+catalogue = Catalogue.from_tables(products, aisles, departments)
 
 
-## Predict the outcome (y_pred) on x_val.
-validation_df['reordered_proba'] = model.predict_proba(x_val)[:, 1]
+# --- Outcome of each Validation row ---
 
-
-## Set the prediction result (y_pred) by Threshold @ 0.40.
+## Set the prediction result (y_pred) by Threshold @ 0.40, from the cached validation probabilities.
 threshold = 0.40
-validation_df['reordered_pred'] = (validation_df['reordered_proba'] > threshold).astype(int)
-
-print(validation_df.head())
-# ## result:
-#          count_orders  avg_days_between_reorder  prod_reorder_rate   user_avg_days_between_orders  reordered_actual  product_id \
-# 527041            1.0                 30.000000           0.521021                      11.190476                 1       40299  
-# 1694697           1.0                 30.000000           0.619973                      12.285714                 0       31717
-# 2111176           1.0                 30.000000           0.715237                       8.000000                 0       33845
-# 2639205           1.0                 30.000000           0.854342                       6.100000                 0       29447
-# 2440381           6.0                  8.166667           0.650427                       7.020833                 0        9387   
+user_id_val = final_train_data.loc[x_val.index, 'user_id'].to_numpy()
+product_id_val = final_train_data.loc[x_val.index, 'product_id'].to_numpy()
 
-#          reordered_proba  reordered_pred  
-# 527041          0.158635               0  
-# 1694697         0.208004               0  
-# 2111176         0.167549               0  
-# 2639205         0.180331               0  
-# 2440381         0.543526               1 
-
-
-
-# --- Merging table ---
-
-## Merge 3 tables between validation_df, products and aisles.
-products_info = products[['product_id', 'aisle_id']].drop_duplicates()
-aisles_info = aisles[['aisle_id', 'aisle']].drop_duplicates()
-
-validation_df = validation_df.merge(
-    products_info,
-    on = 'product_id',
-    how = 'left'
-)
-
-validation_df = validation_df.merge(
-    aisles_info,
-    on = 'aisle_id',
-    how = 'left'
-)
-
-
-## Edit the column names 'aisle_id' and 'aisle'.
-validation_df = validation_df.rename(columns = {
-    'aisle_id': 'category_id',
-    'aisle': 'category_name'
-})
+## One code per row: 0 = TN, 1 = FP, 2 = FN (Actual = 1, Predicted = 0), 3 = TP.
+outcomes = outcome_codes(y_val, y_pred_proba > threshold)
 
 
 
 # --- 📌 Error Analysis (FN / FP) ---
 
-## False Negatives (FN): Actual = 1, Predicted = 0 (Missed Opportunity).
-df_fn = validation_df[
-    (validation_df['reordered_actual'] == 1) &
-    (validation_df['reordered_pred'] == 0)
-]
-
-print(df_fn.head())
-# ## result:
-#         count_orders  avg_days_between_reorder  prod_reorder_rate  user_avg_days_between_orders  reordered_actual  product_id \
-# 0                1.0                      30.0           0.521021                     11.190476                 1       40299
-# 12               1.0                      30.0           0.291203                     11.750000                 1       18598
-# 28               2.0                      30.0           0.603038                     20.333333                 1       28199
-# 34               2.0                      30.0           0.690094                     12.000000                 1       33548  
-# 38               1.0                      30.0           0.081888                     13.333333                 1        6020  
-
-#         reordered_proba  reordered_pred  category_id               category_name
-# 0              0.158635               0          128        tortillas flat bread
-# 12             0.109282               0           19               oils vinegars
-# 28             0.366393               0          123  packaged vegetables fruits
-# 34             0.218421               0          120                      yogurt
-# 38             0.085349               0          104           spices seasonings
-
+## TN / FP / FN / TP counts per aisle (category) and per department, each from one bincount.
+aisle_outcomes = breakdown(catalogue, product_id_val, outcomes, level = 'aisle')
+department_outcomes = breakdown(catalogue, product_id_val, outcomes, level = 'department')
 
 
+## False Negatives (FN): Actual = 1, Predicted = 0 (Missed Opportunity).
 ## Top 10 Category Names that cause False Negatives.
-top10_fn_category = df_fn.groupby('category_name')['product_id'].count().sort_values(ascending=False).head(10)
+top10_fn_category = top_groups(aisle_outcomes, 'fn', 10, catalogue, level = 'aisle').set_index('aisle_name')['fn']
 
 print("Top 10 Category Names that cause False Negatives (Lost Sales Opportunity):\n", top10_fn_category)
 # ## result:
 # Top 10 Category Names that cause False Negatives (Lost Sales Opportunity):
-#  category_name
+#  aisle_name
 # fresh vegetables                 5282
 # fresh fruits                     3475
 # packaged vegetables fruits       2543
@@ -657,39 +539,17 @@ print("Top 10 Category Names that cause False Negatives (Lost Sales Opportunity)
 # frozen produce                    837
 # water seltzer sparkling water     743
 # crackers                          714
-# Name: product_id, dtype: int64
+# Name: fn, dtype: int64
 
 
 ## False Positives (FP): Actual = 0, Predicted = 1 (Wrong recommendation/wasted cost).
-df_fp = validation_df[
-    (validation_df['reordered_actual'] == 0) &
-    (validation_df['reordered_pred'] == 1)
-]
-
-print(df_fp.head())
-# ## result:
-#         count_orders  avg_days_between_reorder  prod_reorder_rate  user_avg_days_between_orders  reordered_actual  product_id  \
-# 4                6.0                  8.166667           0.650427                      7.020833                 0        9387
-# 14               1.0                 30.000000           0.652174                     24.000000                 0       19064
-# 18               6.0                 24.600000           0.510179                     22.454545                 0       20754
-# 19               2.0                 15.000000           0.550313                     14.285714                 0        5460 
-# 24               2.0                 15.000000           0.476649                     14.384615                 0       31506  
-
-#         reordered_proba  reordered_pred  category_id         category_name  
-# 4              0.543526               1           24          fresh fruits  
-# 14             0.503859               1           33          kosher foods  
-# 18             0.457835               1           37         ice cream ice  
-# 19             0.564828               1           36                butter  
-# 24             0.528529               1           19         oils vinegars  
-
-
 ## Top 10 category names that cause False Positives.
-top10_fp_category = df_fp.groupby('category_name')['product_id'].count().sort_values(ascending=False).head(10)
+top10_fp_category = top_groups(aisle_outcomes, 'fp', 10, catalogue, level = 'aisle').set_index('aisle_name')['fp']
 
 print("Top 10 Category Names that cause False Positives (Wasted Recommendations):\n", top10_fp_category)
 # ## result:
 # Top 10 Category Names that cause False Positives (Wasted Recommendations):
-#  category_name
+#  aisle_name
 # fresh vegetables                 13459
 # fresh fruits                     12019
 # packaged vegetables fruits        6460
@@ -700,45 +560,40 @@ print("Top 10 Category Names that cause False Positives (Wasted Recommendations)
 # milk                              2452
 # bread                             2085
 # soy lactosefree                   2072
-# Name: product_id, dtype: int64
+# Name: fp, dtype: int64
 
 
+## The same breakdown by department (FN / FP share of each department).
+department_outcomes.insert(0, 'department', catalogue.name('department', department_outcomes.index.to_numpy()))
+print(department_outcomes.sort_values('fn', ascending = False).head(10))
 
-# --- 🏷️ Confusion Matrix ---
 
-from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
 
-## Create the function for calculate all metrics.
-def calculate_metrics(y_true, y_pred, model_name = "Model"):
-  # 1.1 Create a confusion matrix (cm), to compare the actual value (y_true) with the predicted value (y_pred).
-  cm = confusion_matrix(y_true, y_pred)
+# --- 🏷️ Confusion Matrix ---
 
-  # 1.2 Use .reval() to extract the value of "Negative, Positive" from Matrix.
+## Create the function for calculate all metrics.
+## The counts and metrics are read from the cached 'evaluation' (no rescans of y_val per metric).
+## They use the same 'proba > threshold' rule as the F1 above and the test-set predictions; the first
+## version of this matrix used '>= 0.4', which differs only for probabilities exactly equal to 0.4
+## (the recorded F1 below is the same under both rules).
+def calculate_metrics(evaluation, threshold, model_name = "Model"):
+  # 1.1 Confusion matrix counts at the threshold.
   # TN = True Negative, FP = False Positive, FN = False Negative, TP = True Positive
-  # NOTE: Sklearn CM format: [[TN, FP], [FN, TP]]
-  TN, FP, FN, TP = cm.ravel()
+  metrics = evaluation.at(threshold)
+  TN, FP, FN, TP = metrics['tn'], metrics['fp'], metrics['fn'], metrics['tp']
+  cm = np.array([[TN, FP], [FN, TP]])
 
-  # 1.3 Calculate Metrics.
+  # 1.2 Metrics.
   # Accuracy: (TN + TP) / Total (TP + TN + FP + FN)
-  accuracy = accuracy_score(y_true, y_pred)
-
   # Precision: TP / (TP + FP)
-  precision = precision_score(y_true, y_pred)
-
   # Recall (Sensitivity): TP / (TP + FN)
-  recall = recall_score(y_true, y_pred)
-
-  # Specificity: TN / (TN + FP)
-  # It is the model's ability to correctly predict '0'.
-  specificity = TN / (TN + FP)
-
+  # Specificity: TN / (TN + FP), the model's ability to correctly predict '0'.
   # F1 score: 2 x (Precision x Recall) / (Precision + Recall)
-  f1 = f1_score(y_true, y_pred)
 
-  # 1.4 Create a datafame for result.
+  # 1.3 Create a datafame for result.
   results_df = pd.DataFrame({
       'Metric': ['Accuracy', 'Precision', 'Recall/Sensitivity', 'Specificity', 'F1 Score'],
-      model_name: [accuracy, precision, recall, specificity, f1]
+      model_name: [metrics['accuracy'], metrics['precision'], metrics['recall'], metrics['specificity'], metrics['f1']]
   }).set_index('Metric')
 
   print(f"\n--- Confision Matrix for {model_name} ---")
@@ -757,16 +612,10 @@ def calculate_metrics(y_true, y_pred, model_name = "Model"):
 
 # --- 📌 Show results ---
 
-y_true_labels = y_val
-
-y_pred_at_04 = (model.predict_proba(x_val)[:, 1] >= 0.4).astype(int)
-
-y_pred_labels = y_pred_at_04
-
 ## Call the calculate_metrics.
 cm_results, metrics_summary_df = calculate_metrics(
-    y_true = y_true_labels,
-    y_pred = y_pred_labels,
+    evaluation,
+    threshold = 0.4,
     model_name = "Logistic Model after Outlier Capping"
 )
 
@@ -794,68 +643,11 @@ cm_results, metrics_summary_df = calculate_metrics(
 ## FN (False Negative) = Missed sales opportunities
 
 
-## Combine the x_val (Feature Engineer) and the y_val (Target Variable) tables.
-df_val = x_val.copy()
-df_val['y_true'] = y_val.values
-
-
-## Add the y_pred column (threshold 0.4) into the df_val.
-df_val['y_pred'] = y_pred_labels
-
-print(df_val.head())
-# ## result:
-#          count_orders  avg_days_between_reorder  prod_reorder_rate  user_avg_days_between_orders  y_true  y_pred 
-# 527041            1.0                 30.000000           0.521021                     11.190476       1       0 
-# 1694697           1.0                 30.000000           0.619973                     12.285714       0       0    
-# 2111176           1.0                 30.000000           0.715237                      8.000000       0       0  
-# 2639205           1.0                 30.000000           0.854342                      6.100000       0       0  
-# 2440381           6.0                  8.166667           0.650427                      7.020833       0       1 
-
-
-## Retrieve 'user_id' and 'product_id' from 'final_train_data'
-
-df_val['user_id'] = final_train_data.loc[x_val.index, 'user_id']
-df_val['product_id'] = final_train_data.loc[x_val.index, 'product_id']
-
-
-## Create boolean mask and pull customer names (To filter 'FN').
-
-# FN is y_true = 1 and y_pred = 0
-fn_mask = (df_val['y_true'] == 1) & (df_val['y_pred'] == 0)
-
-## Filter
-df_fn_list = df_val[fn_mask]
-
-print(df_fn_list.head())
-# ## result:
-#         count_orders  avg_days_between_reorder  prod_reorder_rate  user_avg_days_between_orders  y_true  y_pred  user_id  product_id
-# 527041           1.0                      30.0           0.521021                     11.190476       1       0   205612       40299 
-# 16552            1.0                      30.0           0.291203                     11.750000       1       0   190147       18598
-# 681850           2.0                      30.0           0.603038                     20.333333       1       0   195355       28199
-# 809304           2.0                      30.0           0.690094                     12.000000       1       0    41783       33548
-# 308569           1.0                      30.0           0.081888                     13.333333       1       0    64424        6020  
-
-
-## Merge table with 'products' to get 'product_id' and 'product_name' column.
-fn_final_list = df_fn_list.merge(
-    products[['product_id', 'product_name']],
-    on = 'product_id',
-    how = 'left'
-)
-
-
-## False Negative list for checking
-
-fn_final_list = fn_final_list[[
-    'user_id',
-    'product_id',
-    'product_name',
-    'y_true',
-    'y_pred'
-]]
+## The first FN pairs (user_id, product_id) with their product names and labels; only these 10 names are looked up.
+fn_final_list = error_list(user_id_val, product_id_val, outcomes, 'fn', catalogue, n = 10)
 
 print("--- FN list for checking ---")
-print(fn_final_list.head(10))
+print(fn_final_list)
 # ## result:
 # --- FN list for checking ---
 #    user_id  product_id                                       product_name  y_true  y_pred
@@ -877,6 +669,7 @@ print(fn_final_list.head(10))
 # --- 📂 Download and Prepare the "Test Set" ---
 
 ## Download the 'testset' dataset.
+trace.start('predict_test', rows_in = up_features)
 orders_test = orders[orders['eval_set'] == 'test'][['order_id', 'user_id']]
 
 
@@ -902,34 +695,15 @@ print(test_set.head())
 
 print(f"Size of the 'Test set' to predict: {len(test_set):,} rows")
 # ## result:
-Size of the 'Test set' to predict: 4,833,292 rows
-
-
-
-# --- 🏷️ Merge 3 features into a 'Test set' ---
-
-## Merge user features (customer level).
-test_set = test_set.merge(
-    cust_features,
-    on = 'user_id',
-    how = 'left'
-)
+# Size of the 'Test set' to predict: 4,833,292 rows
 
 
-## Merge product features.
-test_set = test_set.merge(
-    prod_features,
-    on = 'product_id',
-    how = 'left'
-)
 
+# --- 🏷️ Gather 3 features into a 'Test set' ---
 
-## Merge user-product features.
-test_set = test_set.merge(
-    up_features,
-    on = ['user_id', 'product_id'],
-    how = 'left'
-)
+## Gather user features (customer level), product features and user-product features
+## from the feature store by (user_id, product_id) key lookup.
+test_set = feature_store.gather_frame(test_set)
 
 
 
@@ -947,7 +721,8 @@ core_features = [
     'user_avg_days_between_orders'
 ]
 
-x_test = test_set[core_features]
+## Apply the training caps, so the test set is scored the way the model was trained.
+x_test = capper.transform(test_set[core_features].copy())
 
 print(x_test.head())
 # ## result:
@@ -973,6 +748,12 @@ test_set['reordered_proba'] = model.predict_proba(x_test)[:, 1]
 ## Threshold
 threshold = 0.4
 test_set['reordered'] = (test_set['reordered_proba'] > threshold).astype(int)
+trace.stop(rows_out = test_set)
+
+
+## For production batch runs, the candidate pairs can be streamed from the feature store in chunks
+## and scored with a float32 dot product + sigmoid, writing straight to a CSV (flat memory, all cores):
+# score_test_set(feature_store, orders, LinearScorer.load('reorder-model.json'), 'instacart_test_predictions.csv')
 
 
 ## To see user_id, product_id, reordered_proba = probability, reordered = the last prediction.
@@ -1002,6 +783,7 @@ print(test_set['reordered'].value_counts())
 
 
 ## Filter only items where the model predicts a reorder (reordered == 1).
+trace.start('export', rows_in = test_set)
 final_marketing_list = test_set[test_set['reordered'] == 1].copy()
 
 
@@ -1042,6 +824,13 @@ print(marketing_output.head(10))
 
 ## Export CSV file to send to Marketing team.
 # marketing_output.to_csv('instacart_marketing_targets.csv', index=False)
+trace.stop(rows_out = marketing_output)
+
+
+## Save the run trace; compare it with an earlier run via
+## 'compare(load_trace(old_path), load_trace(new_path))' from instacart.trace.
+trace_path = trace.save()
+print(trace.to_frame()[['stage', 'wall_s', 'cpu_s', 'peak_rss_delta_mb', 'rows_in', 'rows_out']].to_string(index = False))
 
 
 